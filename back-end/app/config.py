@@ -5,6 +5,8 @@ load_dotenv()
 
 class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Override the OpenAI endpoint, e.g. http://127.0.0.1:8089/v1 for fake_llm_server.py
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
     HUGGINGFACE_TOKEN: str = os.getenv("HUGGINGFACE_TOKEN", "")
     PUBMED_API_KEY: str = os.getenv("PUBMED_API_KEY", "")
     MONGODB_URI: str = os.getenv("MONGODB_URI", "")
@@ -16,5 +18,103 @@ class Settings:
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
     # Default to * for hackathon/ngrok; restrict via env var in production
     ALLOWED_ORIGINS: str = os.getenv("ALLOWED_ORIGINS", "*")
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-5.2-2025-12-11")
+    # Max concurrent LLM calls per worker; extra calls queue on a semaphore
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_POOL_SIZE: int = int(os.getenv("LLM_POOL_SIZE", "16"))
+    # Generate the brief as three concurrent partial calls (summary/intake,
+    # actions/sources, guiding questions) instead of one sequential call
+    LLM_SECTIONED_GENERATION: bool = os.getenv("LLM_SECTIONED_GENERATION", "false").lower() == "true"
+    # Per-section token budgets for the clinical-brief user message
+    PROMPT_BUDGET_NARRATIVE_TOKENS: int = int(os.getenv("PROMPT_BUDGET_NARRATIVE_TOKENS", "1500"))
+    PROMPT_BUDGET_BIOMETRICS_TOKENS: int = int(os.getenv("PROMPT_BUDGET_BIOMETRICS_TOKENS", "600"))
+    PROMPT_BUDGET_RISK_TOKENS: int = int(os.getenv("PROMPT_BUDGET_RISK_TOKENS", "500"))
+    PROMPT_BUDGET_RETRIEVAL_TOKENS: int = int(os.getenv("PROMPT_BUDGET_RETRIEVAL_TOKENS", "1500"))
+    PROMPT_SNIPPET_MAX_TOKENS: int = int(os.getenv("PROMPT_SNIPPET_MAX_TOKENS", "350"))
+    # Per-attempt deadline, retry policy and circuit breaker for LLM calls
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+    LLM_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+    # Hedged requests fire a duplicate call after the recent p95 latency
+    # (LLM_HEDGE_DELAY_SECONDS until enough calls have been observed)
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "20"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    # End-to-end budgets; stages size their timeouts from what is left.  The
+    # intake budget applies per job attempt on the intake worker pool
+    INTAKE_DEADLINE_SECONDS: float = float(os.getenv("INTAKE_DEADLINE_SECONDS", "90"))
+    ANALYZE_DEADLINE_SECONDS: float = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "60"))
+    # Time kept back for the LLM when sizing search; hybrid re-ranking is
+    # skipped if search would get less than SEARCH_HYBRID_MIN_SECONDS
+    DEADLINE_LLM_RESERVE_SECONDS: float = float(os.getenv("DEADLINE_LLM_RESERVE_SECONDS", "15"))
+    SEARCH_HYBRID_MIN_SECONDS: float = float(os.getenv("SEARCH_HYBRID_MIN_SECONDS", "2"))
+    # Fetch the PDFs of an analysis' top matches into the paper proxy cache
+    # in the background, so the dashboard opens them without waiting
+    PAPER_WARMUP_ENABLED: bool = os.getenv("PAPER_WARMUP_ENABLED", "true").lower() == "true"
+    # Hard per-stage timeouts in the analysis stage graph; a stage that runs
+    # out fails with DeadlineExceeded(stage) whatever the request budget says
+    ENCODE_TIMEOUT_SECONDS: float = float(os.getenv("ENCODE_TIMEOUT_SECONDS", "10"))
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "20"))
+    CONCERN_TIMEOUT_SECONDS: float = float(os.getenv("CONCERN_TIMEOUT_SECONDS", "5"))
+    # Bulk NDJSON analysis (/analyze-patient/bulk): payloads per request,
+    # payloads embedded and searched together, and concurrent LLM calls per
+    # request (on top of LLM_MAX_CONCURRENCY); one batch embedding call gets
+    # BULK_ENCODE_TIMEOUT_SECONDS
+    BULK_MAX_ITEMS: int = int(os.getenv("BULK_MAX_ITEMS", "500"))
+    BULK_BATCH_SIZE: int = int(os.getenv("BULK_BATCH_SIZE", "32"))
+    BULK_LLM_CONCURRENCY: int = int(os.getenv("BULK_LLM_CONCURRENCY", "4"))
+    BULK_ENCODE_TIMEOUT_SECONDS: float = float(os.getenv("BULK_ENCODE_TIMEOUT_SECONDS", "60"))
+    # Admission control: LLM-bound analysis routes and cheap read routes
+    # (dashboards, status polls) each get their own in-flight slots and a
+    # short wait queue; overflow is shed with 429/503 + Retry-After
+    ANALYZE_MAX_IN_FLIGHT: int = int(os.getenv("ANALYZE_MAX_IN_FLIGHT", "8"))
+    ANALYZE_MAX_QUEUE: int = int(os.getenv("ANALYZE_MAX_QUEUE", "16"))
+    ANALYZE_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ANALYZE_QUEUE_TIMEOUT_SECONDS", "2"))
+    READ_MAX_IN_FLIGHT: int = int(os.getenv("READ_MAX_IN_FLIGHT", "64"))
+    READ_MAX_QUEUE: int = int(os.getenv("READ_MAX_QUEUE", "128"))
+    READ_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("READ_QUEUE_TIMEOUT_SECONDS", "1"))
+    # Bulk NDJSON requests get their own, smaller pool: each one runs up to
+    # BULK_LLM_CONCURRENCY LLM calls for minutes, so it must not take an
+    # analysis slot priced like a single request
+    BULK_MAX_IN_FLIGHT: int = int(os.getenv("BULK_MAX_IN_FLIGHT", "2"))
+    BULK_MAX_QUEUE: int = int(os.getenv("BULK_MAX_QUEUE", "2"))
+    BULK_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("BULK_QUEUE_TIMEOUT_SECONDS", "2"))
+    # Intake submissions are refused (503) while this many jobs are waiting
+    INTAKE_MAX_BACKLOG: int = int(os.getenv("INTAKE_MAX_BACKLOG", "200"))
+    INTAKE_BACKLOG_RETRY_SECONDS: int = int(os.getenv("INTAKE_BACKLOG_RETRY_SECONDS", "30"))
+    # Speculative pre-analysis of intake drafts (PUT /intake/{token}/draft):
+    # embedding and retrieval always; the LLM brief only if enabled, since a
+    # draft whose guess misses the final submit pays for an unused call
+    INTAKE_DRAFT_DEADLINE_SECONDS: float = float(os.getenv("INTAKE_DRAFT_DEADLINE_SECONDS", "20"))
+    INTAKE_DRAFT_LLM: bool = os.getenv("INTAKE_DRAFT_LLM", "false").lower() == "true"
+    # Durable intake job queue (MongoDB intake_jobs collection): worker count
+    # bounds concurrent intake pipelines; a claimed job is held for the lease
+    # and becomes claimable again if its worker dies
+    INTAKE_WORKERS: int = int(os.getenv("INTAKE_WORKERS", "4"))
+    INTAKE_JOB_POLL_SECONDS: float = float(os.getenv("INTAKE_JOB_POLL_SECONDS", "1"))
+    INTAKE_JOB_LEASE_SECONDS: float = float(os.getenv("INTAKE_JOB_LEASE_SECONDS", "300"))
+    INTAKE_JOB_MAX_ATTEMPTS: int = int(os.getenv("INTAKE_JOB_MAX_ATTEMPTS", "3"))
+    INTAKE_JOB_RETRY_SECONDS: float = float(os.getenv("INTAKE_JOB_RETRY_SECONDS", "10"))
+    # Background retries when replacing a provisional (rule-based) brief
+    BRIEF_UPGRADE_ATTEMPTS: int = int(os.getenv("BRIEF_UPGRADE_ATTEMPTS", "5"))
+    BRIEF_UPGRADE_RETRY_SECONDS: float = float(os.getenv("BRIEF_UPGRADE_RETRY_SECONDS", "30"))
+    # Exact-match response cache (MongoDB llm_response_cache collection)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    # Content-addressed memo of embedding/retrieval stage outputs (MongoDB
+    # stage_memo collection).  seed_db.py clears the search entries; bump
+    # CORPUS_VERSION when medical_conditions is changed any other way
+    CORPUS_VERSION: str = os.getenv("CORPUS_VERSION", "1")
+    STAGE_MEMO_ENABLED: bool = os.getenv("STAGE_MEMO_ENABLED", "true").lower() == "true"
+    STAGE_MEMO_TTL_SECONDS: int = int(os.getenv("STAGE_MEMO_TTL_SECONDS", str(24 * 3600)))
+    # In-memory near-duplicate brief cache keyed on the PubMedBERT query vector
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+    # Shared secret for /api/v1/admin/* and the X-Profile header; empty disables both
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
 
 settings = Settings()
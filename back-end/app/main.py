@@ -3,6 +3,7 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"  # MUST be before any ML imports
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 
@@ -10,16 +11,40 @@ from app.config import settings
 async def lifespan(app: FastAPI):
     from app.services.embeddings import load_embedding_model
     from app.services.vector_search import get_mongo_client
+    from app.services.llm_extractor import LLMClient
+    from app.services.llm_cache import LLMResponseCache
+    from app.services.semantic_cache import SemanticBriefCache
+    from app.services.stage_memo import StageMemo
+    from app.services.intake_jobs import IntakeJobQueue, IntakeWorkerPool
+    from app.routes.intake import process_intake_job, release_failed_intake
     app.state.embedding_model = load_embedding_model()
     app.state.mongo_client = get_mongo_client()
     app.state.db_name = settings.MONGODB_DB_NAME
+    llm_cache = LLMResponseCache(app.state.mongo_client) if settings.LLM_CACHE_ENABLED else None
+    app.state.llm_client = LLMClient(cache=llm_cache)
+    app.state.semantic_cache = SemanticBriefCache() if settings.SEMANTIC_CACHE_ENABLED else None
+    app.state.stage_memo = StageMemo(app.state.mongo_client) if settings.STAGE_MEMO_ENABLED else None
+    app.state.intake_queue = IntakeJobQueue(app.state.mongo_client[app.state.db_name])
+    app.state.intake_pool = IntakeWorkerPool(
+        app.state.intake_queue,
+        handler=lambda job: process_intake_job(app.state, job),
+        on_failed=lambda job: release_failed_intake(app.state, job),
+    )
+    app.state.intake_pool.start()
     yield
+    await app.state.intake_pool.stop()
+    await app.state.llm_client.aclose()
     app.state.mongo_client.close()
 
 app = FastAPI(title="Diagnostic API", version="0.1.0", lifespan=lifespan)
 _raw = settings.ALLOWED_ORIGINS.strip()
 _origins = ["*"] if _raw == "*" else [o.strip() for o in _raw.split(",") if o.strip()]
-app.add_middleware(CORSMiddleware, allow_origins=_origins, allow_credentials=_raw != "*", allow_methods=["*"], allow_headers=["*"])
+from app.middleware import AdmissionMiddleware, ProfileRequestMiddleware, RequestMetricsMiddleware
+# Innermost, so shed requests still get CORS headers (Retry-After is readable)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(CORSMiddleware, allow_origins=_origins, allow_credentials=_raw != "*", allow_methods=["*"], allow_headers=["*"], expose_headers=["Retry-After"])
+app.add_middleware(ProfileRequestMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 from app.routes.analyze import router as analyze_router
 from app.routes.paper import router as paper_router
@@ -27,14 +52,22 @@ from app.routes.patients import router as patients_router
 from app.routes.appointments import router as appointments_router
 from app.routes.intake import router as intake_router
 from app.routes.webhook import router as webhook_router
+from app.routes.admin import router as admin_router
 app.include_router(analyze_router)
 app.include_router(paper_router)
 app.include_router(patients_router)
 app.include_router(appointments_router)
 app.include_router(intake_router)
 app.include_router(webhook_router)
+app.include_router(admin_router)
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text-format metrics for this worker."""
+    from app.services.metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
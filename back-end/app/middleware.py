@@ -0,0 +1,168 @@
+"""ASGI middleware shared by the whole application."""
+
+from __future__ import annotations
+
+import re
+import time
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.routes.admin import is_admin_token
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.services.metrics import HTTP_REQUEST_SECONDS
+from app.services.profiler import ProfilerBusyError, SamplingProfiler
+
+
+class RequestMetricsMiddleware:
+    """Observe every HTTP request into the per-route latency histogram.
+
+    Implemented as plain ASGI (rather than ``@app.middleware("http")``) so
+    streaming responses are timed until their last byte is sent.  Requests
+    are labelled by route template (``/api/v1/patients/{patient_id}/dashboard``)
+    to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=str(status["code"]),
+            )
+
+
+class ProfileRequestMiddleware:
+    """Profile a single request when it carries ``X-Profile: <ADMIN_TOKEN>``.
+
+    The sampler covers every thread for the request's lifetime, so
+    concurrent requests on the same worker show up in the profile too.  The
+    stored profile's id is returned in the ``X-Profile-Id`` header and can
+    be downloaded from ``GET /api/v1/admin/profiles/{id}``.  Without an
+    ``ADMIN_TOKEN`` configured the only cost is one attribute check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMIN_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(b"x-profile")
+        if token is None or not is_admin_token(token.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            profiler = SamplingProfiler().start()
+        except ProfilerBusyError:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profiler.id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+
+
+# LLM-bound routes: the full pipeline runs inside the request
+_ANALYSIS_ROUTES = re.compile(r"^/api/v1/analyze-patient(/stream)?/?$")
+# NDJSON bulk analysis: many payloads and several LLM calls per request
+_BULK_ROUTES = re.compile(r"^/api/v1/analyze-patient/bulk/?$")
+# Speculative intake pre-analysis: embedding and search, sometimes the LLM
+_DRAFT_ROUTES = re.compile(r"^/api/v1/intake/[^/]+/draft/?$")
+
+
+class AdmissionMiddleware:
+    """Shed load before it reaches the embedding model and the LLM.
+
+    ``POST /api/v1/analyze-patient[/stream]`` and ``PUT
+    /api/v1/intake/{token}/draft`` go through the analysis controller;
+    ``POST /api/v1/analyze-patient/bulk`` through a smaller bulk controller,
+    since one bulk request runs up to ``BULK_LLM_CONCURRENCY`` LLM calls;
+    ``GET /api/v1/*`` (dashboards, status polls) through a separate read
+    controller, so reads are never queued behind analyses.
+    A slot is held until the response, streaming included, is complete.
+    Other requests are not limited.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.analysis = AdmissionController(
+            "analysis",
+            max_in_flight=settings.ANALYZE_MAX_IN_FLIGHT,
+            max_queue=settings.ANALYZE_MAX_QUEUE,
+            queue_timeout=settings.ANALYZE_QUEUE_TIMEOUT_SECONDS,
+            initial_service_seconds=10.0,
+        )
+        self.bulk = AdmissionController(
+            "bulk",
+            max_in_flight=settings.BULK_MAX_IN_FLIGHT,
+            max_queue=settings.BULK_MAX_QUEUE,
+            queue_timeout=settings.BULK_QUEUE_TIMEOUT_SECONDS,
+            initial_service_seconds=60.0,
+        )
+        self.read = AdmissionController(
+            "read",
+            max_in_flight=settings.READ_MAX_IN_FLIGHT,
+            max_queue=settings.READ_MAX_QUEUE,
+            queue_timeout=settings.READ_QUEUE_TIMEOUT_SECONDS,
+            initial_service_seconds=0.05,
+        )
+
+    def _controller(self, scope) -> AdmissionController | None:
+        path, method = scope["path"], scope["method"]
+        if method == "POST" and _ANALYSIS_ROUTES.match(path):
+            return self.analysis
+        if method == "POST" and _BULK_ROUTES.match(path):
+            return self.bulk
+        if method == "PUT" and _DRAFT_ROUTES.match(path):
+            return self.analysis
+        if method == "GET" and path.startswith("/api/v1/"):
+            return self.read
+        return None
+
+    async def __call__(self, scope, receive, send):
+        controller = self._controller(scope) if scope["type"] == "http" else None
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with controller.slot():
+                await self.app(scope, receive, send)
+        except AdmissionRejected as exc:
+            response = JSONResponse(
+                {"detail": str(exc)},
+                status_code=exc.status_code,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+            await response(scope, receive, send)
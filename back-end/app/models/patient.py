@@ -79,6 +79,12 @@ class PatientPayload(BaseModel):
     patient_narrative: str
     data: PatientData
     risk_profile: RiskProfile
+
+class IntakeDraft(BaseModel):
+    """Partial intake sent while the patient is still filling in the form."""
+    patient_narrative: str
+    risk_profile: Union[RiskProfile, None] = None
+
 class ClinicalBrief(BaseModel):
     summary: str
     clinical_intake: str
@@ -88,6 +94,13 @@ class ClinicalBrief(BaseModel):
     recommended_actions: list[str]
     cited_sources: list[str]
     guiding_questions: list[str]
+    # "llm" for a fresh generation, "semantic_cache" when reused from a
+    # near-duplicate intake, "rules" for the degraded-mode fallback
+    source: str = "llm"
+    cache_similarity: Union[float, None] = None
+    # True until a rule-based or semantic-cache brief has been replaced by
+    # an LLM brief generated for this patient
+    provisional: bool = False
 
 
 class BiometricDelta(BaseModel):
@@ -0,0 +1,83 @@
+"""Admin-only diagnostics routes — on-demand CPU profiling of this worker.
+
+All routes require the ``X-Admin-Token`` header to match ``ADMIN_TOKEN``;
+when ``ADMIN_TOKEN`` is unset the routes respond 404 as if absent.
+
+Route 1 — POST /api/v1/admin/profile?seconds=N
+    Samples every thread of the worker for N seconds while it keeps serving
+    traffic, then returns the collapsed-stack profile (text/plain).
+
+Route 2 — GET /api/v1/admin/profiles/{profile_id}
+    Returns a stored profile, e.g. one captured for a single request by
+    sending ``X-Profile: <ADMIN_TOKEN>`` (its id comes back in the
+    ``X-Profile-Id`` response header).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.services.profiler import ProfilerBusyError, SamplingProfiler, get_profile
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
+
+
+def is_admin_token(token: str | None) -> bool:
+    """Constant-time check of ``token`` against the configured ADMIN_TOKEN."""
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+
+async def require_admin(x_admin_token: str | None = Header(default=None)):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+@router.post("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+):
+    """Profile this worker for ``seconds`` and return collapsed stacks."""
+    try:
+        profiler = SamplingProfiler(interval=interval_ms / 1000).start()
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile_id = profiler.stop()
+
+    return PlainTextResponse(
+        get_profile(profile_id),
+        headers={
+            "X-Profile-Id": profile_id,
+            "X-Profile-Samples": str(profiler.sample_count),
+            "Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed",
+        },
+    )
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def fetch_profile(profile_id: str):
+    """Return a previously captured collapsed-stack profile."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(
+        profile,
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed"},
+    )
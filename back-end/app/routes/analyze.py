@@ -1,188 +1,84 @@
-"""POST /api/v1/analyze-patient — full diagnostic analysis pipeline with RAG."""
+"""POST /api/v1/analyze-patient — full diagnostic analysis pipeline with RAG.
+
+Also its Server-Sent Events variant (``/stream``) and the NDJSON bulk
+variant (``/bulk``) for analysing many stored payloads at once.
+"""
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Request, HTTPException
-from app.models.patient import (
-    PatientPayload,
-    AnalysisResponse,
-    ClinicalBrief,
-    BiometricDelta,
-    ConditionMatch,
-    MetricDataPoint,
-    LongitudinalDataPoint,
-)
-from app.services.llm_extractor import extract_clinical_brief
-from app.services.embeddings import encode_text
-from app.services.vector_search import search_conditions
-from app.services.cusum import detect_changepoint
+import json
+import logging
+import math
+
+from fastapi import APIRouter, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from app.config import settings
+from app.models.patient import PatientPayload, AnalysisResponse, ClinicalBrief
+from app.services.analysis_pipeline import ANALYSIS_GRAPH, pipeline_seeds
+from app.services.bulk_analysis import analyze_bulk
+from app.services.llm_extractor import ClinicalBriefOutput, stream_clinical_brief
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.disconnect import ClientDisconnected, cancel_on_disconnect, run_until_disconnect
+from app.services.resilience import LLMUnavailableError
+from app.services.semantic_cache import risk_scope
+from app.services.single_flight import SingleFlight, payload_key
+from app.services.stage_graph import StageError
+from app.services.timing import StageTimer
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["analysis"])
 
-# ---------------------------------------------------------------------------
-# Clinical significance thresholds
-# ---------------------------------------------------------------------------
-THRESHOLDS = {
-    "restingHeartRate": {"value": 5, "unit": "bpm"},
-    "heartRateVariabilitySDNN": {"value": 10, "unit": "ms"},
-    "respiratoryRate": {"value": 2, "unit": "breaths/min"},
-    "stepCount": {"value": 3000, "unit": "count"},
-    "sleepAnalysis_awakeSegments": {"value": 2, "unit": "count"},
-    "appleSleepingWristTemperature": {"value": 0.5, "unit": "degC_deviation"},
-    "walkingAsymmetryPercentage": {"value": 3, "unit": "%"},
-    "bloodOxygenSaturation": {"value": 2, "unit": "%"},
-    "walkingStepLength": {"value": 0.05, "unit": "meters"},
-    "walkingDoubleSupportPercentage": {"value": 3, "unit": "%"},
-}
-
-# Metrics present in both acute and longitudinal data
-SHARED_METRICS = {
-    "restingHeartRate",
-    "walkingAsymmetryPercentage",
-    "bloodOxygenSaturation",
-    "walkingStepLength",
-    "walkingDoubleSupportPercentage",
-}
-
-# Acute-only metrics: use first 3 days as baseline, last 4 as acute
-ACUTE_ONLY_METRICS = {
-    "heartRateVariabilitySDNN",
-    "respiratoryRate",
-    "stepCount",
-    "sleepAnalysis_awakeSegments",
-    "appleSleepingWristTemperature",
-}
-
-
-def _avg(values: list[float]) -> float:
-    """Return the mean of a list of floats."""
-    if not values:
-        return 0.0
-    return sum(values) / len(values)
-
-
-def _compute_biometric_deltas(payload: PatientPayload) -> list[BiometricDelta]:
-    """Compute biometric deltas between acute and baseline measurements.
-
-    For metrics in BOTH acute and longitudinal (restingHeartRate,
-    walkingAsymmetryPercentage): compare acute 7-day average against
-    longitudinal 6-month average.
-
-    For acute-only metrics: split the 7-day window into baseline (first 3
-    days) and acute (last 4 days), then compare.
-    """
-    deltas: list[BiometricDelta] = []
-    acute_metrics = payload.data.acute_7_day.metrics
-    longitudinal_metrics = payload.data.longitudinal_6_month.metrics
-
-    # --- Shared metrics: acute avg vs longitudinal avg ---
-    for metric_name in SHARED_METRICS:
-        acute_points: list[MetricDataPoint] = getattr(acute_metrics, metric_name)
-        longitudinal_points: list[LongitudinalDataPoint] = getattr(
-            longitudinal_metrics, metric_name
-        )
+# Identical concurrent /analyze-patient requests share one pipeline run
+_analyze_flight = SingleFlight("analyze_patient")
 
-        if not acute_points or not longitudinal_points:
-            continue
-
-        acute_avg = _avg([p.value for p in acute_points])
-        longitudinal_avg = _avg([p.value for p in longitudinal_points])
-        delta = abs(acute_avg - longitudinal_avg)
-        unit = acute_points[0].unit if acute_points else ""
-
-        threshold_info = THRESHOLDS.get(metric_name, {"value": 0})
-        clinically_significant = delta > threshold_info["value"]
-
-        # CUSUM on acute 7-day series (dates align with charts)
-        cp_values = [p.value for p in acute_points]
-        cp_dates = [p.date for p in acute_points]
-        cp = detect_changepoint(cp_values, cp_dates)
-
-        deltas.append(
-            BiometricDelta(
-                metric=metric_name,
-                acute_avg=round(acute_avg, 2),
-                longitudinal_avg=round(longitudinal_avg, 2),
-                delta=round(delta, 2),
-                unit=unit,
-                clinically_significant=clinically_significant,
-                changepoint_detected=cp is not None,
-                changepoint_date=cp["date"] if cp else None,
-                changepoint_direction=cp["direction"] if cp else None,
-            )
-        )
+# Non-standard status (nginx convention) logged when the client went away
+CLIENT_CLOSED_REQUEST = 499
 
-    # --- Acute-only metrics: first 3 days (baseline) vs last 4 days (acute) ---
-    for metric_name in ACUTE_ONLY_METRICS:
-        acute_points: list[MetricDataPoint] = getattr(acute_metrics, metric_name)
-
-        if not acute_points:
-            continue
-
-        baseline_values = [p.value for p in acute_points[:3]]
-        acute_values = [p.value for p in acute_points[3:]]
-
-        baseline_avg = _avg(baseline_values)
-        acute_avg = _avg(acute_values)
-        delta = abs(acute_avg - baseline_avg)
-        unit = acute_points[0].unit if acute_points else ""
-
-        threshold_info = THRESHOLDS.get(metric_name, {"value": 0})
-        clinically_significant = delta > threshold_info["value"]
-
-        # CUSUM on acute 7-day series
-        cp_values = [p.value for p in acute_points]
-        cp_dates = [p.date for p in acute_points]
-        cp = detect_changepoint(cp_values, cp_dates)
-
-        deltas.append(
-            BiometricDelta(
-                metric=metric_name,
-                acute_avg=round(acute_avg, 2),
-                longitudinal_avg=round(baseline_avg, 2),
-                delta=round(delta, 2),
-                unit=unit,
-                clinically_significant=clinically_significant,
-                changepoint_detected=cp is not None,
-                changepoint_date=cp["date"] if cp else None,
-                changepoint_direction=cp["direction"] if cp else None,
-            )
-        )
-
-    return deltas
-
-
-def _format_biometric_summary(deltas: list[BiometricDelta]) -> str:
-    """Format biometric deltas into a human-readable summary for the LLM."""
-    lines = ["### Biometric Delta Summary\n"]
-    for d in deltas:
-        significance = "CLINICALLY SIGNIFICANT" if d.clinically_significant else "within normal range"
-        lines.append(
-            f"- **{d.metric}**: acute avg {d.acute_avg} {d.unit} vs "
-            f"baseline avg {d.longitudinal_avg} {d.unit} "
-            f"(delta: {d.delta} {d.unit}) — {significance}"
-        )
-    return "\n".join(lines)
 
+def _seeds(request: Request, payload: PatientPayload, **options) -> dict:
+    state = request.app.state
+    return pipeline_seeds(
+        payload,
+        state.mongo_client,
+        state.embedding_model,
+        db_name=getattr(state, "db_name", None),
+        llm_client=getattr(state, "llm_client", None),
+        semantic_cache=getattr(state, "semantic_cache", None),
+        **options,
+    )
 
-def _format_retrieval_context(matches: list[dict]) -> str:
-    """Format vector search matches as retrieval context for the RAG prompt."""
-    if not matches:
-        return ""
 
-    lines = []
-    for i, m in enumerate(matches, 1):
-        lines.append(
-            f"### [{i}] {m.get('condition', 'Unknown Condition')}\n"
-            f"**Paper:** {m.get('title', 'Untitled')}\n"
-            f"**PMCID:** {m.get('pmcid', 'N/A')}\n"
-            f"**Key findings:** {m.get('snippet', '')}\n"
-        )
-    return "\n".join(lines)
+def _stage_status(exc: StageError, patient_id: str) -> tuple[int, str, str]:
+    """HTTP status, error label and detail for a failed pipeline stage."""
+    cause = exc.cause
+    if isinstance(cause, DeadlineExceeded):
+        return 504, "deadline", str(cause)
+    if isinstance(cause, LLMUnavailableError):
+        return 503, "llm_unavailable", f"LLM provider unavailable: {cause}"
+    if exc.stage == "search":
+        return 502, "search", f"Vector search failed: {cause}"
+    if exc.stage == "llm":
+        return 502, "llm", f"LLM extraction failed: {cause}"
+    logger.error("Stage '%s' failed for %s: %r", exc.stage, patient_id, cause)
+    return 500, exc.stage, f"Analysis failed at stage '{exc.stage}'."
+
+
+def _stage_failed(
+    timer: StageTimer, event: str, payload: PatientPayload, exc: StageError
+) -> HTTPException:
+    """Map a failed pipeline stage to the HTTP error the client sees."""
+    status_code, error, detail = _stage_status(exc, payload.patient_id)
+    headers = {"Server-Timing": timer.server_timing()}
+    if isinstance(exc.cause, LLMUnavailableError):
+        headers["Retry-After"] = str(math.ceil(exc.cause.retry_after))
+    timer.log(event, patient_id=payload.patient_id, error=error, stage=exc.stage)
+    return HTTPException(status_code=status_code, detail=detail, headers=headers)
 
 
 @router.post("/analyze-patient", response_model=AnalysisResponse)
-async def analyze_patient(payload: PatientPayload, request: Request):
+async def analyze_patient(payload: PatientPayload, request: Request, response: Response):
     """Run the full RAG diagnostic analysis pipeline.
 
     1. Compute biometric deltas
@@ -192,95 +88,258 @@ async def analyze_patient(payload: PatientPayload, request: Request):
     5. Format retrieval context from matched conditions
     6. Call GPT-4o with RAG context → clinical brief with citations
     7. Return structured AnalysisResponse
-    """
-    # Step 1: Compute biometric deltas
-    biometric_deltas = _compute_biometric_deltas(payload)
 
-    # Step 2: Format biometric summary
-    biometric_summary = _format_biometric_summary(biometric_deltas)
-
-    # Step 3: Generate embedding from narrative + biometric summary (moved before LLM)
-    embedding_text = payload.patient_narrative + " " + biometric_summary
-    embedding_model = request.app.state.embedding_model
-    query_vector = encode_text(embedding_model, embedding_text)
-
-    # Step 4: Run hybrid search (vector + BM25)
+    Per-stage durations are returned in the ``Server-Timing`` header.
+    Send ``Cache-Control: no-cache`` to bypass the LLM response and semantic caches.
+    The request runs under ``ANALYZE_DEADLINE_SECONDS``; running out → 504.
+    Concurrent requests with an identical payload share one pipeline run,
+    which is cancelled if every one of their clients disconnects.
+    """
+    bypass_cache = "no-cache" in request.headers.get("cache-control", "")
+    key = payload_key(payload, bypass_cache)
     try:
-        mongo_client = request.app.state.mongo_client
-        raw_matches = await search_conditions(
-            mongo_client,
-            query_vector,
-            query_text=payload.patient_narrative,
-            top_k=5,
+        (result, server_timing), _ = await run_until_disconnect(
+            request,
+            _analyze_flight.do(key, lambda: _run_analysis(payload, request, bypass_cache)),
+            route="analyze_patient",
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Vector search failed: {str(e)}",
+    except ClientDisconnected:
+        logger.info("Client disconnected; analysis for %s cancelled", payload.patient_id)
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    response.headers["Server-Timing"] = server_timing
+    return result
+
+
+async def _run_analysis(
+    payload: PatientPayload, request: Request, bypass_cache: bool
+) -> tuple[AnalysisResponse, str]:
+    """Pipeline behind ``/analyze-patient``; returns the response and Server-Timing."""
+    deadline = Deadline(settings.ANALYZE_DEADLINE_SECONDS)
+    timer = StageTimer(deadline)
+    seeds = _seeds(request, payload, deadline=deadline, bypass_cache=bypass_cache)
+    try:
+        results = await ANALYSIS_GRAPH.run(
+            seeds,
+            ("assemble", "concern", "papers"),
+            timer,
+            memo=getattr(request.app.state, "stage_memo", None),
+            refresh=bypass_cache,
         )
+    except StageError as e:
+        raise _stage_failed(timer, "analyze_patient", payload, e)
+
+    timer.log("analyze_patient", patient_id=payload.patient_id)
+    return results["assemble"], timer.server_timing()
+
+
+def _sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-    # Step 5: Format retrieval context from top 3 matches for RAG
-    retrieval_context = _format_retrieval_context(raw_matches[:3])
 
-    # Step 5a: Format the risk profile summary
-    risk_summary_lines = []
-    if hasattr(payload, "risk_profile") and payload.risk_profile.factors:
-        for f in payload.risk_profile.factors:
-            risk_summary_lines.append(f"- **{f.factor}** ({f.category}): {f.severity} severity. {f.description}")
-    risk_summary = "\n".join(risk_summary_lines)
+@router.post("/analyze-patient/stream")
+async def analyze_patient_stream(payload: PatientPayload, request: Request):
+    """Streaming variant of ``/analyze-patient`` over Server-Sent Events.
+
+    Retrieval runs before the response starts, so failures there still map
+    to a 502.  The stream then carries:
+
+    - ``analysis``: biometric deltas, condition matches and risk profile,
+      sent as soon as retrieval finishes
+    - ``brief_field``: ``{"field", "value"}`` whenever a ClinicalBriefOutput
+      field grows while the model generates it
+    - ``brief``: the complete, validated ClinicalBrief
+    - ``error``: ``{"detail"}`` if the LLM call fails mid-stream
+    - ``done``: per-stage timings in milliseconds
+
+    If the client disconnects, retrieval or the LLM stream is cancelled.
+    Retrieval and the LLM stream share one ``ANALYZE_DEADLINE_SECONDS``
+    deadline; an LLM stream that runs out of it ends with ``error``.
+    """
+    deadline = Deadline(settings.ANALYZE_DEADLINE_SECONDS)
+    timer = StageTimer(deadline)
+    bypass_cache = "no-cache" in request.headers.get("cache-control", "")
+    seeds = _seeds(request, payload, deadline=deadline, bypass_cache=bypass_cache)
+
+    async def retrieve():
+        try:
+            return await ANALYSIS_GRAPH.run(
+                seeds,
+                ("matches", "context", "risk", "semantic_cache", "papers"),
+                timer,
+                memo=getattr(request.app.state, "stage_memo", None),
+                refresh=bypass_cache,
+            )
+        except StageError as e:
+            raise _stage_failed(timer, "analyze_patient_stream", payload, e)
 
-    # Step 6: Call LLM with RAG context and demographic risk
     try:
-        clinical_output = await extract_clinical_brief(
-            narrative=payload.patient_narrative,
-            biometric_summary=biometric_summary,
-            risk_summary=risk_summary,
-            retrieval_context=retrieval_context,
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=502,
-            detail=f"LLM extraction failed: {str(e)}",
+        results = await run_until_disconnect(request, retrieve(), route="analyze_patient_stream")
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    semantic_cache = results["brief_cache"]
+    cached = results["semantic_cache"]
+
+    async def events():
+        yield _sse(
+            "analysis",
+            {
+                "patient_id": payload.patient_id,
+                "biometric_deltas": [d.model_dump() for d in results["deltas"]],
+                "condition_matches": [m.model_dump() for m in results["matches"]],
+                "risk_profile": payload.risk_profile.model_dump() if payload.risk_profile else None,
+            },
         )
 
-    clinical_brief = ClinicalBrief(
-        summary=clinical_output.summary,
-        clinical_intake=clinical_output.clinical_intake,
-        primary_concern=clinical_output.primary_concern,
-        key_symptoms=clinical_output.key_symptoms,
-        severity_assessment=clinical_output.severity_assessment,
-        recommended_actions=clinical_output.recommended_actions,
-        cited_sources=clinical_output.cited_sources,
-        guiding_questions=clinical_output.guiding_questions,
+        if cached is not None:
+            output, similarity = cached
+            brief = ClinicalBrief(
+                **output.model_dump(),
+                source="semantic_cache",
+                cache_similarity=round(similarity, 4),
+                provisional=True,
+            )
+        else:
+            sent: dict = {}
+            final: dict = {}
+            try:
+                with timer.span("llm"):
+                    async for partial in stream_clinical_brief(
+                        narrative=payload.patient_narrative,
+                        biometric_summary=results["summary"],
+                        risk_summary=results["risk"],
+                        retrieval_context=results["context"],
+                        client=results["llm_client"],
+                        bypass_cache=bypass_cache,
+                        deadline=deadline,
+                    ):
+                        for field, value in partial.items():
+                            if sent.get(field) != value:
+                                sent[field] = value
+                                yield _sse("brief_field", {"field": field, "value": value})
+                        final = partial
+                output = ClinicalBriefOutput.model_validate(final)
+            except Exception as e:
+                timer.log("analyze_patient_stream", patient_id=payload.patient_id, error="llm")
+                yield _sse("error", {"detail": f"LLM extraction failed: {str(e)}"})
+                return
+            if semantic_cache is not None:
+                semantic_cache.add(results["encode"], output, risk_scope(payload.risk_profile))
+            brief = ClinicalBrief(**output.model_dump())
+
+        yield _sse("brief", brief.model_dump())
+
+        await ANALYSIS_GRAPH.run({**results, "brief": brief}, ("concern",), timer)
+        timer.log("analyze_patient_stream", patient_id=payload.patient_id)
+        yield _sse("done", {"timing_ms": timer.durations_ms()})
+
+    return StreamingResponse(
+        cancel_on_disconnect(request, events(), route="analyze_patient_stream"),
+        media_type="text/event-stream",
+        headers={
+            "Server-Timing": timer.server_timing(),
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
     )
 
-    # Step 7: Format condition matches
-    condition_matches = [
-        ConditionMatch(
-            condition=m.get("condition", ""),
-            similarity_score=round(m.get("score", 0.0), 4),
-            pmcid=m.get("pmcid", ""),
-            title=m.get("title", ""),
-            snippet=m.get("snippet", ""),
+
+def _ndjson(data) -> str:
+    """Encode one newline-delimited JSON record."""
+    return json.dumps(data, default=str) + "\n"
+
+
+def _parse_ndjson(body: bytes) -> tuple[list[tuple[int, PatientPayload]], list[dict]]:
+    """Split an NDJSON body into valid payloads and per-line error records."""
+    payloads: list[tuple[int, PatientPayload]] = []
+    invalid: list[dict] = []
+    lines = [line for line in body.splitlines() if line.strip()]
+    if len(lines) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.BULK_MAX_ITEMS} payloads per bulk request.",
         )
-        for m in raw_matches
-    ]
+    for index, line in enumerate(lines):
+        try:
+            payloads.append((index, PatientPayload.model_validate_json(line)))
+        except ValidationError as e:
+            invalid.append(
+                {
+                    "index": index,
+                    "patient_id": None,
+                    "error": {"status": 422, "stage": None, "detail": e.errors(include_url=False)},
+                }
+            )
+    return payloads, invalid
 
-    # Step 8: Update patient record with the new primary concern
-    try:
-        mongo_client = request.app.state.mongo_client
-        db = mongo_client[request.app.state.settings.MONGODB_DB_NAME]
-        db.patients.update_one(
-            {"id": payload.patient_id},
-            {"$set": {"concern": clinical_brief.primary_concern}}
+
+@router.post("/analyze-patient/bulk")
+async def analyze_patient_bulk(request: Request):
+    """Analyze many payloads in one request, streamed back as NDJSON.
+
+    The body holds one ``PatientPayload`` JSON object per line (at most
+    ``BULK_MAX_ITEMS``).  Embedding and vector search run in batches of
+    ``BULK_BATCH_SIZE`` and at most ``BULK_LLM_CONCURRENCY`` LLM calls run
+    at once (see ``bulk_analysis``).  Each response line is written as soon
+    as its payload finishes, in completion order:
+
+    - ``{"index", "patient_id", "result"}``: the ``AnalysisResponse``
+    - ``{"index", "patient_id", "error": {"status", "stage", "detail"}}``:
+      the payload failed (invalid line, stage failure) with the status
+      ``/analyze-patient`` would have returned; the others carry on
+    - ``{"summary"}``: last line; item and error counts, stage timings
+
+    ``index`` is the payload's position among the non-blank body lines.
+    Results are not written to patient records.  Send ``Cache-Control:
+    no-cache`` to bypass the caches; disconnecting cancels the remaining work.
+    """
+    body = await request.body()
+    payloads, invalid = _parse_ndjson(body)
+    if not payloads and not invalid:
+        raise HTTPException(status_code=422, detail="The request body holds no payloads.")
+    timer = StageTimer()
+    bypass_cache = "no-cache" in request.headers.get("cache-control", "")
+
+    async def lines():
+        errors = len(invalid)
+        for record in invalid:
+            yield _ndjson(record)
+        outcomes = analyze_bulk(
+            payloads,
+            lambda payload: _seeds(request, payload, bypass_cache=bypass_cache),
+            timer,
+            memo=getattr(request.app.state, "stage_memo", None),
+            refresh=bypass_cache,
         )
-    except Exception as e:
-        print(f"Warning: Failed to update patient concern: {e}")
-
-    return AnalysisResponse(
-        patient_id=payload.patient_id,
-        clinical_brief=clinical_brief,
-        biometric_deltas=biometric_deltas,
-        condition_matches=condition_matches,
-        risk_profile=getattr(payload, "risk_profile", None),
+        try:
+            async for outcome in outcomes:
+                record = {"index": outcome.index, "patient_id": outcome.payload.patient_id}
+                if outcome.error is None:
+                    record["result"] = outcome.result.model_dump()
+                else:
+                    errors += 1
+                    status_code, _, detail = _stage_status(outcome.error, outcome.payload.patient_id)
+                    record["error"] = {
+                        "status": status_code,
+                        "stage": outcome.error.stage,
+                        "detail": detail,
+                    }
+                yield _ndjson(record)
+        finally:
+            await outcomes.aclose()
+        timer.log("analyze_bulk", items=len(payloads) + len(invalid), errors=errors)
+        yield _ndjson(
+            {
+                "summary": {
+                    "items": len(payloads) + len(invalid),
+                    "errors": errors,
+                    "timing_ms": timer.durations_ms(),
+                }
+            }
+        )
+
+    return StreamingResponse(
+        cancel_on_disconnect(request, lines(), route="analyze_patient_bulk"),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
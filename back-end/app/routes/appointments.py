@@ -78,7 +78,8 @@ async def get_appointment_dashboard(id: str, request: Request):
         raise HTTPException(status_code=404, detail="Appointment not found.")
 
     analysis = appointment.get("analysis_result")
-    if not analysis:
+    # Intake jobs store deltas and matches before the brief is ready
+    if not analysis or not analysis.get("clinical_brief"):
         raise HTTPException(
             status_code=404,
             detail="Analysis not yet available for this appointment.",
@@ -1,28 +1,46 @@
 """POST /api/v1/intake/{token}/submit — Intake Orchestrator Route.
 
 Connects the patient-facing frontend, MongoDB, the LangChain RAG pipeline,
-and the XRPL blockchain payout into a single transactional endpoint.
+and the XRPL blockchain payout.  The route only validates and enqueues; the
+work runs on the durable intake job queue (``app.services.intake_jobs``).
 
 Flow:
-    1. Validate that the appointment exists and has not already been completed.
-    2. Run the full ML analysis pipeline (biometric deltas → embedding →
-       vector search → LLM clinical brief).
-    3. Persist the raw payload and analysis results back to the appointment
-       document for auditing.
-    4. Queue a background XRPL payout of 10 XRP to compensate the patient
-       for their data contribution.
-    5. Return a success confirmation to the frontend.
+    1. Atomically claim the appointment (scheduled → processing) so
+       duplicate submits share one job instead of re-running the pipeline.
+    2. Enqueue an intake job and answer 202 with its id; progress is polled
+       at ``GET /api/v1/intake/jobs/{job_id}``.
+    3. On a worker: run the full ML analysis pipeline (biometric deltas →
+       embedding → vector search → LLM clinical brief), persisting deltas
+       and matches onto the appointment as soon as search finishes.  If the
+       LLM is down or too slow, a rule-based brief flagged ``provisional``
+       is used instead.
+    4. Persist the raw payload and analysis results back to the appointment
+       document for auditing, in one bulk write with the patient status.
+    5. Queue a background XRPL payout of 10 XRP to compensate the patient
+       for their data contribution, and, for provisional briefs, a
+       background upgrade to the full LLM brief.
+
+While the patient is still filling in the form, ``PUT /intake/{token}/draft``
+runs the embedding and retrieval stages on the narrative so far and keeps
+their outputs on the appointment; step 3 reuses every one whose inputs
+did not change.
 """
 
 from __future__ import annotations
 
 import logging
+import uuid
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
+from pymongo import ReturnDocument
 
+from app.config import settings
 from app.models.patient import (
     AnalysisResponse,
+    IntakeDraft,
     PatientPayload,
+    RiskProfile,
     PatientData,
     AcuteData,
     AcuteMetrics,
@@ -32,7 +50,15 @@ from app.models.patient import (
     LongitudinalDataPoint,
     StringMetricDataPoint,
 )
-from app.services.analysis_pipeline import analyze_patient_pipeline
+from app.services.analysis_pipeline import ANALYSIS_GRAPH, analyze_patient_pipeline, pipeline_seeds
+from app.services.brief_upgrade import upgrade_provisional_brief
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.intake_jobs import STATUS_FIELDS, IntakeJobQueue, IntakeWorkerPool
+from app.services.metrics import QUEUE_DEPTH
+from app.services.stage_graph import StageError
+from app.services.stage_memo import ScopedMemo
+from app.services.timing import StageTimer
+from app.services.vector_search import bulk_update
 from app.services.xrp_wallet import process_research_payout
 
 logger = logging.getLogger(__name__)
@@ -312,14 +338,69 @@ def _has_empty_biometrics(payload: PatientPayload) -> bool:
     )
 
 
-@router.post("/intake/{token}/submit")
+def _job_queue(request: Request) -> IntakeJobQueue:
+    """The lifespan's job queue, or one bound to the request's database."""
+    queue = getattr(request.app.state, "intake_queue", None)
+    if queue is None:
+        queue = IntakeJobQueue(request.app.state.mongo_client[request.app.state.db_name])
+    return queue
+
+
+def _claim_appointment(appointments, token: str, job_id: str) -> dict | None:
+    """Mark appointment ``token`` as processing under ``job_id``.
+
+    Succeeds if the appointment is neither completed nor held by another
+    job whose claim is still live.  The claim expires with the job lease,
+    so a submission whose job was lost can be retried.
+
+    Returns:
+        The appointment as it was before the claim, or None if it does
+        not exist or could not be claimed.
+    """
+    now = datetime.now(timezone.utc)
+    return appointments.find_one_and_update(
+        {
+            "form_token": token,
+            "$or": [
+                {"status": {"$nin": ["processing", "completed"]}},
+                # Expired (or missing) claim
+                {"status": "processing", "claim_expires_at": {"$not": {"$gte": now}}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "processing",
+                "intake_job_id": job_id,
+                "claim_expires_at": now + timedelta(seconds=settings.INTAKE_JOB_LEASE_SECONDS),
+            },
+        },
+        return_document=ReturnDocument.BEFORE,
+    )
+
+
+def _job_accepted(response: Response, job_id: str) -> dict:
+    status_url = f"/api/v1/intake/jobs/{job_id}"
+    response.headers["Location"] = status_url
+    return {
+        "status": "queued",
+        "message": "Submission received. Analysis and XRPL payout will follow shortly.",
+        "job_id": job_id,
+        "status_url": status_url,
+    }
+
+
+@router.post("/intake/{token}/submit", status_code=202)
 async def submit_intake(
     token: str,
     payload: PatientPayload,
     request: Request,
-    background_tasks: BackgroundTasks,
+    response: Response,
 ):
-    """Intake orchestrator — validates, analyzes, persists, and pays out.
+    """Intake orchestrator — validates and enqueues the submission.
+
+    The analysis itself runs on the intake worker pool (see
+    ``process_intake_job``); the caller gets 202 with a job id to poll at
+    ``GET /api/v1/intake/jobs/{job_id}``.
 
     Path Parameters:
         token: Unique appointment identifier that also serves as the
@@ -333,21 +414,50 @@ async def submit_intake(
     db = request.app.state.mongo_client[request.app.state.db_name]
     appointments = db.appointments
 
-    # ── Step 1: Database Validation ──────────────────────────────────
-    # Look up the appointment by its form_token (the intake token)
-    appointment = appointments.find_one({"form_token": token})
+    # ── Step 1: Atomic Claim ─────────────────────────────────────────
+    # Flip the appointment to "processing" in one find_one_and_update so
+    # concurrent submits (double-click, client retry) cannot both start a
+    # pipeline run and a payout.  Returns the document as it was before.
+    queue = _job_queue(request)
 
-    if not appointment:
+    # Load shedding: the job is durable, but a backlog this deep would not
+    # be analysed before the patient's appointment anyway
+    if queue.backlog() >= settings.INTAKE_MAX_BACKLOG:
         raise HTTPException(
-            status_code=404,
-            detail="Appointment not found for the provided token.",
+            status_code=503,
+            detail="Too many submissions are waiting for analysis. Please try again shortly.",
+            headers={"Retry-After": str(settings.INTAKE_BACKLOG_RETRY_SECONDS)},
         )
 
-    # Prevent double-submissions (protects the research fund from draining)
-    if appointment.get("status") == "completed":
+    job_id = uuid.uuid4().hex
+    # A second attempt covers a claim released between our two reads
+    # (a failed job reopening the appointment)
+    for _ in range(2):
+        appointment = _claim_appointment(appointments, token, job_id)
+        if appointment is not None:
+            break
+
+        current = appointments.find_one({"form_token": token})
+        if not current:
+            raise HTTPException(
+                status_code=404,
+                detail="Appointment not found for the provided token.",
+            )
+
+        # Prevent double-submissions (protects the research fund from draining)
+        if current.get("status") == "completed":
+            raise HTTPException(
+                status_code=400,
+                detail="This intake has already been submitted.",
+            )
+
+        # A duplicate of an in-flight submission gets the existing job
+        if current.get("intake_job_id"):
+            return _job_accepted(response, current["intake_job_id"])
+    else:
         raise HTTPException(
-            status_code=400,
-            detail="This intake has already been submitted.",
+            status_code=409,
+            detail="This intake is changing state; please submit again.",
         )
 
     # ── Step 1b: Biometric Data Fallback ─────────────────────────────
@@ -359,57 +469,255 @@ async def submit_intake(
         logger.info("Empty biometrics for token %s — using mock data", token)
         payload.data = _build_mock_biometric_data()
 
+    # ── Step 2: Enqueue (durable) ────────────────────────────────────
+    try:
+        queue.enqueue(token, payload.model_dump(), appointment.get("patient_id"), job_id=job_id)
+    except Exception:
+        # Undo the claim so the patient can submit again
+        appointments.update_one(
+            {"form_token": token, "intake_job_id": job_id},
+            {
+                "$set": {"status": appointment.get("status", "scheduled")},
+                "$unset": {"intake_job_id": "", "claim_expires_at": ""},
+            },
+        )
+        raise
+
+    pool = getattr(request.app.state, "intake_pool", None)
+    if pool is not None:
+        pool.notify()
+
+    logger.info("Queued intake job %s for token %s", job_id, token)
+    return _job_accepted(response, job_id)
+
+
+@router.get("/intake/jobs/{job_id}")
+async def get_intake_job(job_id: str, request: Request):
+    """Status of a queued intake submission (polled by the frontend)."""
+    job = _job_queue(request).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Intake job not found.")
+    return {"job_id": job_id, **{field: job.get(field) for field in STATUS_FIELDS}}
+
+
+def _draft_payload(token: str, draft: IntakeDraft) -> PatientPayload:
+    # Wearable data arrives with the final submit; until then assume the
+    # mock data that submit substitutes for empty arrays (Step 1b), which
+    # is what a synced intake ends up analysing
+    return PatientPayload(
+        patient_id=token,
+        sync_timestamp=datetime.now(timezone.utc).isoformat(),
+        hardware_source="intake_draft",
+        patient_narrative=draft.patient_narrative,
+        data=_build_mock_biometric_data(),
+        risk_profile=draft.risk_profile or RiskProfile(factors=[]),
+    )
+
+
+@router.put("/intake/{token}/draft")
+async def save_intake_draft(token: str, draft: IntakeDraft, request: Request):
+    """Speculatively pre-analyse an intake before it is submitted.
+
+    Called by the intake form as each step (narrative, risk profile) is
+    completed.  Runs the embedding and vector search for the draft and
+    stores the outputs, keyed by input fingerprint, on the appointment as
+    ``intake_draft``; the intake job later reuses those whose inputs still
+    match the submission.  With ``INTAKE_DRAFT_LLM`` the LLM stage runs
+    too, which warms the LLM response cache for an identical final prompt.
+    Each call replaces the previous draft.
+    """
+    if not draft.patient_narrative.strip():
+        raise HTTPException(status_code=422, detail="The draft narrative is empty.")
+
+    state = request.app.state
+    appointments = state.mongo_client[state.db_name].appointments
+    appointment = appointments.find_one({"form_token": token}, {"status": 1})
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found for the provided token.")
+    if appointment.get("status") in ("processing", "completed"):
+        raise HTTPException(status_code=409, detail="This intake has already been submitted.")
+
+    memo = ScopedMemo("intake_draft", shared=getattr(state, "stage_memo", None))
+    deadline = Deadline(settings.INTAKE_DRAFT_DEADLINE_SECONDS)
+    timer = StageTimer(deadline)
+    seeds = pipeline_seeds(
+        _draft_payload(token, draft),
+        state.mongo_client,
+        state.embedding_model,
+        llm_client=getattr(state, "llm_client", None),
+        deadline=deadline,
+        provisional_fallback=True,
+    )
+    targets = ("search", "llm") if settings.INTAKE_DRAFT_LLM else ("search",)
+    try:
+        await ANALYSIS_GRAPH.run(seeds, targets, timer, memo=memo)
+    except StageError as exc:
+        timer.log("intake_draft", token=token, error=type(exc.cause).__name__, stage=exc.stage)
+        raise HTTPException(
+            status_code=504 if isinstance(exc.cause, DeadlineExceeded) else 502,
+            detail=f"Draft pre-analysis failed at stage '{exc.stage}'.",
+        )
+
+    # Only while the intake is still open; a submit may have raced us
+    result = appointments.update_one(
+        {"form_token": token, "status": {"$nin": ["processing", "completed"]}},
+        {
+            "$set": {
+                "intake_draft": {
+                    "stages": memo.entries,
+                    "updated_at": datetime.now(timezone.utc),
+                }
+            }
+        },
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="This intake has already been submitted.")
+    timer.log("intake_draft", token=token)
+    return {"status": "ready", "stages": timer.durations_ms()}
+
+
+async def process_intake_job(state, job: dict) -> None:
+    """Run one attempt of an intake job on the worker pool.
+
+    Analyzes, persists and pays out.  ``state`` is ``app.state`` (Mongo
+    client, models, LLM client, job queue and pool).  Exceptions propagate
+    to the pool, which retries the job or gives up.
+    """
+    token = job["token"]
+    job_id = job["_id"]
+    queue: IntakeJobQueue = state.intake_queue
+    db = state.mongo_client[state.db_name]
+    appointments = db.appointments
+
+    # Renew the appointment claim; the job id fences out a job that was
+    # superseded by a later submission after its claim expired
+    now = datetime.now(timezone.utc)
+    owned = {"form_token": token, "status": "processing", "intake_job_id": job_id}
+    appointment = appointments.find_one_and_update(
+        owned,
+        {"$set": {"claim_expires_at": now + timedelta(seconds=settings.INTAKE_JOB_LEASE_SECONDS)}},
+    )
+    if not appointment:
+        logger.info("Intake job %s no longer owns token %s, skipping", job_id, token)
+        return
+
+    payload = PatientPayload(**job["payload"])
+    payload_doc = payload.model_dump()
+    # Stage outputs precomputed by PUT /intake/{token}/draft
+    draft = appointment.get("intake_draft") or {}
+    memo = ScopedMemo(
+        "intake_draft", draft.get("stages"), shared=getattr(state, "stage_memo", None)
+    )
+
+    def store_partial(biometric_deltas, condition_matches) -> None:
+        # Deltas and matches are available long before the brief
+        appointments.update_one(
+            owned,
+            {
+                "$set": {
+                    "patient_payload": payload_doc,
+                    "analysis_result": {
+                        "patient_id": payload.patient_id,
+                        "clinical_brief": None,
+                        "biometric_deltas": [d.model_dump() for d in biometric_deltas],
+                        "condition_matches": [m.model_dump() for m in condition_matches],
+                        "risk_profile": payload_doc.get("risk_profile"),
+                    },
+                },
+            },
+        )
+        queue.set_stage(job_id, "retrieval")
+
     # ── Step 2: ML Pipeline Execution ────────────────────────────────
     # Run the full RAG pipeline: biometric deltas → PubMedBERT embedding →
     # MongoDB $vectorSearch → LangChain GPT extraction.
+    deadline = Deadline(settings.INTAKE_DEADLINE_SECONDS)
+    timer = StageTimer(deadline)
     try:
         analysis: AnalysisResponse = await analyze_patient_pipeline(
             payload=payload,
-            mongo_client=request.app.state.mongo_client,
-            embedding_model=request.app.state.embedding_model,
+            mongo_client=state.mongo_client,
+            embedding_model=state.embedding_model,
+            timer=timer,
+            llm_client=getattr(state, "llm_client", None),
+            semantic_cache=getattr(state, "semantic_cache", None),
+            deadline=deadline,
+            # Never fail the intake on the LLM: serve a rule-based brief instead
+            provisional_fallback=True,
+            on_retrieval=store_partial,
+            stage_memo=memo,
         )
+    except DeadlineExceeded as exc:
+        timer.log("intake_job", token=token, job_id=job_id, error="deadline", stage=exc.stage)
+        raise
     except Exception as exc:
-        # Catch LangChain timeout errors and any other pipeline failures
-        logger.error("ML pipeline failed for token %s: %s", token, exc)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Analysis pipeline error: {str(exc)}",
-        )
+        timer.log("intake_job", token=token, job_id=job_id, error=type(exc).__name__)
+        raise
 
     # ── Step 3: Database Mutation (The Handoff) ──────────────────────
     # Persist the raw payload and generated analysis back to the appointment
-    # document for auditing, and mark the intake as completed.
-    appointments.update_one(
-        {"form_token": token},
-        {
-            "$set": {
-                "status": "completed",
-                "patient_payload": payload.model_dump(),
-                "analysis_result": analysis.model_dump(),
+    # document for auditing, mark the intake as completed, and update the
+    # patient record so the doctor's patient list reflects it — one
+    # client-level bulk write (one round trip) across both collections on
+    # MongoDB 8.0+, two fenced updates on older servers.
+    updates = [
+        (
+            f"{state.db_name}.appointments",
+            owned,
+            {
+                "$set": {
+                    "status": "completed",
+                    "patient_payload": payload_doc,
+                    "analysis_result": analysis.model_dump(),
+                },
+                "$unset": {"claim_expires_at": "", "intake_draft": ""},
             },
-        },
-    )
-
-    # Also update the patient record status so the doctor's patient list
-    # reflects that this patient's intake + analysis is done.
+        )
+    ]
     patient_id = appointment.get("patient_id")
     if patient_id:
-        db.patients.update_one(
-            {"id": patient_id},
-            {"$set": {"status": "Completed"}},
+        updates.append(
+            (f"{state.db_name}.patients", {"id": patient_id}, {"$set": {"status": "Completed"}})
         )
+    if bulk_update(state.mongo_client, updates)[0] == 0:
+        # Superseded while the pipeline ran: the newer job pays out
+        logger.warning("Intake job %s lost token %s before completing", job_id, token)
+        return
+    queue.set_stage(job_id, "brief")
 
     # ── Step 4: DeSci Blockchain Payout (Background Task) ────────────
-    # Compensate the patient with XRP for their data. Runs in the
-    # background so ledger consensus does not block the HTTP response.
-    background_tasks.add_task(
-        process_research_payout,
-        target_address=token,
-        amount=XRP_PAYOUT_AMOUNT,
-    )
+    # Compensate the patient with XRP for their data. Runs outside the
+    # worker slot so ledger consensus does not hold up the next job.
+    pool: IntakeWorkerPool = state.intake_pool
+    QUEUE_DEPTH.inc(queue="payout")
+    pool.spawn(process_research_payout(target_address=token, amount=XRP_PAYOUT_AMOUNT))
 
-    # ── Step 5: Return success ───────────────────────────────────────
-    return {
-        "status": "success",
-        "message": "Data processed and XRPL payout initiated.",
-    }
+    # ── Step 4b: Provisional Brief Upgrade (Background Task) ─────────
+    # A rule-based (LLM unavailable) or semantic-cache brief was stored;
+    # replace it with an LLM brief generated for this patient.
+    if analysis.clinical_brief.provisional:
+        QUEUE_DEPTH.inc(queue="brief_upgrade")
+        pool.spawn(
+            upgrade_provisional_brief(
+                mongo_client=state.mongo_client,
+                db_name=state.db_name,
+                token=token,
+                payload=payload,
+                analysis=analysis,
+                llm_client=getattr(state, "llm_client", None),
+            )
+        )
+
+    timer.log("intake_job", token=token, job_id=job_id)
+
+
+def release_failed_intake(state, job: dict) -> None:
+    """Reopen the appointment after its job gave up so the patient can resubmit."""
+    db = state.mongo_client[state.db_name]
+    db.appointments.update_one(
+        {"form_token": job["token"], "status": "processing", "intake_job_id": job["_id"]},
+        {
+            "$set": {"status": "scheduled"},
+            "$unset": {"analysis_result": "", "intake_job_id": "", "claim_expires_at": ""},
+        },
+    )
@@ -2,40 +2,19 @@
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
-import httpx
 
-router = APIRouter(prefix="/api/v1", tags=["papers"])
-
-# Simple in-memory PDF cache: pmcid -> bytes
-_pdf_cache: dict[str, bytes] = {}
-# Track failed lookups so we don't retry them
-_failed: set[str] = set()
-
-
-async def _fetch_pdf(pmcid: str) -> bytes:
-    """Fetch PDF bytes from Europe PMC, using cache."""
-    if pmcid in _pdf_cache:
-        return _pdf_cache[pmcid]
-    if pmcid in _failed:
-        raise HTTPException(status_code=404, detail=f"PDF not available for {pmcid}")
+from app.services.papers import PaperUnavailable, fetch_pdf
 
-    url = f"https://europepmc.org/backend/ptpmcrender.fcgi?accid={pmcid}&blobtype=pdf"
-
-    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-        resp = await client.get(url)
-
-    if resp.status_code != 200 or "pdf" not in resp.headers.get("content-type", ""):
-        _failed.add(pmcid)
-        raise HTTPException(status_code=404, detail=f"PDF not available for {pmcid}")
-
-    _pdf_cache[pmcid] = resp.content
-    return resp.content
+router = APIRouter(prefix="/api/v1", tags=["papers"])
 
 
 @router.get("/paper/{pmcid}")
 async def proxy_paper(pmcid: str):
     """Return a cached or freshly-fetched PDF for the given PMCID."""
-    pdf_bytes = await _fetch_pdf(pmcid)
+    try:
+        pdf_bytes = await fetch_pdf(pmcid)
+    except PaperUnavailable as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
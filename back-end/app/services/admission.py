@@ -0,0 +1,130 @@
+"""Admission control and load shedding.
+
+Under a burst, letting every request start the embedding model and a GPT
+call makes all of them slow until they time out together.  An
+``AdmissionController`` caps the requests in flight for one class of
+routes and lets a short queue wait for a slot:
+
+- queue full → ``AdmissionRejected`` with status 429, immediately
+- no slot within ``queue_timeout`` → ``AdmissionRejected`` with status 503
+
+Both carry a ``Retry-After`` estimate derived from the recent mean service
+time and the queue length.  Each route class (LLM-bound analysis, cheap
+reads) has its own controller, so reads keep reserved capacity however
+busy the analysis routes are.  See ``AdmissionMiddleware`` for the wiring.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_REQUESTS, ADMISSION_WAIT_SECONDS
+
+# Weight of the newest observation in the service-time moving average
+_EWMA_ALPHA = 0.2
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class AdmissionRejected(Exception):
+    """The request was shed; retry after ``retry_after`` seconds."""
+
+    def __init__(self, pool: str, status_code: int, retry_after: int):
+        reason = "queue full" if status_code == 429 else "timed out waiting for capacity"
+        super().__init__(f"Server busy ({pool}: {reason}).")
+        self.pool = pool
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight limit plus a bounded, time-limited wait queue.
+
+    Not tied to an event loop at construction, so one instance can live on
+    a middleware for the life of the process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        initial_service_seconds: float = 1.0,
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.service_seconds = initial_service_seconds
+        self._waiters: deque[asyncio.Future] = deque()
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.in_flight, pool=name)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request."""
+        backlog = (self.queued + 1) / self.max_in_flight
+        return min(max(math.ceil(self.service_seconds * backlog), 1), MAX_RETRY_AFTER_SECONDS)
+
+    def _reject(self, status_code: int, result: str) -> AdmissionRejected:
+        ADMISSION_REQUESTS.inc(pool=self.name, result=result)
+        return AdmissionRejected(self.name, status_code, self.retry_after())
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting up to ``queue_timeout`` in the queue."""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            ADMISSION_REQUESTS.inc(pool=self.name, result="admitted")
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject(429, "rejected_queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as the caller went away
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, pool=self.name)
+        if not waiter.done():
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            raise self._reject(503, "rejected_timeout")
+        ADMISSION_REQUESTS.inc(pool=self.name, result="admitted_after_wait")
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the oldest live waiter."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def observe(self, seconds: float) -> None:
+        self.service_seconds += _EWMA_ALPHA * (seconds - self.service_seconds)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the enclosed block; raises ``AdmissionRejected``."""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+            self.release()
@@ -1,30 +1,296 @@
-"""Reusable analysis pipeline — orchestrates biometric deltas, embedding,
-vector search, and LLM extraction into a single awaitable call.
+"""Reusable analysis pipeline — biometric deltas, embedding, vector search
+and LLM extraction declared once as a ``StageGraph``.
 
-This module re-exports the pure-function helpers from routes.analyze so the
-intake orchestrator (and any future caller) can run the full pipeline without
-duplicating logic.
+``ANALYSIS_GRAPH`` is the single pipeline definition shared by
+``/analyze-patient``, its streaming variant and the intake workers; each
+caller seeds it with ``pipeline_seeds`` and asks for the stages it needs.
+Stage outputs are stored under the stage name:
+
+    deltas → summary → embedding_text → encode → search_query → search
+                                              → semantic_cache   (overlaps search)
+    search → matches, context
+    deltas, matches → partial                        (overlaps the LLM)
+    matches → papers          (PDF warm-up for the dashboard, in the background)
+    risk, context, semantic_cache → llm → brief → assemble, concern
+
+The embedding and the patient-record write run on the thread pool.
+``encode`` and ``search`` are memoized by input fingerprint in the shared
+``StageMemo``, so re-analysing a patient after a prompt or model change
+only pays for the LLM stage.
 """
 
 from __future__ import annotations
 
+import logging
+from typing import Any, Callable
+
 from pymongo import MongoClient
 from sentence_transformers import SentenceTransformer
 
+from app.config import settings
 from app.models.patient import (
     PatientPayload,
     AnalysisResponse,
+    BiometricDelta,
     ClinicalBrief,
     ConditionMatch,
 )
-from app.routes.analyze import (
+from app.services.analysis_steps import (
     _compute_biometric_deltas,
     _format_biometric_summary,
+    _format_condition_matches,
     _format_retrieval_context,
+    _format_risk_summary,
+)
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.embeddings import EMBEDDING_MODEL_NAME, encode_text
+from app.services.vector_search import hybrid_search_allowed, search_conditions
+from app.services.llm_extractor import ClinicalBriefOutput, LLMClient, extract_clinical_brief
+from app.services.fallback_brief import build_provisional_brief
+from app.services.papers import warm_pdfs
+from app.services.resilience import LLMUnavailableError
+from app.services.semantic_cache import SemanticBriefCache, risk_scope
+from app.services.stage_graph import Stage, StageError, StageGraph
+from app.services.stage_memo import ScopedMemo, StageMemo
+from app.services.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TOP_K = 5
+# Matches whose PDFs are fetched ahead of the doctor opening them
+PAPER_WARM_TOP_K = 3
+
+SKIPPED_BRIEF = ClinicalBrief(
+    summary="LLM extraction skipped for mock data generation.",
+    clinical_intake="Placeholder intake.",
+    primary_concern="Placeholder concern",
+    key_symptoms=[],
+    severity_assessment="Pending",
+    recommended_actions=[],
+    cited_sources=[],
+    guiding_questions=[],
+)
+
+
+def _encode(embedding_text: str, embedding_model, deadline) -> list:
+    return encode_text(embedding_model, embedding_text, deadline=deadline)
+
+
+def _search_query(payload: PatientPayload, deadline, **_) -> str:
+    # Decided up front so the memo key tells hybrid from vector-only results
+    return payload.patient_narrative if hybrid_search_allowed(deadline) else ""
+
+
+async def _search(mongo_client, encode: list, search_query: str, deadline) -> list[dict]:
+    return await search_conditions(
+        mongo_client,
+        encode,
+        query_text=search_query,
+        top_k=SEARCH_TOP_K,
+        deadline=deadline,
+    )
+
+
+def _publish_partial(on_retrieval, deltas, matches) -> None:
+    on_retrieval(deltas, matches)
+
+
+def _warm_papers(matches: list[ConditionMatch]) -> int:
+    return warm_pdfs([m.pmcid for m in matches[:PAPER_WARM_TOP_K]])
+
+
+def _lookup_brief(brief_cache: SemanticBriefCache, encode: list, payload: PatientPayload, **_):
+    return brief_cache.lookup(encode, risk_scope(payload.risk_profile))
+
+
+async def _extract(
+    payload: PatientPayload,
+    summary: str,
+    risk: str,
+    context: str,
+    llm_client,
+    bypass_cache: bool,
+    deadline,
+    provisional_fallback: bool,
+    **_,
+) -> ClinicalBriefOutput | None:
+    try:
+        return await extract_clinical_brief(
+            narrative=payload.patient_narrative,
+            biometric_summary=summary,
+            risk_summary=risk,
+            retrieval_context=context,
+            client=llm_client,
+            bypass_cache=bypass_cache,
+            deadline=deadline,
+        )
+    except (LLMUnavailableError, DeadlineExceeded) as exc:
+        if not provisional_fallback:
+            raise
+        logger.warning(
+            "LLM unavailable for %s, serving provisional brief: %s", payload.patient_id, exc
+        )
+        return None
+
+
+def _build_brief(
+    payload: PatientPayload,
+    skip_llm: bool,
+    semantic_cache,
+    llm: ClinicalBriefOutput | None,
+    deltas: list[BiometricDelta],
+    matches: list[ConditionMatch],
+    brief_cache: SemanticBriefCache | None,
+    encode: list,
+) -> ClinicalBrief:
+    if skip_llm:
+        return SKIPPED_BRIEF.model_copy()
+    if semantic_cache is not None:
+        # Another patient's brief is only a first draft: provisional, so it
+        # is regenerated from this patient's own inputs like a rule-based one
+        clinical_output, similarity = semantic_cache
+        return ClinicalBrief(
+            **clinical_output.model_dump(),
+            source="semantic_cache",
+            cache_similarity=round(similarity, 4),
+            provisional=True,
+        )
+    if llm is None:
+        # Degraded mode — rule-based brief, upgraded later
+        return build_provisional_brief(
+            payload.patient_narrative, deltas, matches, payload.risk_profile
+        )
+    if brief_cache is not None:
+        brief_cache.add(encode, llm, risk_scope(payload.risk_profile))
+    return ClinicalBrief(**llm.model_dump())
+
+
+def _assemble(payload: PatientPayload, brief: ClinicalBrief, deltas, matches) -> AnalysisResponse:
+    return AnalysisResponse(
+        patient_id=payload.patient_id,
+        clinical_brief=brief,
+        biometric_deltas=deltas,
+        condition_matches=matches,
+        risk_profile=getattr(payload, "risk_profile", None),
+    )
+
+
+def _update_concern(mongo_client, db_name: str, payload: PatientPayload, brief: ClinicalBrief) -> None:
+    """Store the brief's primary concern on the patient record."""
+    db = mongo_client[db_name]
+    db.patients.update_one({"id": payload.patient_id}, {"$set": {"concern": brief.primary_concern}})
+
+
+ANALYSIS_GRAPH = StageGraph(
+    [
+        Stage("deltas", _compute_biometric_deltas, ("payload",)),
+        Stage("summary", _format_biometric_summary, ("deltas",)),
+        Stage("risk", _format_risk_summary, ("payload",)),
+        Stage(
+            "embedding_text",
+            lambda payload, summary: payload.patient_narrative + " " + summary,
+            ("payload", "summary"),
+        ),
+        Stage(
+            "encode",
+            _encode,
+            ("embedding_text", "embedding_model", "deadline"),
+            cpu=True,
+            timeout=settings.ENCODE_TIMEOUT_SECONDS,
+            memo_key=("embedding_text",),
+            version=EMBEDDING_MODEL_NAME,
+        ),
+        # Depends on encode so the time left is read just before search starts
+        Stage("search_query", _search_query, ("payload", "deadline", "encode")),
+        Stage(
+            "search",
+            _search,
+            ("mongo_client", "encode", "search_query", "deadline"),
+            timeout=settings.SEARCH_TIMEOUT_SECONDS,
+            memo_key=("encode", "search_query"),
+            # The corpus is not an input; a re-seed must change the key
+            version=f"top{SEARCH_TOP_K}:corpus{settings.CORPUS_VERSION}",
+        ),
+        Stage("matches", lambda search: _format_condition_matches(search), ("search",)),
+        Stage("context", lambda search: _format_retrieval_context(search[:3]), ("search",)),
+        Stage(
+            "partial",
+            _publish_partial,
+            ("on_retrieval", "deltas", "matches"),
+            when=lambda on_retrieval, **_: on_retrieval is not None,
+        ),
+        Stage(
+            "papers",
+            _warm_papers,
+            ("matches",),
+            when=lambda **_: settings.PAPER_WARMUP_ENABLED,
+            optional=True,
+        ),
+        Stage(
+            "semantic_cache",
+            _lookup_brief,
+            ("brief_cache", "encode", "payload", "skip_llm", "bypass_cache"),
+            when=lambda brief_cache, skip_llm, bypass_cache, **_: (
+                brief_cache is not None and not skip_llm and not bypass_cache
+            ),
+        ),
+        Stage(
+            "llm",
+            _extract,
+            (
+                "payload", "summary", "risk", "context", "llm_client", "bypass_cache",
+                "deadline", "provisional_fallback", "skip_llm", "semantic_cache",
+            ),
+            when=lambda skip_llm, semantic_cache, **_: not skip_llm and semantic_cache is None,
+        ),
+        Stage(
+            "brief",
+            _build_brief,
+            ("payload", "skip_llm", "semantic_cache", "llm", "deltas", "matches", "brief_cache", "encode"),
+        ),
+        Stage("assemble", _assemble, ("payload", "brief", "deltas", "matches")),
+        Stage(
+            "concern",
+            _update_concern,
+            ("mongo_client", "db_name", "payload", "brief"),
+            # Rule-based and borrowed (semantic cache) concerns are left to
+            # the brief upgrade, which stores the regenerated one
+            when=lambda brief, **_: not brief.provisional,
+            cpu=True,
+            timeout=settings.CONCERN_TIMEOUT_SECONDS,
+            optional=True,
+        ),
+    ]
 )
-from app.services.embeddings import encode_text
-from app.services.vector_search import search_conditions
-from app.services.llm_extractor import extract_clinical_brief
+
+
+def pipeline_seeds(
+    payload: PatientPayload,
+    mongo_client: MongoClient,
+    embedding_model: SentenceTransformer,
+    db_name: str | None = None,
+    llm_client: LLMClient | None = None,
+    semantic_cache: SemanticBriefCache | None = None,
+    deadline: Deadline | None = None,
+    bypass_cache: bool = False,
+    skip_llm: bool = False,
+    provisional_fallback: bool = False,
+    on_retrieval: Callable[[list[BiometricDelta], list[ConditionMatch]], None] | None = None,
+) -> dict[str, Any]:
+    """Caller-supplied inputs of ``ANALYSIS_GRAPH`` (see ``analyze_patient_pipeline``)."""
+    return {
+        "payload": payload,
+        "mongo_client": mongo_client,
+        "embedding_model": embedding_model,
+        "db_name": db_name,
+        "llm_client": llm_client,
+        "brief_cache": semantic_cache,
+        "deadline": deadline,
+        "bypass_cache": bypass_cache,
+        "skip_llm": skip_llm,
+        "provisional_fallback": provisional_fallback,
+        "on_retrieval": on_retrieval,
+    }
 
 
 async def analyze_patient_pipeline(
@@ -32,6 +298,14 @@ async def analyze_patient_pipeline(
     mongo_client: MongoClient,
     embedding_model: SentenceTransformer,
     skip_llm: bool = False,
+    timer: StageTimer | None = None,
+    llm_client: LLMClient | None = None,
+    bypass_llm_cache: bool = False,
+    semantic_cache: SemanticBriefCache | None = None,
+    deadline: Deadline | None = None,
+    provisional_fallback: bool = False,
+    on_retrieval: Callable[[list[BiometricDelta], list[ConditionMatch]], None] | None = None,
+    stage_memo: StageMemo | ScopedMemo | None = None,
 ) -> AnalysisResponse:
     """Execute the full RAG diagnostic analysis pipeline.
 
@@ -49,88 +323,48 @@ async def analyze_patient_pipeline(
         mongo_client: Active PyMongo client for vector search queries.
         embedding_model: Pre-loaded SentenceTransformer model.
         skip_llm: If True, skips the GPT API call and returns a placeholder brief.
+        timer: Optional per-request StageTimer; each stage is recorded as a span.
+        llm_client: Pooled LLMClient from the app lifespan (shared default if None).
+        bypass_llm_cache: Force a fresh LLM call even if an identical prompt is cached.
+            Also skips the semantic cache lookup.
+        semantic_cache: Optional near-duplicate brief cache; a hit above its
+            similarity threshold replaces the LLM call.
+        deadline: Request deadline; bounds search (``maxTimeMS``, hybrid
+            re-ranking skipped when short) and LLM timeouts/retries.  Raises
+            ``DeadlineExceeded`` when a stage cannot start in time.
+        provisional_fallback: If the LLM is unavailable or the deadline runs
+            out during the LLM stage, return a rule-based brief flagged
+            ``provisional`` instead of raising.
+        on_retrieval: Called with the biometric deltas and condition matches
+            as soon as search finishes, alongside the LLM stage, so callers
+            can persist partial results.
+        stage_memo: Shared store of memoized stage outputs (embedding,
+            retrieval); ``bypass_llm_cache`` recomputes and overwrites them.
 
     Returns:
         AnalysisResponse with clinical brief, deltas, and condition matches.
     """
-    # Step 1: Compute biometric deltas
-    biometric_deltas = _compute_biometric_deltas(payload)
-
-    # Step 2: Format biometric summary for the LLM
-    biometric_summary = _format_biometric_summary(biometric_deltas)
-
-    # Step 3: Generate embedding from narrative + biometric summary
-    embedding_text = payload.patient_narrative + " " + biometric_summary
-    query_vector = encode_text(embedding_model, embedding_text)
-
-    # Step 4: Run hybrid search (vector + BM25)
-    raw_matches = await search_conditions(
+    seeds = pipeline_seeds(
+        payload,
         mongo_client,
-        query_vector,
-        query_text=payload.patient_narrative,
-        top_k=5,
+        embedding_model,
+        llm_client=llm_client,
+        semantic_cache=semantic_cache,
+        deadline=deadline,
+        bypass_cache=bypass_llm_cache,
+        skip_llm=skip_llm,
+        provisional_fallback=provisional_fallback,
+        on_retrieval=on_retrieval,
     )
-
-    if skip_llm:
-        clinical_brief = ClinicalBrief(
-            summary="LLM extraction skipped for mock data generation.",
-            clinical_intake="Placeholder intake.",
-            primary_concern="Placeholder concern",
-            key_symptoms=[],
-            severity_assessment="Pending",
-            recommended_actions=[],
-            cited_sources=[],
-            guiding_questions=[],
-        )
-    else:
-        # Step 5: Format retrieval context from top 3 matches for RAG
-        retrieval_context = _format_retrieval_context(raw_matches[:3])
-
-        # Step 5a: Format the risk profile summary
-        risk_summary_lines = []
-        if payload.risk_profile and payload.risk_profile.factors:
-            for f in payload.risk_profile.factors:
-                risk_summary_lines.append(
-                    f"- **{f.factor}** ({f.category}): {f.severity} severity. "
-                    f"{f.description}"
-                )
-        risk_summary = "\n".join(risk_summary_lines)
-
-        # Step 6: Call LLM with RAG context and demographic risk
-        clinical_output = await extract_clinical_brief(
-            narrative=payload.patient_narrative,
-            biometric_summary=biometric_summary,
-            risk_summary=risk_summary,
-            retrieval_context=retrieval_context,
-        )
-
-        clinical_brief = ClinicalBrief(
-            summary=clinical_output.summary,
-            clinical_intake=clinical_output.clinical_intake,
-            primary_concern=clinical_output.primary_concern,
-            key_symptoms=clinical_output.key_symptoms,
-            severity_assessment=clinical_output.severity_assessment,
-            recommended_actions=clinical_output.recommended_actions,
-            cited_sources=clinical_output.cited_sources,
-            guiding_questions=clinical_output.guiding_questions,
+    try:
+        results = await ANALYSIS_GRAPH.run(
+            seeds,
+            ("assemble", "partial", "papers"),
+            timer or StageTimer(deadline),
+            memo=stage_memo,
+            refresh=bypass_llm_cache,
         )
-
-    # Step 7: Format condition matches
-    condition_matches = [
-        ConditionMatch(
-            condition=m.get("condition", ""),
-            similarity_score=round(m.get("score", 0.0), 4),
-            pmcid=m.get("pmcid", ""),
-            title=m.get("title", ""),
-            snippet=m.get("snippet", ""),
-        )
-        for m in raw_matches
-    ]
-
-    return AnalysisResponse(
-        patient_id=payload.patient_id,
-        clinical_brief=clinical_brief,
-        biometric_deltas=biometric_deltas,
-        condition_matches=condition_matches,
-        risk_profile=getattr(payload, "risk_profile", None),
-    )
+    except StageError as exc:
+        # Callers handle the stage's own exception (DeadlineExceeded, …)
+        raise exc.cause from None
+    return results["assemble"]
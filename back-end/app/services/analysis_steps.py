@@ -0,0 +1,209 @@
+"""Pure helpers behind the analysis pipeline stages.
+
+Biometric deltas (acute vs baseline, with CUSUM changepoints) and the text
+sections handed to the embedding model and the LLM.  Nothing here does I/O;
+``analysis_pipeline`` wires these into the stage graph.
+"""
+
+from __future__ import annotations
+
+from app.config import settings
+from app.models.patient import (
+    BiometricDelta,
+    ConditionMatch,
+    LongitudinalDataPoint,
+    MetricDataPoint,
+    PatientPayload,
+)
+from app.services.cusum import detect_changepoint
+from app.services.prompt_builder import dedupe_matches
+
+# ---------------------------------------------------------------------------
+# Clinical significance thresholds
+# ---------------------------------------------------------------------------
+THRESHOLDS = {
+    "restingHeartRate": {"value": 5, "unit": "bpm"},
+    "heartRateVariabilitySDNN": {"value": 10, "unit": "ms"},
+    "respiratoryRate": {"value": 2, "unit": "breaths/min"},
+    "stepCount": {"value": 3000, "unit": "count"},
+    "sleepAnalysis_awakeSegments": {"value": 2, "unit": "count"},
+    "appleSleepingWristTemperature": {"value": 0.5, "unit": "degC_deviation"},
+    "walkingAsymmetryPercentage": {"value": 3, "unit": "%"},
+    "bloodOxygenSaturation": {"value": 2, "unit": "%"},
+    "walkingStepLength": {"value": 0.05, "unit": "meters"},
+    "walkingDoubleSupportPercentage": {"value": 3, "unit": "%"},
+}
+
+# Metrics present in both acute and longitudinal data.  Tuples, not sets:
+# delta order feeds the biometric summary, hence the embedding text, the
+# prompt and every fingerprint derived from them, so it must not depend on
+# the process's string-hash seed
+SHARED_METRICS = (
+    "restingHeartRate",
+    "walkingAsymmetryPercentage",
+    "bloodOxygenSaturation",
+    "walkingStepLength",
+    "walkingDoubleSupportPercentage",
+)
+
+# Acute-only metrics: use first 3 days as baseline, last 4 as acute
+ACUTE_ONLY_METRICS = (
+    "heartRateVariabilitySDNN",
+    "respiratoryRate",
+    "stepCount",
+    "sleepAnalysis_awakeSegments",
+    "appleSleepingWristTemperature",
+)
+
+
+def _avg(values: list[float]) -> float:
+    """Return the mean of a list of floats."""
+    if not values:
+        return 0.0
+    return sum(values) / len(values)
+
+
+def _compute_biometric_deltas(payload: PatientPayload) -> list[BiometricDelta]:
+    """Compute biometric deltas between acute and baseline measurements.
+
+    For metrics in BOTH acute and longitudinal (restingHeartRate,
+    walkingAsymmetryPercentage): compare acute 7-day average against
+    longitudinal 6-month average.
+
+    For acute-only metrics: split the 7-day window into baseline (first 3
+    days) and acute (last 4 days), then compare.
+    """
+    deltas: list[BiometricDelta] = []
+    acute_metrics = payload.data.acute_7_day.metrics
+    longitudinal_metrics = payload.data.longitudinal_6_month.metrics
+
+    # --- Shared metrics: acute avg vs longitudinal avg ---
+    for metric_name in SHARED_METRICS:
+        acute_points: list[MetricDataPoint] = getattr(acute_metrics, metric_name)
+        longitudinal_points: list[LongitudinalDataPoint] = getattr(
+            longitudinal_metrics, metric_name
+        )
+
+        if not acute_points or not longitudinal_points:
+            continue
+
+        acute_avg = _avg([p.value for p in acute_points])
+        longitudinal_avg = _avg([p.value for p in longitudinal_points])
+        delta = abs(acute_avg - longitudinal_avg)
+        unit = acute_points[0].unit if acute_points else ""
+
+        threshold_info = THRESHOLDS.get(metric_name, {"value": 0})
+        clinically_significant = delta > threshold_info["value"]
+
+        # CUSUM on acute 7-day series (dates align with charts)
+        cp_values = [p.value for p in acute_points]
+        cp_dates = [p.date for p in acute_points]
+        cp = detect_changepoint(cp_values, cp_dates)
+
+        deltas.append(
+            BiometricDelta(
+                metric=metric_name,
+                acute_avg=round(acute_avg, 2),
+                longitudinal_avg=round(longitudinal_avg, 2),
+                delta=round(delta, 2),
+                unit=unit,
+                clinically_significant=clinically_significant,
+                changepoint_detected=cp is not None,
+                changepoint_date=cp["date"] if cp else None,
+                changepoint_direction=cp["direction"] if cp else None,
+            )
+        )
+
+    # --- Acute-only metrics: first 3 days (baseline) vs last 4 days (acute) ---
+    for metric_name in ACUTE_ONLY_METRICS:
+        acute_points: list[MetricDataPoint] = getattr(acute_metrics, metric_name)
+
+        if not acute_points:
+            continue
+
+        baseline_values = [p.value for p in acute_points[:3]]
+        acute_values = [p.value for p in acute_points[3:]]
+
+        baseline_avg = _avg(baseline_values)
+        acute_avg = _avg(acute_values)
+        delta = abs(acute_avg - baseline_avg)
+        unit = acute_points[0].unit if acute_points else ""
+
+        threshold_info = THRESHOLDS.get(metric_name, {"value": 0})
+        clinically_significant = delta > threshold_info["value"]
+
+        # CUSUM on acute 7-day series
+        cp_values = [p.value for p in acute_points]
+        cp_dates = [p.date for p in acute_points]
+        cp = detect_changepoint(cp_values, cp_dates)
+
+        deltas.append(
+            BiometricDelta(
+                metric=metric_name,
+                acute_avg=round(acute_avg, 2),
+                longitudinal_avg=round(baseline_avg, 2),
+                delta=round(delta, 2),
+                unit=unit,
+                clinically_significant=clinically_significant,
+                changepoint_detected=cp is not None,
+                changepoint_date=cp["date"] if cp else None,
+                changepoint_direction=cp["direction"] if cp else None,
+            )
+        )
+
+    return deltas
+
+
+def _format_biometric_summary(deltas: list[BiometricDelta]) -> str:
+    """Format biometric deltas into a human-readable summary for the LLM."""
+    lines = ["### Biometric Delta Summary\n"]
+    for d in deltas:
+        significance = "CLINICALLY SIGNIFICANT" if d.clinically_significant else "within normal range"
+        lines.append(
+            f"- **{d.metric}**: acute avg {d.acute_avg} {d.unit} vs "
+            f"baseline avg {d.longitudinal_avg} {d.unit} "
+            f"(delta: {d.delta} {d.unit}) — {significance}"
+        )
+    return "\n".join(lines)
+
+
+def _format_retrieval_context(matches: list[dict]) -> str:
+    """Format vector search matches as retrieval context for the RAG prompt.
+
+    Repeated papers and sentences are dropped and each snippet is capped at
+    ``PROMPT_SNIPPET_MAX_TOKENS``.
+    """
+    if not matches:
+        return ""
+
+    lines = []
+    for i, m in enumerate(dedupe_matches(matches, settings.PROMPT_SNIPPET_MAX_TOKENS), 1):
+        lines.append(
+            f"### [{i}] {m.get('condition', 'Unknown Condition')}\n"
+            f"**Paper:** {m.get('title', 'Untitled')}\n"
+            f"**PMCID:** {m.get('pmcid', 'N/A')}\n"
+            f"**Key findings:** {m.get('snippet', '')}\n"
+        )
+    return "\n".join(lines)
+
+
+def _format_risk_summary(payload: PatientPayload) -> str:
+    """Format the risk profile factors as bullet lines for the LLM."""
+    lines = []
+    if payload.risk_profile and payload.risk_profile.factors:
+        for f in payload.risk_profile.factors:
+            lines.append(f"- **{f.factor}** ({f.category}): {f.severity} severity. {f.description}")
+    return "\n".join(lines)
+
+
+def _format_condition_matches(matches: list[dict]) -> list[ConditionMatch]:
+    return [
+        ConditionMatch(
+            condition=m.get("condition", ""),
+            similarity_score=round(m.get("score", 0.0), 4),
+            pmcid=m.get("pmcid", ""),
+            title=m.get("title", ""),
+            snippet=m.get("snippet", ""),
+        )
+        for m in matches
+    ]
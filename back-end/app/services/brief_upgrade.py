@@ -0,0 +1,98 @@
+"""Background upgrade of provisional clinical briefs.
+
+A brief is provisional when it is rule-based (the LLM was unavailable) or
+borrowed from a near-duplicate intake via the semantic cache.  When an
+intake job stored a provisional brief, it spawns
+``upgrade_provisional_brief`` on the ``IntakeWorkerPool``, outside the
+worker slot.  The task re-runs only the LLM stage, reusing the biometric
+deltas and condition matches already stored with the analysis, and
+overwrites the stored brief once the provider answers.  It retries with a
+growing delay while the provider is unavailable and gives up after
+``BRIEF_UPGRADE_ATTEMPTS``, leaving the provisional brief in place.  The
+upgraded brief's primary concern is then stored on the patient record,
+which the pipeline skips for provisional briefs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from pymongo import MongoClient
+
+from app.config import settings
+from app.models.patient import AnalysisResponse, ClinicalBrief, PatientPayload
+from app.services.analysis_steps import (
+    _format_biometric_summary,
+    _format_retrieval_context,
+    _format_risk_summary,
+)
+from app.services.deadline import DeadlineExceeded
+from app.services.llm_extractor import LLMClient, extract_clinical_brief
+from app.services.metrics import QUEUE_DEPTH
+from app.services.resilience import LLMUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+async def upgrade_provisional_brief(
+    mongo_client: MongoClient,
+    db_name: str,
+    token: str,
+    payload: PatientPayload,
+    analysis: AnalysisResponse,
+    llm_client: LLMClient | None = None,
+) -> ClinicalBrief | None:
+    """Replace the provisional brief stored on appointment ``token``.
+
+    Callers increment the ``brief_upgrade`` queue-depth gauge when queueing;
+    it is decremented here when the upgrade finishes or gives up.
+
+    Returns:
+        The new brief, or None if every attempt failed.
+    """
+    try:
+        biometric_summary = _format_biometric_summary(analysis.biometric_deltas)
+        retrieval_context = _format_retrieval_context(
+            [m.model_dump() for m in analysis.condition_matches[:3]]
+        )
+        risk_summary = _format_risk_summary(payload)
+
+        for attempt in range(1, settings.BRIEF_UPGRADE_ATTEMPTS + 1):
+            try:
+                output = await extract_clinical_brief(
+                    narrative=payload.patient_narrative,
+                    biometric_summary=biometric_summary,
+                    risk_summary=risk_summary,
+                    retrieval_context=retrieval_context,
+                    client=llm_client,
+                )
+                break
+            except (LLMUnavailableError, DeadlineExceeded) as exc:
+                logger.warning(
+                    "Brief upgrade for token %s failed (attempt %d): %s", token, attempt, exc
+                )
+                if attempt == settings.BRIEF_UPGRADE_ATTEMPTS:
+                    return None
+                await asyncio.sleep(
+                    max(settings.BRIEF_UPGRADE_RETRY_SECONDS * attempt, getattr(exc, "retry_after", 0))
+                )
+
+        brief = ClinicalBrief(**output.model_dump())
+        db = mongo_client[db_name]
+        # Only overwrite a brief that is still provisional
+        result = db.appointments.update_one(
+            {"form_token": token, "analysis_result.clinical_brief.provisional": True},
+            {"$set": {"analysis_result.clinical_brief": brief.model_dump()}},
+        )
+        if result.matched_count and payload.patient_id:
+            db.patients.update_one(
+                {"id": payload.patient_id}, {"$set": {"concern": brief.primary_concern}}
+            )
+        logger.info("Upgraded provisional brief for token %s", token)
+        return brief
+    except Exception as exc:
+        logger.error("Brief upgrade for token %s failed: %s", token, exc)
+        return None
+    finally:
+        QUEUE_DEPTH.dec(queue="brief_upgrade")
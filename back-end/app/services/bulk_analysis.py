@@ -0,0 +1,194 @@
+"""Bulk analysis — many payloads through ``ANALYSIS_GRAPH`` in batches.
+
+Per batch of ``batch_size`` payloads:
+
+1. deltas, summaries and embedding texts are computed inline (cheap)
+2. every text missing from the stage memo is embedded in one model call
+   on the thread pool, instead of one forward pass per payload
+3. the batch's vector searches run concurrently, seeded with those
+   embeddings (``$vectorSearch`` takes a single query vector, so a batch
+   shares the connection pool rather than one query)
+4. each payload's LLM call and assembly start as a task behind a
+   semaphore of ``llm_concurrency``
+
+Retrieval runs at most one batch ahead of generation, so embedding and
+search overlap with the LLM calls of earlier batches without holding the
+whole request in memory.  ``analyze_bulk`` yields a ``BulkOutcome`` per
+payload in completion order; a failed stage fails only its own payload.
+Each payload gets its own ``Deadline`` for retrieval and another for the
+LLM stage, so time spent queued behind the semaphore is not charged to it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable
+
+from app.config import settings
+from app.models.patient import AnalysisResponse, PatientPayload
+from app.services.analysis_pipeline import ANALYSIS_GRAPH
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.embeddings import encode_texts
+from app.services.stage_graph import StageError, run_blocking
+from app.services.stage_memo import ScopedMemo, StageMemo
+from app.services.timing import StageTimer
+
+# Retrieval targets; the LLM phase continues from their results
+_RETRIEVAL = ("matches", "context", "risk", "semantic_cache")
+
+
+@dataclass
+class BulkOutcome:
+    """Result of one payload of a bulk request: ``result`` or ``error``."""
+
+    index: int
+    payload: PatientPayload
+    result: AnalysisResponse | None = None
+    error: StageError | None = None
+
+
+async def analyze_bulk(
+    items: list[tuple[int, PatientPayload]],
+    make_seeds: Callable[[PatientPayload], dict[str, Any]],
+    timer: StageTimer,
+    memo: StageMemo | ScopedMemo | None = None,
+    refresh: bool = False,
+    batch_size: int = settings.BULK_BATCH_SIZE,
+    llm_concurrency: int = settings.BULK_LLM_CONCURRENCY,
+    deadline_seconds: float = settings.ANALYZE_DEADLINE_SECONDS,
+) -> AsyncIterator[BulkOutcome]:
+    """Analyze ``(index, payload)`` pairs, yielding outcomes as they complete.
+
+    ``make_seeds`` builds a payload's graph seeds (``pipeline_seeds``); the
+    deadline is replaced per phase.  Stage spans of all payloads accumulate
+    in ``timer``.  Closing the generator cancels the outstanding work.
+    """
+    outcomes: asyncio.Queue[BulkOutcome | None] = asyncio.Queue()
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    generating: set[asyncio.Task] = set()
+
+    async def generate(index: int, results: dict[str, Any]) -> None:
+        async with llm_slots:
+            results["deadline"] = Deadline(deadline_seconds)
+            try:
+                results = await ANALYSIS_GRAPH.run(results, ("assemble",), timer)
+            except StageError as exc:
+                outcome = BulkOutcome(index, results["payload"], error=exc)
+            else:
+                outcome = BulkOutcome(index, results["payload"], result=results["assemble"])
+        outcomes.put_nowait(outcome)
+
+    async def feed() -> None:
+        try:
+            for start in range(0, len(items), batch_size):
+                # Keep retrieval one batch ahead of the LLM calls
+                while len(generating) >= llm_concurrency + batch_size:
+                    await asyncio.wait(generating, return_when=asyncio.FIRST_COMPLETED)
+                batch = items[start:start + batch_size]
+                retrieved = await _retrieve_batch(
+                    batch, make_seeds, timer, memo, refresh, deadline_seconds
+                )
+                for index, results in retrieved:
+                    if isinstance(results, BulkOutcome):
+                        outcomes.put_nowait(results)
+                        continue
+                    task = asyncio.create_task(generate(index, results))
+                    generating.add(task)
+                    task.add_done_callback(generating.discard)
+            if generating:
+                await asyncio.gather(*generating)
+        finally:
+            outcomes.put_nowait(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while (outcome := await outcomes.get()) is not None:
+            yield outcome
+        # Surfaces an unexpected error in the feeder itself
+        await feeder
+    finally:
+        for task in (feeder, *generating):
+            task.cancel()
+        await asyncio.gather(feeder, *generating, return_exceptions=True)
+
+
+async def _retrieve_batch(
+    batch: list[tuple[int, PatientPayload]],
+    make_seeds: Callable[[PatientPayload], dict[str, Any]],
+    timer: StageTimer,
+    memo: StageMemo | ScopedMemo | None,
+    refresh: bool,
+    deadline_seconds: float,
+) -> list[tuple[int, dict[str, Any] | BulkOutcome]]:
+    """Run the retrieval phase for one batch; failed payloads become outcomes."""
+    prepared: list[tuple[int, dict[str, Any] | BulkOutcome]] = []
+    for index, payload in batch:
+        seeds = {**make_seeds(payload), "deadline": Deadline(deadline_seconds)}
+        try:
+            results = await ANALYSIS_GRAPH.run(seeds, ("embedding_text",), timer)
+        except StageError as exc:
+            prepared.append((index, BulkOutcome(index, payload, error=exc)))
+        else:
+            prepared.append((index, results))
+
+    pending = [results for _, results in prepared if not isinstance(results, BulkOutcome)]
+    error = await _encode_batch(pending, timer, memo, refresh)
+
+    async def retrieve(index: int, results: dict[str, Any] | BulkOutcome):
+        if isinstance(results, BulkOutcome):
+            return index, results
+        if error is not None:
+            return index, BulkOutcome(index, results["payload"], error=error)
+        try:
+            return index, await ANALYSIS_GRAPH.run(
+                results, _RETRIEVAL, timer, memo=memo, refresh=refresh
+            )
+        except StageError as exc:
+            return index, BulkOutcome(index, results["payload"], error=exc)
+
+    return await asyncio.gather(*(retrieve(index, results) for index, results in prepared))
+
+
+async def _encode_batch(
+    batch: list[dict[str, Any]],
+    timer: StageTimer,
+    memo: StageMemo | ScopedMemo | None,
+    refresh: bool,
+) -> StageError | None:
+    """Fill in ``encode`` for every result in ``batch`` with one model call.
+
+    Memoized and duplicate texts are not re-encoded.  Returns the error
+    that failed the whole batch, if any.
+    """
+    keys: dict[str, str] = {}
+    vectors: dict[str, list] = {}
+    for results in batch:
+        text = results["embedding_text"]
+        if text in keys:
+            continue
+        keys[text] = ANALYSIS_GRAPH.memo_fingerprint("encode", results)
+        if memo is not None and not refresh:
+            hit, vector = await run_blocking(memo.get, "encode", keys[text])
+            if hit:
+                vectors[text] = vector
+
+    texts = [text for text in keys if text not in vectors]
+    if texts:
+        model = batch[0]["embedding_model"]
+        call = asyncio.get_running_loop().run_in_executor(None, encode_texts, model, texts)
+        try:
+            with timer.span("encode"):
+                encoded = await asyncio.wait_for(call, settings.BULK_ENCODE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return StageError("encode", DeadlineExceeded("encode"))
+        except Exception as exc:
+            return StageError("encode", exc)
+        for text, vector in zip(texts, encoded):
+            vectors[text] = vector
+            if memo is not None:
+                await run_blocking(memo.put, "encode", keys[text], vector)
+
+    for results in batch:
+        results["encode"] = vectors[results["embedding_text"]]
+    return None
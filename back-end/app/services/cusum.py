@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import statistics
 
+import numpy as np
+
 
 def detect_changepoint(
     values: list[float],
@@ -64,3 +66,75 @@ def detect_changepoint(
             }
 
     return None
+
+
+def cusum_grid(
+    values: np.ndarray,
+    k: np.ndarray,
+    h: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised :func:`detect_changepoint` over many series and parameters.
+
+    Evaluates every ``(series, k, h)`` combination in a single broadcasted
+    computation.  The CUSUM recursion ``s_t = max(0, s_{t-1} + x_t)`` is
+    rewritten as ``S_t - min(0, min_{j<=t} S_j)`` over the cumulative sum
+    ``S`` so no Python loop over time steps is needed.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape ``(P, T)`` — ``P`` series of ``T`` ordered values.
+    k : np.ndarray
+        1-D array of ``K`` slack parameters.
+    h : np.ndarray
+        1-D array of ``H`` decision thresholds.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        ``(index, direction)`` arrays of shape ``(P, K, H)``.  ``index`` is
+        the position of the first change-point (``-1`` when none is found)
+        and ``direction`` is ``1`` for an upward shift, ``-1`` for a
+        downward shift and ``0`` when nothing was detected — matching the
+        semantics of :func:`detect_changepoint` element for element.
+    """
+    values = np.asarray(values, dtype=float)
+    k = np.asarray(k, dtype=float).ravel()
+    h = np.asarray(h, dtype=float).ravel()
+    n_series, n_points = values.shape
+
+    index = np.full((n_series, k.size, h.size), -1, dtype=np.int64)
+    direction = np.zeros((n_series, k.size, h.size), dtype=np.int8)
+    if n_points < 4:
+        return index, direction
+
+    target = values[:, :3].mean(axis=1)
+    std = values.std(axis=1, ddof=1)
+    valid = std > 0
+    safe_std = np.where(valid, std, 1.0)
+
+    # (P, 1, T) deviations against (P, K, 1) slack → (P, K, T)
+    deviation = (values - target[:, None])[:, None, :]
+    slack = (k[None, :] * safe_std[:, None])[:, :, None]
+
+    def _lindley(x: np.ndarray) -> np.ndarray:
+        cumulative = np.cumsum(x, axis=-1)
+        floor = np.minimum.accumulate(np.minimum(cumulative, 0.0), axis=-1)
+        return cumulative - floor
+
+    s_high = _lindley(deviation - slack)
+    s_low = _lindley(-deviation - slack)
+
+    # (P, 1, H, 1) thresholds against (P, K, 1, T) sums → (P, K, H, T)
+    threshold = (h[None, :] * safe_std[:, None])[:, None, :, None]
+    cross_high = s_high[:, :, None, :] > threshold
+    cross_low = s_low[:, :, None, :] > threshold
+    crossed = cross_high | cross_low
+
+    found = crossed.any(axis=-1) & valid[:, None, None]
+    first = crossed.argmax(axis=-1)
+    high_at_first = np.take_along_axis(cross_high, first[..., None], axis=-1)[..., 0]
+
+    index = np.where(found, first, -1)
+    direction = np.where(found, np.where(high_at_first, 1, -1), 0).astype(np.int8)
+    return index, direction
@@ -0,0 +1,82 @@
+"""Request deadlines propagated through the analysis pipeline.
+
+A route creates one ``Deadline`` with the time the caller is prepared to
+wait (e.g. the intake frontend gives up after ~30 s) and hands it down to
+every stage.  Stages read ``remaining()`` to size their own timeouts
+(``maxTimeMS`` for MongoDB, the per-attempt LLM timeout) and skip optional
+work, such as BM25 re-ranking via ``$rankFusion``, when time is short.
+
+Attached to a ``StageTimer``, the deadline also records per-stage
+overruns: a stage that exceeds its own budget, or during which the overall
+deadline expired, is counted in ``diagnostic_pipeline_deadline_overruns_total``
+and included in the request's timing log line.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+
+from app.services.metrics import PIPELINE_DEADLINE_OVERRUNS
+
+# Soft per-stage budgets (seconds); stages not listed only have the overall deadline
+STAGE_BUDGETS = {
+    "encode": 2.0,
+    "search": 5.0,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before ``stage`` could start or finish."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded at stage '{stage}'.")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute point in time by which the request must be answered."""
+
+    def __init__(self, seconds: float, stage_budgets: dict[str, float] | None = None):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.stage_budgets = STAGE_BUDGETS if stage_budgets is None else stage_budgets
+        self.overruns: dict[str, float] = {}
+        self._expiry_recorded = False
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        """Raise DeadlineExceeded if no time is left to start ``stage``."""
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, cap: float | None = None, reserve: float = 0.0) -> float:
+        """Time available to one operation, keeping ``reserve`` seconds for later stages."""
+        available = max(self.remaining() - reserve, 0.0)
+        return available if cap is None else min(cap, available)
+
+    def max_time_ms(self, reserve: float = 0.0) -> int:
+        """``timeout()`` as a MongoDB ``maxTimeMS`` value (at least 1 ms)."""
+        return max(math.floor(self.timeout(reserve=reserve) * 1000), 1)
+
+    def record(self, stage: str, elapsed: float) -> None:
+        """Note an overrun if ``stage`` blew its budget or the deadline."""
+        budget = self.stage_budgets.get(stage)
+        overrun = 0.0
+        if budget is not None and elapsed > budget:
+            overrun = elapsed - budget
+        if self.expired and not self._expiry_recorded:
+            # First stage to cross the overall deadline owns the overshoot
+            self._expiry_recorded = True
+            overrun = max(overrun, time.monotonic() - self.expires_at)
+        if overrun > 0:
+            self.overruns[stage] = self.overruns.get(stage, 0.0) + overrun
+            PIPELINE_DEADLINE_OVERRUNS.inc(stage=stage)
+
@@ -0,0 +1,87 @@
+"""Stop pipeline work for clients that have gone away.
+
+Starlette does not cancel a handler when the client disconnects, so a
+closed browser tab would still pay for embedding, search and the GPT call.
+``run_until_disconnect`` races a coroutine against the ASGI
+``http.disconnect`` message and cancels it cooperatively (the pending LLM
+HTTP request included) at its next await.  ``cancel_on_disconnect`` does
+the same for the async generator behind a ``StreamingResponse``.
+
+Once the request body has been read, the next ``receive()`` only returns
+when the client disconnects or the response is complete, so watching it
+costs one idle task per request rather than polling.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from fastapi import Request
+
+from app.services.metrics import CLIENT_DISCONNECTS
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready."""
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Return once the client has disconnected."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _cancel(task: asyncio.Future) -> None:
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+
+
+async def run_until_disconnect(request: Request, work: Awaitable[T], route: str) -> T:
+    """Await ``work``, cancelling it if the client disconnects first.
+
+    Raises:
+        ClientDisconnected: The client went away; ``work`` was cancelled.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        await _cancel(task)
+        CLIENT_DISCONNECTS.inc(route=route)
+        raise ClientDisconnected()
+    finally:
+        watcher.cancel()
+        if not task.done():
+            await _cancel(task)
+
+
+async def cancel_on_disconnect(
+    request: Request, stream: AsyncIterator[str], route: str
+) -> AsyncIterator[str]:
+    """Relay ``stream`` until it ends or the client disconnects."""
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        while True:
+            step = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                await _cancel(step)
+                CLIENT_DISCONNECTS.inc(route=route)
+                return
+            try:
+                chunk = step.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        watcher.cancel()
+        await stream.aclose()
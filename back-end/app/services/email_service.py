@@ -4,6 +4,7 @@ import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.config import settings
+from app.services.metrics import EMAIL_INFLIGHT
 import logging
 
 logger = logging.getLogger(__name__)
@@ -99,6 +100,7 @@ async def send_appointment_email(
     )
     msg["To"] = patient_email
 
+    EMAIL_INFLIGHT.inc()
     try:
         await aiosmtplib.send(
             msg,
@@ -114,3 +116,5 @@ async def send_appointment_email(
     except Exception as e:
         logger.error(f"Failed to send email to {patient_email}: {e}")
         return False
+    finally:
+        EMAIL_INFLIGHT.dec()
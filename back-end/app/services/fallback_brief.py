@@ -0,0 +1,125 @@
+"""Deterministic, rule-based clinical brief for degraded mode.
+
+When the LLM provider times out or is down, the intake pipeline still has
+everything it computed before the LLM call: biometric deltas (with CUSUM
+change-points), the literature condition matches and the patient's risk
+factors.  ``build_provisional_brief`` turns those into a valid
+``ClinicalBrief`` in well under a millisecond, flagged ``provisional`` so
+the dashboard can label it and a background job can replace it with the
+full LLM brief later (see ``app.services.brief_upgrade``).
+"""
+
+from __future__ import annotations
+
+import re
+
+from app.models.patient import BiometricDelta, ClinicalBrief, ConditionMatch, RiskProfile
+
+# Matches the SYSTEM_PROMPT contract for the LLM brief
+GUIDING_QUESTION_COUNT = 5
+PRIMARY_CONCERN_MAX_WORDS = 5
+
+GENERIC_QUESTIONS = [
+    "When did the symptoms start, and have they changed in character or intensity?",
+    "How do the symptoms relate to your menstrual cycle?",
+    "What, if anything, makes the symptoms better or worse?",
+    "How are the symptoms affecting your sleep, work and daily activities?",
+    "Have you been evaluated or treated for these symptoms before?",
+]
+
+
+def _metric_label(metric: str) -> str:
+    """``restingHeartRate`` → ``Resting heart rate``."""
+    words = re.sub(r"(?<=[a-z])(?=[A-Z])|_", " ", metric).split()
+    return " ".join(words).capitalize()
+
+
+def _describe_delta(d: BiometricDelta) -> str:
+    direction = "increased" if d.delta > 0 else "decreased"
+    text = (
+        f"{_metric_label(d.metric)} {direction} by {abs(d.delta)} {d.unit} "
+        f"vs baseline ({d.acute_avg} vs {d.longitudinal_avg})"
+    )
+    if d.changepoint_detected and d.changepoint_date:
+        text += f", sustained shift since {d.changepoint_date}"
+    return text
+
+
+def _severity(significant: list[BiometricDelta], risk_profile: RiskProfile | None) -> str:
+    high_risk = [
+        f for f in (risk_profile.factors if risk_profile else []) if f.severity.lower() == "high"
+    ]
+    shifted = [d for d in significant if d.changepoint_detected]
+    if len(significant) >= 3 or (shifted and high_risk):
+        level = "High"
+    elif significant:
+        level = "Moderate"
+    else:
+        level = "Low"
+    return (
+        f"{level} (provisional, rule-based): {len(significant)} clinically significant "
+        f"biometric change(s), {len(shifted)} with a sustained change-point, "
+        f"{len(high_risk)} high-severity risk factor(s)."
+    )
+
+
+def build_provisional_brief(
+    narrative: str,
+    biometric_deltas: list[BiometricDelta],
+    condition_matches: list[ConditionMatch],
+    risk_profile: RiskProfile | None = None,
+) -> ClinicalBrief:
+    """Assemble a provisional ClinicalBrief without calling the LLM."""
+    significant = [d for d in biometric_deltas if d.clinically_significant]
+    top_matches = condition_matches[:3]
+    factors = risk_profile.factors if risk_profile else []
+
+    if top_matches:
+        concern_words = top_matches[0].condition.split()
+        primary_concern = " ".join(concern_words[:PRIMARY_CONCERN_MAX_WORDS])
+    else:
+        primary_concern = "Symptoms pending clinical review"
+
+    summary = (
+        "Provisional brief generated from biometric rules while the AI analysis is pending. "
+        f"{len(significant)} of {len(biometric_deltas)} tracked metrics show clinically "
+        "significant change from the 6-month baseline."
+    )
+    if top_matches:
+        summary += " Closest literature matches: " + ", ".join(
+            f"{m.condition} ({m.similarity_score})" for m in top_matches
+        ) + "."
+
+    sentences = re.split(r"(?<=[.!?])\s+", narrative.strip())
+    clinical_intake = "Patient-reported history (unedited): " + " ".join(sentences[:4])
+
+    recommended_actions = [f"Evaluate for {m.condition} ({m.title})." for m in top_matches]
+    recommended_actions += [
+        f"Weigh {f.factor} ({f.category}, {f.severity} severity) in the differential."
+        for f in factors
+        if f.severity.lower() == "high"
+    ]
+    recommended_actions.append("Review the full AI-generated brief once it is available.")
+
+    questions = [
+        f"Have you noticed the change in {_metric_label(d.metric).lower()} "
+        f"around the time your symptoms began?"
+        for d in significant
+    ]
+    questions += [
+        f"Has anyone in your family been diagnosed with {m.condition}?" for m in top_matches
+    ]
+    questions += GENERIC_QUESTIONS
+
+    return ClinicalBrief(
+        summary=summary,
+        clinical_intake=clinical_intake,
+        primary_concern=primary_concern,
+        key_symptoms=[_describe_delta(d) for d in significant],
+        severity_assessment=_severity(significant, risk_profile),
+        recommended_actions=recommended_actions,
+        cited_sources=[f"{m.condition}: {m.title}" for m in top_matches],
+        guiding_questions=questions[:GUIDING_QUESTION_COUNT],
+        source="rules",
+        provisional=True,
+    )
@@ -0,0 +1,299 @@
+"""Durable MongoDB-backed job queue and worker pool for intake submissions.
+
+``POST /intake/{token}/submit`` only validates the appointment and inserts
+a job into the ``intake_jobs`` collection; the RAG pipeline, LLM call and
+payout run later on an ``IntakeWorkerPool`` started in the app lifespan.
+
+Jobs move ``queued`` → ``running`` → ``completed`` | ``failed``.  A worker
+claims the oldest runnable job with one ``find_one_and_update`` and holds it
+for ``INTAKE_JOB_LEASE_SECONDS``; a job whose lease lapsed (the worker
+process died) becomes claimable again, so submissions survive restarts.
+Failed attempts are retried with a growing delay up to
+``INTAKE_JOB_MAX_ATTEMPTS``; a job whose last attempt's lease lapsed is
+marked failed by ``reap_expired`` rather than left running forever.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from pymongo import ReturnDocument
+
+from app.config import settings
+from app.services.metrics import INTAKE_JOB_WAIT_SECONDS, INTAKE_JOBS
+from app.services.stage_graph import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Fields exposed by the job status endpoint
+STATUS_FIELDS = ("status", "stage", "attempts", "error", "created_at", "updated_at")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # PyMongo returns naive UTC datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class IntakeJobQueue:
+    """Intake jobs stored in the ``intake_jobs`` collection of ``db``."""
+
+    def __init__(
+        self,
+        db,
+        lease_seconds: float = settings.INTAKE_JOB_LEASE_SECONDS,
+        max_attempts: int = settings.INTAKE_JOB_MAX_ATTEMPTS,
+        collection_name: str = "intake_jobs",
+    ):
+        self.collection = db[collection_name]
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self._indexed = False
+
+    def _ensure_indexes(self) -> None:
+        if self._indexed:
+            return
+        self.collection.create_index([("status", 1), ("available_at", 1)])
+        self.collection.create_index("token")
+        self._indexed = True
+
+    def enqueue(
+        self,
+        token: str,
+        payload: dict,
+        patient_id: str | None = None,
+        job_id: str | None = None,
+    ) -> str:
+        """Persist a new job for appointment ``token`` and return its id."""
+        self._ensure_indexes()
+        now = _now()
+        job_id = job_id or uuid.uuid4().hex
+        self.collection.insert_one(
+            {
+                "_id": job_id,
+                "token": token,
+                "patient_id": patient_id,
+                "payload": payload,
+                "status": "queued",
+                "stage": None,
+                "attempts": 0,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+                "available_at": now,
+            }
+        )
+        return job_id
+
+    def claim(self) -> dict | None:
+        """Atomically take the oldest runnable job, or None if there is none.
+
+        Runnable means queued and due, or running with an expired lease.
+        """
+        now = _now()
+        job = self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    {
+                        "status": "running",
+                        "lease_expires_at": {"$lt": now},
+                        "attempts": {"$lt": self.max_attempts},
+                    },
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "claimed_at": now,
+                    "lease_expires_at": now + self.lease,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            INTAKE_JOB_WAIT_SECONDS.observe((now - _aware(job["created_at"])).total_seconds())
+        return job
+
+    def reap_expired(self) -> list[dict]:
+        """Mark failed the running jobs whose final attempt's lease expired.
+
+        Their worker died on the last attempt, so ``claim`` will never take
+        them again.  Returns the jobs marked failed.
+        """
+        reaped = []
+        while True:
+            now = _now()
+            job = self.collection.find_one_and_update(
+                {
+                    "status": "running",
+                    "lease_expires_at": {"$lt": now},
+                    "attempts": {"$gte": self.max_attempts},
+                },
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error": "Lease expired on the final attempt",
+                        "updated_at": now,
+                    }
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                return reaped
+            INTAKE_JOBS.inc(outcome="failed")
+            reaped.append(job)
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        """Record the last pipeline stage the job finished."""
+        self.collection.update_one(
+            {"_id": job_id}, {"$set": {"stage": stage, "updated_at": _now()}}
+        )
+
+    def complete(self, job_id: str) -> None:
+        self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "error": None, "updated_at": _now()}},
+        )
+        INTAKE_JOBS.inc(outcome="completed")
+
+    def fail(self, job: dict, error: str) -> bool:
+        """Requeue ``job`` after a failed attempt, or mark it failed for good.
+
+        Returns:
+            True if the job will be retried.
+        """
+        now = _now()
+        retry = job.get("attempts", 1) < self.max_attempts
+        update = {"status": "queued" if retry else "failed", "error": error, "updated_at": now}
+        if retry:
+            update["available_at"] = now + timedelta(
+                seconds=settings.INTAKE_JOB_RETRY_SECONDS * job.get("attempts", 1)
+            )
+        self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+        INTAKE_JOBS.inc(outcome="retried" if retry else "failed")
+        return retry
+
+    def backlog(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self.collection.count_documents({"status": "queued"})
+
+    def get(self, job_id: str) -> dict | None:
+        return self.collection.find_one({"_id": job_id}, {"payload": 0})
+
+
+class IntakeWorkerPool:
+    """Fixed number of asyncio workers draining an ``IntakeJobQueue``.
+
+    ``handler(job)`` runs one attempt; returning marks the job completed and
+    raising requeues or fails it.  ``on_failed(job)`` is called once a job
+    has used up its attempts, including one reaped after its final lease
+    expired.  The worker count bounds how many intake
+    pipelines (and LLM calls) run at once, independent of HTTP traffic.
+    Queue round trips run on the default executor, off the event loop, and
+    expired jobs are reaped by at most one worker per poll interval.
+    """
+
+    def __init__(
+        self,
+        queue: IntakeJobQueue,
+        handler: Callable[[dict], Awaitable[None]],
+        on_failed: Callable[[dict], None] | None = None,
+        concurrency: int = settings.INTAKE_WORKERS,
+        poll_interval: float = settings.INTAKE_JOB_POLL_SECONDS,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.on_failed = on_failed
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self._next_reap = 0.0
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._run(i), name=f"intake-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was enqueued in this process."""
+        self._wakeup.set()
+
+    def spawn(self, coro: Awaitable) -> asyncio.Task:
+        """Run follow-up work (payouts, brief upgrades) outside the worker slot."""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._background:
+            await asyncio.wait(self._background, timeout=self.poll_interval * 5)
+
+    async def _run(self, worker: int) -> None:
+        while True:
+            try:
+                await self._reap()
+                job = await run_blocking(self.queue.claim)
+            except Exception as exc:
+                logger.error("Intake worker %d could not claim a job: %s", worker, exc)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job)
+
+    async def _reap(self) -> None:
+        """Fail jobs that lost their final attempt, once per poll interval."""
+        now = time.monotonic()
+        if now < self._next_reap:
+            return
+        self._next_reap = now + self.poll_interval
+        for expired in await run_blocking(self.queue.reap_expired):
+            logger.error(
+                "Intake job %s for token %s lost its final attempt; giving up",
+                expired["_id"], expired["token"],
+            )
+            if self.on_failed is not None:
+                await run_blocking(self.on_failed, expired)
+
+    async def run_job(self, job: dict) -> None:
+        """Run one attempt of ``job`` and record its outcome."""
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running; its lease expiry requeues it
+            raise
+        except Exception as exc:
+            retry = await run_blocking(self.queue.fail, job, f"{type(exc).__name__}: {exc}")
+            logger.error(
+                "Intake job %s for token %s failed (attempt %d, %s): %s",
+                job["_id"], job["token"], job.get("attempts", 1),
+                "will retry" if retry else "giving up", exc,
+            )
+            if not retry and self.on_failed is not None:
+                await run_blocking(self.on_failed, job)
+        else:
+            await run_blocking(self.queue.complete, job["_id"])
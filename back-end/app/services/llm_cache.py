@@ -0,0 +1,113 @@
+"""Persistent exact-match cache for clinical-brief LLM responses.
+
+Entries live in the ``llm_response_cache`` MongoDB collection, keyed by a
+SHA-256 of the model id, temperature, output schema and the canonicalised
+prompt messages, and hold the validated structured output.  A TTL index
+expires entries after ``LLM_CACHE_TTL_SECONDS``; the collection is trimmed
+to ``LLM_CACHE_MAX_ENTRIES`` (oldest first).  Cache failures are logged and
+treated as misses so a Mongo hiccup never fails an analysis.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+from pymongo import MongoClient
+
+from app.config import settings
+from app.services.metrics import record_cache_lookup
+from app.services.vector_search import get_collection
+
+logger = logging.getLogger(__name__)
+
+# Check the collection size every N writes rather than on every put
+_TRIM_EVERY = 100
+
+
+def _canonical(text: str) -> str:
+    """Normalise unicode, line endings and trailing whitespace."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def cache_key(model: str, temperature: float, schema: dict, messages: list[dict]) -> str:
+    """Fingerprint one LLM request; identical prompts map to the same key."""
+    material = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "schema": schema,
+            "messages": [
+                {"role": m["role"], "content": _canonical(m["content"])} for m in messages
+            ],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Exact-match response cache backed by a MongoDB collection."""
+
+    name = "llm_response"
+
+    def __init__(
+        self,
+        mongo_client: MongoClient,
+        ttl_seconds: int = settings.LLM_CACHE_TTL_SECONDS,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        collection_name: str = "llm_response_cache",
+    ):
+        self.collection = get_collection(mongo_client, collection_name)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self._indexed = False
+        self._writes = 0
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached output for ``key`` or None on a miss."""
+        try:
+            doc = self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"output": 1},
+            )
+        except Exception as exc:
+            logger.warning("LLM cache lookup failed: %s", exc)
+            doc = None
+        record_cache_lookup(self.name, hit=doc is not None)
+        return doc["output"] if doc else None
+
+    def put(self, key: str, output: dict) -> None:
+        """Store ``output`` under ``key``, enforcing TTL and size limits."""
+        now = datetime.now(timezone.utc)
+        try:
+            self._ensure_indexes()
+            self.collection.replace_one(
+                {"_id": key},
+                {"output": output, "created_at": now, "expires_at": now + self.ttl},
+                upsert=True,
+            )
+            self._writes += 1
+            if self._writes % _TRIM_EVERY == 0:
+                self._trim()
+        except Exception as exc:
+            logger.warning("LLM cache write failed: %s", exc)
+
+    def _ensure_indexes(self) -> None:
+        if self._indexed:
+            return
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self.collection.create_index("created_at")
+        self._indexed = True
+
+    def _trim(self) -> None:
+        overflow = self.collection.estimated_document_count() - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = self.collection.find({}, {"_id": 1}).sort("created_at", 1).limit(overflow)
+        self.collection.delete_many({"_id": {"$in": [d["_id"] for d in oldest]}})
@@ -4,9 +4,46 @@ Supports RAG: when retrieval_context is provided, the LLM grounds its analysis
 in the retrieved medical literature and cites specific conditions/papers.
 """
 
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+from langchain_core.utils.json import parse_partial_json
 from langchain_openai import ChatOpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from app.config import settings
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.llm_cache import LLMResponseCache, cache_key
+from app.services.metrics import (
+    LLM_CALL_SECONDS,
+    LLM_CIRCUIT_OPEN,
+    LLM_HEDGES,
+    LLM_INFLIGHT,
+    LLM_QUEUE_WAIT_SECONDS,
+    LLM_RETRIES,
+    LLM_SECTIONED_SAVED_SECONDS,
+    LLM_TOKENS,
+)
+from app.services.prompt_builder import (
+    assemble_user_message,
+    count_tokens,
+    record_prompt_tokens,
+)
+from app.services.resilience import (
+    CircuitBreaker,
+    LatencyWindow,
+    LLMUnavailableError,
+    backoff_delay,
+    hedged,
+    is_retryable,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class ClinicalBriefOutput(BaseModel):
@@ -20,6 +57,27 @@ class ClinicalBriefOutput(BaseModel):
     guiding_questions: list[str]
 
 
+class BriefOverview(BaseModel):
+    summary: str
+    clinical_intake: str
+    primary_concern: str
+    key_symptoms: list[str]
+    severity_assessment: str
+
+
+class BriefActions(BaseModel):
+    recommended_actions: list[str]
+    cited_sources: list[str]
+
+
+class BriefQuestions(BaseModel):
+    guiding_questions: list[str]
+
+
+# Independent slices of ClinicalBriefOutput for sectioned generation
+BRIEF_SECTIONS: tuple[type[BaseModel], ...] = (BriefOverview, BriefActions, BriefQuestions)
+
+
 SYSTEM_PROMPT = """You are a clinical data analyst specializing in women's health.
 Given a patient's narrative description of their symptoms, their biometric data summary, and their biological/demographic risk profile, produce a structured clinical brief.
 
@@ -42,11 +100,382 @@ Be clinical, precise, and advocacy-oriented. This brief will be presented to a p
 to combat potential dismissal of the patient's pain experience."""
 
 
+class LLMClient:
+    """Long-lived clinical-brief LLM client, built once per worker.
+
+    Holds a keep-alive ``httpx`` connection pool shared by every call, the
+    precompiled structured-output runnable, and a semaphore capping how
+    many LLM calls a worker has in flight.  Time spent waiting on the
+    semaphore is recorded in ``diagnostic_llm_queue_wait_seconds``.  With a
+    ``cache``, identical prompts are answered from it without an API call.
+    ``astream`` yields the brief incrementally for the SSE endpoint.
+
+    Every attempt runs under ``timeout`` seconds; retryable failures are
+    retried ``max_retries`` times with jittered backoff, optionally hedged,
+    and a circuit breaker fails fast while the provider keeps failing.
+    Exhausted retries and an open breaker raise ``LLMUnavailableError``.
+    """
+
+    def __init__(
+        self,
+        model: str = settings.LLM_MODEL,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        pool_size: int = settings.LLM_POOL_SIZE,
+        cache: LLMResponseCache | None = None,
+        timeout: float = settings.LLM_TIMEOUT_SECONDS,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        hedge: bool = settings.LLM_HEDGE_ENABLED,
+    ):
+        self.model = model
+        self.temperature = 0.1
+        self.cache = cache
+        self._schema = ClinicalBriefOutput.model_json_schema()
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.latencies = LatencyWindow()
+        self.breaker = CircuitBreaker(
+            settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS
+        )
+        LLM_CIRCUIT_OPEN.set_function(lambda: self.breaker.state == "open")
+        self.llm = None
+        self.structured_llm = None
+        self.stream_llm = None
+        # Structured runnables for the partial schemas of sectioned generation
+        self._section_llms: dict[type[BaseModel], object] = {}
+        # Without a key, defer so the app can still start; the first call raises
+        if settings.OPENAI_API_KEY:
+            self._build()
+
+    def _build(self) -> None:
+        self.llm = ChatOpenAI(
+            model=self.model,
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            temperature=self.temperature,
+            http_async_client=self.http_client,
+            stream_usage=True,
+            # Retries are handled by ainvoke's policy, not the SDK
+            max_retries=0,
+        )
+        self.structured_llm = self.llm.with_structured_output(
+            ClinicalBriefOutput, strict=True, include_raw=True
+        )
+        # Same strict JSON schema, but streamed as raw text for partial parsing
+        self.stream_llm = self.llm.bind(
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": ClinicalBriefOutput.__name__,
+                    "strict": True,
+                    "schema": {**self._schema, "additionalProperties": False},
+                },
+            }
+        )
+
+    def _structured(self, schema: type[BaseModel]):
+        if schema is ClinicalBriefOutput:
+            return self.structured_llm
+        if schema not in self._section_llms:
+            self._section_llms[schema] = self.llm.with_structured_output(
+                schema, strict=True, include_raw=True
+            )
+        return self._section_llms[schema]
+
+    def _cached(
+        self,
+        messages: list[dict],
+        bypass_cache: bool,
+        schema: type[BaseModel] = ClinicalBriefOutput,
+    ) -> tuple[str | None, BaseModel | None]:
+        """Return ``(cache_key, cached_output)``; either may be None."""
+        if self.cache is None:
+            return None, None
+        json_schema = self._schema if schema is ClinicalBriefOutput else schema.model_json_schema()
+        key = cache_key(self.model, self.temperature, json_schema, messages)
+        if bypass_cache:
+            return key, None
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        try:
+            return key, schema.model_validate(cached)
+        except ValidationError:
+            return key, None
+
+    async def ainvoke(
+        self,
+        messages: list[dict],
+        bypass_cache: bool = False,
+        deadline: Deadline | None = None,
+        schema: type[BaseModel] = ClinicalBriefOutput,
+        admitted: bool = False,
+    ) -> BaseModel:
+        """Run the structured-output call under the concurrency limit.
+
+        ``schema`` selects the output model; it defaults to the full brief
+        and is a partial schema for sectioned generation.  ``admitted``
+        means the caller already holds an ``admission()`` covering this
+        call, as sectioned generation does for all its sections.
+
+        ``bypass_cache`` skips the cache lookup but still refreshes the
+        stored entry with the new response.  With a ``deadline``, attempt
+        timeouts are capped by the time left, retries stop once the backoff
+        would overrun it, and running out raises ``DeadlineExceeded``.
+        """
+        key, cached = self._cached(messages, bypass_cache, schema)
+        if cached is not None:
+            return cached
+
+        if self.structured_llm is None:
+            self._build()
+        runnable = self._structured(schema)
+        if admitted:
+            result = await self._call_with_retries(messages, deadline, runnable)
+        else:
+            async with self.admission(deadline):
+                result = await self._call_with_retries(messages, deadline, runnable)
+        _record_token_usage(result["raw"])
+
+        if result["parsing_error"] is not None:
+            raise result["parsing_error"]
+        output = result["parsed"]
+        if key is not None:
+            self.cache.put(key, output.model_dump())
+        return output
+
+    @asynccontextmanager
+    async def admission(self, deadline: Deadline | None = None):
+        """Hold one circuit-breaker admission for the upstream calls in the block.
+
+        Raises ``CircuitOpenError`` up front while the breaker is open.
+        Retryable failures escaping the block count against the breaker and
+        surface as ``LLMUnavailableError``; running out of ``deadline``
+        surfaces as ``DeadlineExceeded``.
+        """
+        probe = self.breaker.before_call()
+        try:
+            yield
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            if deadline is not None and deadline.expired:
+                # Our budget ran out, not necessarily the provider's fault
+                raise DeadlineExceeded("llm") from exc
+            if not is_retryable(exc):
+                # A bad request or schema error says nothing about provider health
+                raise
+            self.breaker.record_failure()
+            raise LLMUnavailableError(
+                f"LLM call failed after {self.max_retries + 1} attempts: {exc!r}",
+                retry_after=settings.LLM_BREAKER_RESET_SECONDS,
+            ) from exc
+        else:
+            self.breaker.record_success()
+        finally:
+            # Cancelled or deadline-bound probes record no outcome
+            if probe:
+                self.breaker.end_probe()
+
+    async def _attempt(self, messages: list[dict], timeout: float, runnable) -> dict:
+        """One upstream call under the concurrency limit and per-call deadline."""
+        queued = time.perf_counter()
+        async with self.semaphore:
+            LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued)
+            LLM_INFLIGHT.inc()
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(runnable.ainvoke(messages), timeout)
+            except BaseException:
+                LLM_CALL_SECONDS.observe(time.perf_counter() - start, outcome="error")
+                raise
+            finally:
+                LLM_INFLIGHT.dec()
+        elapsed = time.perf_counter() - start
+        LLM_CALL_SECONDS.observe(elapsed, outcome="ok")
+        self.latencies.add(elapsed)
+        return result
+
+    def _hedge_delay(self) -> float | None:
+        if not self.hedge:
+            return None
+        p95 = self.latencies.percentile(0.95)
+        return p95 if p95 is not None else settings.LLM_HEDGE_DELAY_SECONDS
+
+    async def _call_with_retries(
+        self, messages: list[dict], deadline: Deadline | None, runnable
+    ) -> dict:
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = self.timeout
+            if deadline is not None:
+                deadline.check("llm")
+                timeout = deadline.timeout(cap=self.timeout)
+            try:
+                return await hedged(
+                    lambda: self._attempt(messages, timeout, runnable),
+                    self._hedge_delay(),
+                    on_hedge=LLM_HEDGES.inc,
+                )
+            except Exception as exc:
+                if attempt > self.max_retries or not is_retryable(exc):
+                    raise
+                delay = backoff_delay(
+                    attempt,
+                    settings.LLM_RETRY_BASE_DELAY_SECONDS,
+                    settings.LLM_RETRY_MAX_DELAY_SECONDS,
+                )
+                if deadline is not None and delay >= deadline.remaining():
+                    raise
+                LLM_RETRIES.inc()
+                await asyncio.sleep(delay)
+
+    async def astream(
+        self,
+        messages: list[dict],
+        bypass_cache: bool = False,
+        deadline: Deadline | None = None,
+    ) -> AsyncIterator[dict]:
+        """Stream the structured output as progressively fuller partial dicts.
+
+        Each item is the JSON object parsed so far; the last item is the
+        complete, validated output.  Cache hits yield a single item.  With a
+        ``deadline``, waiting for a semaphore slot and for each chunk is
+        bounded by the time left; running out raises DeadlineExceeded.
+        """
+        key, cached = self._cached(messages, bypass_cache)
+        if cached is not None:
+            yield cached.model_dump()
+            return
+
+        if self.stream_llm is None:
+            self._build()
+        if deadline is not None:
+            deadline.check("llm")
+        probe = self.breaker.before_call()
+        try:
+            queued = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.semaphore.acquire(),
+                    None if deadline is None else deadline.timeout(),
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("llm") from None
+            try:
+                LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued)
+                LLM_INFLIGHT.inc()
+                start = time.perf_counter()
+                text = ""
+                message = None
+                chunks = self.stream_llm.astream(messages).__aiter__()
+                try:
+                    while True:
+                        # The timeout applies between chunks: a stalled stream fails
+                        timeout = self.timeout
+                        if deadline is not None:
+                            timeout = deadline.timeout(cap=self.timeout)
+                        try:
+                            chunk = await asyncio.wait_for(anext(chunks), timeout)
+                        except StopAsyncIteration:
+                            break
+                        except Exception as exc:
+                            if deadline is not None and deadline.expired:
+                                # Our budget ran out, not necessarily the provider's fault
+                                raise DeadlineExceeded("llm") from exc
+                            if not is_retryable(exc):
+                                raise
+                            self.breaker.record_failure()
+                            raise LLMUnavailableError(
+                                f"LLM stream failed: {exc!r}",
+                                retry_after=settings.LLM_BREAKER_RESET_SECONDS,
+                            ) from exc
+                        message = chunk if message is None else message + chunk
+                        if not isinstance(chunk.content, str) or not chunk.content:
+                            continue
+                        text += chunk.content
+                        partial = parse_partial_json(text)
+                        if isinstance(partial, dict):
+                            yield partial
+                    output = ClinicalBriefOutput.model_validate_json(text)
+                except BaseException:
+                    LLM_CALL_SECONDS.observe(time.perf_counter() - start, outcome="error")
+                    raise
+                finally:
+                    LLM_INFLIGHT.dec()
+            finally:
+                self.semaphore.release()
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start, outcome="ok")
+            self.breaker.record_success()
+        finally:
+            # A stream closed early (disconnect, GeneratorExit) or out of
+            # time records no outcome
+            if probe:
+                self.breaker.end_probe()
+        _record_token_usage(message)
+
+        if key is not None:
+            self.cache.put(key, output.model_dump())
+        yield output.model_dump()
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+
+_default_client: LLMClient | None = None
+
+
+def get_default_llm_client() -> LLMClient:
+    """Return a lazily-built shared client for callers outside the app lifespan."""
+    global _default_client
+    if _default_client is None:
+        cache = None
+        if settings.LLM_CACHE_ENABLED and settings.MONGODB_URI:
+            from app.services.vector_search import get_mongo_client
+            cache = LLMResponseCache(get_mongo_client())
+        _default_client = LLMClient(cache=cache)
+    return _default_client
+
+
+def build_user_message(
+    narrative: str,
+    biometric_summary: str,
+    risk_summary: str = "",
+    retrieval_context: str = "",
+) -> tuple[str, dict[str, int]]:
+    """Assemble the token-budgeted user turn of the clinical-brief prompt.
+
+    Returns the message and its token count per section.
+    """
+    return assemble_user_message(
+        {
+            "risk": risk_summary,
+            "retrieval": retrieval_context,
+            "biometrics": biometric_summary,
+            "narrative": narrative,
+        }
+    )
+
+
 async def extract_clinical_brief(
     narrative: str,
     biometric_summary: str,
     risk_summary: str = "",
     retrieval_context: str = "",
+    client: LLMClient | None = None,
+    bypass_cache: bool = False,
+    deadline: Deadline | None = None,
+    sectioned: bool | None = None,
 ) -> ClinicalBriefOutput:
     """Call GPT-5.2 with structured output to produce a clinical brief.
 
@@ -55,31 +484,124 @@ async def extract_clinical_brief(
         biometric_summary: Formatted biometric delta summary.
         risk_summary: Formatted demographic and genetic risk profile.
         retrieval_context: Optional RAG context with matched conditions and papers.
+        client: Pooled LLMClient (``app.state.llm_client``); defaults to a
+            process-wide shared client.
+        bypass_cache: Ignore any cached response for this exact prompt.
+        deadline: Request deadline bounding attempt timeouts and retries.
+        sectioned: Generate the brief as concurrent partial calls (defaults
+            to ``LLM_SECTIONED_GENERATION``).
     """
-    llm = ChatOpenAI(
-        model="gpt-5.2-2025-12-11",
-        api_key=settings.OPENAI_API_KEY,
-        temperature=0.1,
-    )
-    structured_llm = llm.with_structured_output(
-        ClinicalBriefOutput, strict=True
-    )
+    if sectioned is None:
+        sectioned = settings.LLM_SECTIONED_GENERATION
+    client = client or get_default_llm_client()
+    messages = _brief_messages(narrative, biometric_summary, risk_summary, retrieval_context)
+    if sectioned:
+        return await _extract_sectioned(client, messages, bypass_cache, deadline)
+    return await client.ainvoke(messages, bypass_cache=bypass_cache, deadline=deadline)
 
-    user_message = f"## Patient Narrative\n{narrative}\n\n"
-    user_message += f"## Biometric Data Summary\n{biometric_summary}\n\n"
 
-    if risk_summary:
-        user_message += f"## Clinical Risk Profile (Demographics, Genetics, Comorbidities)\n{risk_summary}\n\n"
+async def _extract_sectioned(
+    client: LLMClient,
+    messages: list[dict],
+    bypass_cache: bool,
+    deadline: Deadline | None,
+) -> ClinicalBriefOutput:
+    """Generate each BRIEF_SECTIONS slice in its own concurrent call and merge.
 
-    if retrieval_context:
-        user_message += f"## Retrieved Medical Literature (RAG Context)\n{retrieval_context}\n\n"
+    Every call shares the same system + user prefix (so prompt caching still
+    applies) and ends with an instruction naming only its fields.  Output
+    tokens are produced in parallel, so wall time tracks the slowest
+    section rather than the sum.  The estimated saving (sum of section
+    latencies minus wall time) is exported and logged.
 
-    user_message += "Produce the clinical brief."
+    The sections share one breaker admission, so a half-open breaker
+    probes with the whole brief, and the first section to fail cancels
+    the others rather than leaving them to hold slots for a lost brief.
+    """
 
-    result = await structured_llm.ainvoke(
-        [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
+    async def timed(schema: type[BaseModel]) -> tuple[BaseModel, float]:
+        fields = ", ".join(schema.model_fields)
+        section_messages = messages + [
+            {
+                "role": "user",
+                "content": f"For this response, produce only these fields of the brief: {fields}.",
+            }
         ]
+        start = time.perf_counter()
+        result = await client.ainvoke(
+            section_messages,
+            bypass_cache=bypass_cache,
+            deadline=deadline,
+            schema=schema,
+            admitted=True,
+        )
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    async with client.admission(deadline):
+        tasks = [asyncio.create_task(timed(schema)) for schema in BRIEF_SECTIONS]
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    wall = time.perf_counter() - start
+
+    merged: dict = {}
+    for part, _ in results:
+        merged.update(part.model_dump())
+    saved = max(sum(elapsed for _, elapsed in results) - wall, 0.0)
+    LLM_SECTIONED_SAVED_SECONDS.observe(saved)
+    logger.info(
+        "Sectioned brief generation: wall %.2fs, sections %s, saved %.2fs",
+        wall,
+        [round(elapsed, 2) for _, elapsed in results],
+        saved,
+    )
+    return ClinicalBriefOutput.model_validate(merged)
+
+
+def _brief_messages(
+    narrative: str,
+    biometric_summary: str,
+    risk_summary: str,
+    retrieval_context: str,
+) -> list[dict]:
+    user_message, section_tokens = build_user_message(
+        narrative, biometric_summary, risk_summary, retrieval_context
     )
-    return result
+    record_prompt_tokens({"system": count_tokens(SYSTEM_PROMPT), **section_tokens})
+    # SYSTEM_PROMPT first: the stable prefix is what provider prompt caching reuses
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def stream_clinical_brief(
+    narrative: str,
+    biometric_summary: str,
+    risk_summary: str = "",
+    retrieval_context: str = "",
+    client: LLMClient | None = None,
+    bypass_cache: bool = False,
+    deadline: Deadline | None = None,
+) -> AsyncIterator[dict]:
+    """Streaming variant of :func:`extract_clinical_brief`.
+
+    Yields partial ``ClinicalBriefOutput`` dicts as the model generates
+    them; the final item is complete and schema-valid.  ``deadline`` bounds
+    the wait for a slot and for every chunk.
+    """
+    client = client or get_default_llm_client()
+    messages = _brief_messages(narrative, biometric_summary, risk_summary, retrieval_context)
+    async for partial in client.astream(messages, bypass_cache=bypass_cache, deadline=deadline):
+        yield partial
+
+
+def _record_token_usage(message) -> None:
+    """Add the provider-reported token usage of ``message`` to the counters."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), type="input")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), type="output")
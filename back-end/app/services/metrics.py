@@ -0,0 +1,364 @@
+"""In-process Prometheus-style metrics (counters, gauges and histograms).
+
+Every metric registers itself on creation and is rendered in the Prometheus
+text exposition format by ``GET /metrics``.  Metrics are per worker process;
+scrape each worker (or aggregate in Prometheus) when running several.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from typing import Callable
+
+# Latency buckets (seconds) spanning sub-millisecond Mongo reads to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], extra: tuple[tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._functions: dict[tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Evaluate ``fn`` on every scrape instead of storing a value."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return float(self._functions[key]())
+        return self._values.get(key, 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return [
+            f"{self.name}{self._labels(k)} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(c), self._sums[k]) for k, c in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+PIPELINE_STAGE_SECONDS = Histogram(
+    "diagnostic_pipeline_stage_seconds",
+    "Duration of each analysis pipeline stage.",
+    ("stage",),
+)
+
+PIPELINE_DEADLINE_OVERRUNS = Counter(
+    "diagnostic_pipeline_deadline_overruns_total",
+    "Pipeline stages that exceeded their budget or the request deadline.",
+    ("stage",),
+)
+
+PIPELINE_CANCELLATIONS = Counter(
+    "diagnostic_pipeline_cancellations_total",
+    "Pipeline stages cancelled mid-flight because every waiting client disconnected.",
+    ("stage",),
+)
+
+CLIENT_DISCONNECTS = Counter(
+    "diagnostic_client_disconnects_total",
+    "Requests abandoned by the client before the response was complete.",
+    ("route",),
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "diagnostic_http_request_seconds",
+    "HTTP request latency by route template, method and status code.",
+    ("route", "method", "status"),
+)
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "diagnostic_mongo_command_seconds",
+    "MongoDB command latency as reported by the driver.",
+    ("command", "outcome"),
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "diagnostic_llm_call_seconds",
+    "Latency of clinical-brief LLM calls.",
+    ("outcome",),
+)
+
+LLM_TOKENS = Counter(
+    "diagnostic_llm_tokens_total",
+    "Tokens consumed by clinical-brief LLM calls.",
+    ("type",),
+)
+
+PROMPT_SECTION_TOKENS = Histogram(
+    "diagnostic_prompt_section_tokens",
+    "Tokens per section of the clinical-brief prompt after budgeting.",
+    ("section",),
+    buckets=(50, 100, 250, 500, 750, 1000, 1500, 2000, 4000),
+)
+
+LLM_SECTIONED_SAVED_SECONDS = Histogram(
+    "diagnostic_llm_sectioned_saved_seconds",
+    "Estimated wall-clock saved by sectioned generation (sum of section latencies minus wall time).",
+)
+
+ADMISSION_REQUESTS = Counter(
+    "diagnostic_admission_requests_total",
+    "Admission decisions per route pool (admitted, admitted_after_wait, rejected_*).",
+    ("pool", "result"),
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "diagnostic_admission_in_flight",
+    "Requests currently holding an admission slot, per route pool.",
+    ("pool",),
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "diagnostic_admission_wait_seconds",
+    "Time requests spent in an admission queue before a slot or rejection.",
+    ("pool",),
+)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "diagnostic_llm_queue_wait_seconds",
+    "Time LLM calls wait for a slot under the per-worker concurrency limit.",
+)
+
+LLM_INFLIGHT = Gauge(
+    "diagnostic_llm_inflight",
+    "LLM calls currently in flight on this worker.",
+)
+
+LLM_RETRIES = Counter(
+    "diagnostic_llm_retries_total",
+    "LLM call attempts retried after a retryable failure.",
+)
+
+LLM_HEDGES = Counter(
+    "diagnostic_llm_hedges_total",
+    "Duplicate (hedged) LLM calls fired after the p95 delay.",
+)
+
+LLM_CIRCUIT_OPEN = Gauge(
+    "diagnostic_llm_circuit_open",
+    "1 while the LLM circuit breaker is failing fast, else 0.",
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "diagnostic_embedding_batch_size",
+    "Number of texts encoded per embedding model call.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+EMBEDDING_SECONDS = Histogram(
+    "diagnostic_embedding_seconds",
+    "Latency of embedding model calls.",
+)
+
+CACHE_REQUESTS = Counter(
+    "diagnostic_cache_requests_total",
+    "Cache lookups by cache name and result (hit / miss).",
+    ("cache", "result"),
+)
+
+CACHE_HIT_RATIO = Gauge(
+    "diagnostic_cache_hit_ratio",
+    "Fraction of lookups served from cache since process start.",
+    ("cache",),
+)
+
+CACHE_ENTRIES = Gauge(
+    "diagnostic_cache_entries",
+    "Number of entries currently held by each in-process cache.",
+    ("cache",),
+)
+
+QUEUE_DEPTH = Gauge(
+    "diagnostic_background_queue_depth",
+    "Background work queued or in flight (payouts, brief upgrades).",
+    ("queue",),
+)
+for _queue in ("payout", "brief_upgrade"):
+    QUEUE_DEPTH.set(0, queue=_queue)
+
+EMAIL_INFLIGHT = Gauge(
+    "diagnostic_email_inflight",
+    "Appointment emails currently being sent (inline, by the scheduling routes).",
+)
+EMAIL_INFLIGHT.set(0)
+
+INTAKE_JOBS = Counter(
+    "diagnostic_intake_jobs_total",
+    "Intake job attempts by outcome (completed / retried / failed).",
+    ("outcome",),
+)
+
+INTAKE_JOB_WAIT_SECONDS = Histogram(
+    "diagnostic_intake_job_wait_seconds",
+    "Time from intake submission until a worker claims the job.",
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "diagnostic_single_flight_calls_total",
+    "Single-flight calls that started a run (executed) or joined one in flight (coalesced).",
+    ("name", "result"),
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache lookup and keep the cache's hit-ratio gauge current."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    CACHE_HIT_RATIO.set_function(lambda: _hit_ratio(cache), cache=cache)
+
+
+def _hit_ratio(cache: str) -> float:
+    hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+    total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+    return hits / total if total else 0.0
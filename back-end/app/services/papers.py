@@ -0,0 +1,103 @@
+"""Europe PMC paper PDFs, cached in memory for the paper proxy route.
+
+``warm_pdfs`` starts background fetches for the papers an analysis just
+matched, so the PDFs are usually cached by the time the doctor opens one
+from the dashboard.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import httpx
+
+from app.services.metrics import CACHE_ENTRIES, record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Simple in-memory PDF cache: pmcid -> bytes
+_pdf_cache: dict[str, bytes] = {}
+# Track failed lookups so we don't retry them
+_failed: set[str] = set()
+# Warm-up fetches in flight, by pmcid (also keeps the tasks referenced)
+_warming: dict[str, asyncio.Task] = {}
+
+CACHE_ENTRIES.set_function(lambda: len(_pdf_cache), cache="paper_pdf")
+
+
+class PaperUnavailable(Exception):
+    """Europe PMC has no PDF for ``pmcid``."""
+
+    def __init__(self, pmcid: str):
+        super().__init__(f"PDF not available for {pmcid}")
+        self.pmcid = pmcid
+
+
+async def fetch_pdf(pmcid: str, record: bool = True) -> bytes:
+    """Fetch PDF bytes from Europe PMC, using cache.
+
+    ``record=False`` keeps warm-up fetches out of the cache hit ratio.  A
+    paper whose warm-up is still downloading is taken from that fetch
+    rather than downloaded a second time.
+
+    Raises:
+        PaperUnavailable: no PDF for ``pmcid`` (remembered, not retried).
+    """
+    warming = _warming.get(pmcid)
+    if warming is not None and warming is not asyncio.current_task():
+        # Shielded: a client going away must not cancel the shared warm-up
+        await asyncio.shield(warming)
+    if pmcid in _pdf_cache:
+        if record:
+            record_cache_lookup("paper_pdf", hit=True)
+        return _pdf_cache[pmcid]
+    if pmcid in _failed:
+        if record:
+            record_cache_lookup("paper_pdf", hit=True)
+        raise PaperUnavailable(pmcid)
+
+    if record:
+        record_cache_lookup("paper_pdf", hit=False)
+    content = await _download(pmcid)
+    if content is None:
+        _failed.add(pmcid)
+        raise PaperUnavailable(pmcid)
+
+    _pdf_cache[pmcid] = content
+    return content
+
+
+async def _download(pmcid: str) -> bytes | None:
+    """PDF bytes from Europe PMC, or None if it has no PDF for ``pmcid``."""
+    url = f"https://europepmc.org/backend/ptpmcrender.fcgi?accid={pmcid}&blobtype=pdf"
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
+        resp = await client.get(url)
+
+    if resp.status_code != 200 or "pdf" not in resp.headers.get("content-type", ""):
+        return None
+    return resp.content
+
+
+async def _warm(pmcid: str) -> None:
+    try:
+        await fetch_pdf(pmcid, record=False)
+    except Exception as exc:
+        logger.info("PDF warm-up for %s failed: %s", pmcid, exc)
+    finally:
+        _warming.pop(pmcid, None)
+
+
+def warm_pdfs(pmcids: list[str]) -> int:
+    """Start background fetches of uncached PDFs; returns how many started.
+
+    Does not wait for them, so analysis latency is unaffected.
+    """
+    started = 0
+    for pmcid in dict.fromkeys(p for p in pmcids if p):
+        if pmcid in _pdf_cache or pmcid in _failed or pmcid in _warming:
+            continue
+        _warming[pmcid] = asyncio.get_running_loop().create_task(_warm(pmcid))
+        started += 1
+    return started
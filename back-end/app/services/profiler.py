@@ -0,0 +1,96 @@
+"""Statistical sampling profiler for live workers.
+
+A background thread snapshots every thread's Python stack via
+``sys._current_frames()`` at a fixed interval and aggregates the samples
+into the "collapsed stack" format (``root;child;leaf count``) consumed by
+flamegraph.pl, speedscope and similar tools.
+
+Nothing runs unless a profile has been started, so the cost while idle is
+zero; only one profile can run per worker at a time.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+# Most recent finished profiles kept for GET /admin/profiles/{id}
+MAX_STORED_PROFILES = 20
+
+_active_lock = threading.Lock()
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample all thread stacks every ``interval`` seconds until stopped."""
+
+    def __init__(self, interval: float = 0.005):
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = 0.0
+        self.duration = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        if not _active_lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running on this worker.")
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        """Stop sampling, store the profile and return its id."""
+        if self._stop.is_set():
+            return self.id
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+        _active_lock.release()
+
+        _profiles[self.id] = self.collapsed()
+        while len(_profiles) > MAX_STORED_PROFILES:
+            _profiles.popitem(last=False)
+        return self.id
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((t.ident, t.name) for t in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(thread_id, thread_id)}")
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Render the samples as collapsed stacks, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def get_profile(profile_id: str) -> str | None:
+    """Return a stored collapsed-stack profile by id."""
+    return _profiles.get(profile_id)
@@ -0,0 +1,139 @@
+"""Token-budgeted assembly of the clinical-brief prompt.
+
+Counts tokens with the configured model's ``tiktoken`` encoding and keeps
+each section of the user message within its own budget, so a long
+narrative or a larger retrieval top-k cannot inflate cost and latency
+without bound.  Retrieved snippets are deduplicated (same paper, repeated
+sentences) before they are trimmed.
+
+Sections are ordered from most to least stable across requests, after the
+fixed ``SYSTEM_PROMPT``, so the longest possible prefix is shared between
+calls and eligible for provider-side prompt caching.
+
+If the tokenizer files cannot be loaded (e.g. no network on first use), a
+~4 characters/token estimate is used instead.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from functools import lru_cache
+
+from app.config import settings
+from app.services.metrics import PROMPT_SECTION_TOKENS
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = " […]"
+
+# (key, heading) from most to least stable across requests
+SECTIONS = [
+    ("risk", "## Clinical Risk Profile (Demographics, Genetics, Comorbidities)"),
+    ("retrieval", "## Retrieved Medical Literature (RAG Context)"),
+    ("biometrics", "## Biometric Data Summary"),
+    ("narrative", "## Patient Narrative"),
+]
+
+
+def section_budgets() -> dict[str, int]:
+    return {
+        "risk": settings.PROMPT_BUDGET_RISK_TOKENS,
+        "retrieval": settings.PROMPT_BUDGET_RETRIEVAL_TOKENS,
+        "biometrics": settings.PROMPT_BUDGET_BIOMETRICS_TOKENS,
+        "narrative": settings.PROMPT_BUDGET_NARRATIVE_TOKENS,
+    }
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        logger.warning("tiktoken unavailable (%s); estimating tokens from length", exc)
+        return None
+
+
+def count_tokens(text: str, model: str = settings.LLM_MODEL) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return math.ceil(len(text) / 4)
+    return len(enc.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = settings.LLM_MODEL) -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens (marker included)."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 0)
+    enc = _encoding(model)
+    if enc is None:
+        head = text[: keep * 4]
+    else:
+        head = enc.decode(enc.encode(text)[:keep])
+    return head.rstrip() + TRUNCATION_MARKER
+
+
+def _sentences(text: str) -> list[str]:
+    return [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s]
+
+
+def _normalise(sentence: str) -> str:
+    return re.sub(r"\W+", " ", sentence.lower()).strip()
+
+
+def dedupe_matches(matches: list[dict], max_snippet_tokens: int) -> list[dict]:
+    """Drop repeated papers and sentences already quoted by an earlier match.
+
+    Matches keep their order (best first); each remaining snippet is then
+    trimmed to ``max_snippet_tokens``.
+    """
+    seen_papers: set[str] = set()
+    seen_sentences: set[str] = set()
+    result = []
+    for m in matches:
+        paper = m.get("pmcid") or m.get("title")
+        if paper and paper in seen_papers:
+            continue
+        if paper:
+            seen_papers.add(paper)
+        fresh = []
+        for sentence in _sentences(m.get("snippet", "")):
+            key = _normalise(sentence)
+            if key and key not in seen_sentences:
+                seen_sentences.add(key)
+                fresh.append(sentence)
+        result.append({**m, "snippet": truncate_tokens(" ".join(fresh), max_snippet_tokens)})
+    return result
+
+
+def assemble_user_message(sections: dict[str, str]) -> tuple[str, dict[str, int]]:
+    """Build the user turn from ``sections`` keyed as in ``SECTIONS``.
+
+    Each section is trimmed to its budget; empty sections are omitted.
+    Returns the message and the token count of every included section.
+    """
+    budgets = section_budgets()
+    parts = []
+    tokens = {}
+    for key, heading in SECTIONS:
+        text = sections.get(key, "")
+        if not text:
+            continue
+        text = truncate_tokens(text, budgets[key])
+        parts.append(f"{heading}\n{text}\n\n")
+        tokens[key] = count_tokens(text)
+    return "".join(parts) + "Produce the clinical brief.", tokens
+
+
+def record_prompt_tokens(section_tokens: dict[str, int]) -> None:
+    """Export per-section token counts and log them at debug level."""
+    for section, n in section_tokens.items():
+        PROMPT_SECTION_TOKENS.observe(n, section=section)
+    logger.debug("Prompt tokens by section: %s", section_tokens)
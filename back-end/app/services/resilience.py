@@ -0,0 +1,169 @@
+"""Timeouts, retries, hedging and circuit breaking for upstream calls.
+
+Used by ``LLMClient`` so that a slow or degraded model provider costs a
+bounded amount of time per request instead of holding it open:
+
+- every attempt runs under a per-call deadline (``asyncio.wait_for``)
+- retryable failures are retried with capped exponential backoff and
+  full jitter
+- optionally, a duplicate "hedge" attempt is started once the first has
+  run longer than the recent p95 latency; whichever finishes first wins
+- a circuit breaker fails fast once consecutive calls keep failing, and
+  lets a single probe through after a cool-down
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM provider timed out, kept failing, or the breaker is open."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Timeouts, connection errors, 429s and 5xx responses are worth retrying."""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    try:
+        import openai
+    except ImportError:  # pragma: no cover - openai ships with langchain-openai
+        return False
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed → open → half-open)."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless a call may go upstream now.
+
+        Returns True if the call is the half-open probe; the caller must
+        ``end_probe`` once it finishes, whatever the outcome.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        remaining = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+        raise CircuitOpenError(
+            "LLM provider circuit is open after repeated failures.",
+            retry_after=remaining or self.reset_timeout,
+        )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def end_probe(self) -> None:
+        """Let the next call probe again if this probe recorded no outcome.
+
+        A probe that was cancelled or ran out of request deadline says
+        nothing about the provider; without this the breaker would stay
+        half-open with a probe that never finishes.
+        """
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Rolling window of recent successful call latencies."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, minimum_samples: int = 20) -> float | None:
+        """Return the ``q`` quantile, or None until enough samples exist."""
+        if len(self._samples) < minimum_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: float | None,
+    on_hedge: Callable[[], None] | None = None,
+) -> T:
+    """Run ``call``; if it is still pending after ``delay`` seconds, start a
+    second copy and return whichever succeeds first.
+
+    The loser is cancelled.  If both fail, the first error is raised.
+    """
+    if delay is None:
+        return await call()
+
+    first = asyncio.ensure_future(call())
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        # asyncio.wait does not cancel what it waits on
+        first.cancel()
+        raise
+    if done:
+        return first.result()
+
+    if on_hedge is not None:
+        on_hedge()
+    pending = {first, asyncio.ensure_future(call())}
+    error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
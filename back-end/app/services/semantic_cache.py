@@ -0,0 +1,88 @@
+"""In-memory semantic cache for clinical briefs.
+
+Near-duplicate intakes (same story and biometrics, different wording) miss
+the exact-match LLM cache but would get an interchangeable first-draft
+brief.  This cache indexes previously generated briefs by the PubMedBERT
+query vector the pipeline already computes and serves a stored brief when
+the cosine similarity of a new query clears ``SEMANTIC_CACHE_THRESHOLD``.
+
+The index is a fixed-capacity ring buffer of L2-normalised vectors, so a
+lookup is a single matrix-vector product.  Entries are partitioned by a
+``scope`` string (the patient's risk factors) so a brief is never reused
+across different demographic risk contexts.  The cache is per worker and
+is lost on restart.
+"""
+
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.services.llm_extractor import ClinicalBriefOutput
+from app.services.metrics import CACHE_ENTRIES, record_cache_lookup
+
+
+class SemanticBriefCache:
+    """Cosine-similarity index of prior clinical briefs."""
+
+    name = "semantic_brief"
+
+    def __init__(
+        self,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: np.ndarray | None = None
+        self._scopes: list[str | None] = [None] * max_entries
+        self._outputs: list[ClinicalBriefOutput | None] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        CACHE_ENTRIES.set_function(lambda: self._size, cache=self.name)
+
+    @staticmethod
+    def _normalise(vector: list[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(
+        self, vector: list[float], scope: str = ""
+    ) -> tuple[ClinicalBriefOutput, float] | None:
+        """Return ``(brief, similarity)`` for the closest entry above threshold."""
+        query = self._normalise(vector)
+        hit = None
+        with self._lock:
+            if self._size:
+                scores = self._vectors[: self._size] @ query
+                for i in np.argsort(scores)[::-1]:
+                    if scores[i] < self.threshold:
+                        break
+                    if self._scopes[i] == scope:
+                        hit = (self._outputs[i], float(scores[i]))
+                        break
+        record_cache_lookup(self.name, hit=hit is not None)
+        return hit
+
+    def add(self, vector: list[float], output: ClinicalBriefOutput, scope: str = "") -> None:
+        """Index ``output`` under ``vector``, evicting the oldest entry when full."""
+        v = self._normalise(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+            self._vectors[self._next] = v
+            self._scopes[self._next] = scope
+            self._outputs[self._next] = output
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+
+def risk_scope(risk_profile) -> str:
+    """Partition key for a patient's risk profile (factor and severity pairs)."""
+    if not risk_profile or not risk_profile.factors:
+        return ""
+    return "|".join(sorted(f"{f.factor}:{f.severity}" for f in risk_profile.factors))
@@ -0,0 +1,88 @@
+"""Single-flight coalescing of identical concurrent work.
+
+Clinician dashboards can fire the same ``/analyze-patient`` request several
+times within seconds.  ``SingleFlight.do(key, fn)`` runs ``fn`` once per
+``key`` at a time: callers that arrive while a run is in flight await the
+same task and receive its result (or its exception).  Nothing is cached
+once the run finishes; later requests start a new one.
+
+The run is a separate task that callers await through ``asyncio.shield``,
+so a caller going away does not cancel the work the others wait on.  Each
+run counts its waiting callers; when the last one is cancelled (e.g. every
+client disconnected), the run itself is cancelled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+
+from app.services.metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+def payload_key(payload: BaseModel, *extra) -> str:
+    """SHA-256 of the payload's canonical JSON (sorted keys) plus ``extra``."""
+    material = json.dumps(
+        [payload.model_dump(mode="json"), list(extra)],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls by key within this worker process."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Run ``fn()`` unless a call for ``key`` is already in flight.
+
+        Returns:
+            ``(result, shared)`` where ``shared`` is True if this caller
+            joined another caller's run.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, result="coalesced")
+        else:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, result="executed")
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Nobody else is waiting for this run
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,232 @@
+"""Declarative stage graph for the analysis pipeline.
+
+Each ``Stage`` names the values it consumes in ``inputs``: seed values the
+caller supplies (payload, clients, deadline …) or the outputs of other
+stages, which are stored under the stage's own name.  ``StageGraph.run``
+starts every needed stage as its own task once its inputs exist, so
+independent branches (e.g. the semantic-cache lookup and vector search,
+both waiting only on the embedding) overlap instead of running in source
+order.
+
+- ``cpu`` stages (model inference, blocking driver calls) run on the
+  default thread-pool executor so they do not stall the event loop
+- ``timeout`` bounds one stage; running out raises ``DeadlineExceeded``
+  with the stage's name, like a request deadline
+- ``when`` gates a stage on its inputs; a skipped stage yields None and
+  records no timing span
+- ``optional`` stages log failures and yield None instead of failing the run
+- ``memo_key`` stages are looked up in a ``StageMemo`` by the fingerprint
+  of those inputs (plus ``version``) before running, and stored after;
+  both round trips run on the executor
+
+A value already present in the seeds is not recomputed, so callers can
+pass in results they hold from an earlier run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from app.services.deadline import DeadlineExceeded
+from app.services.stage_memo import ScopedMemo, StageMemo, fingerprint
+from app.services.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of a ``StageGraph``; ``fn`` is called with ``inputs`` as keywords."""
+
+    name: str
+    fn: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    cpu: bool = False
+    timeout: float | None = None
+    when: Callable[..., bool] | None = None
+    optional: bool = False
+    memo_key: tuple[str, ...] | None = None
+    version: str = ""
+
+
+class StageError(Exception):
+    """Stage ``stage`` raised ``cause``; the remaining stages were cancelled."""
+
+    def __init__(self, stage: str, cause: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+
+class StageGraph:
+    """Validated, acyclic set of stages that can be run for any targets."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage '{stage.name}'")
+            if stage.memo_key is not None and not set(stage.memo_key) <= set(stage.inputs):
+                raise ValueError(f"memo_key of '{stage.name}' must name its inputs")
+            self.stages[stage.name] = stage
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        state: dict[str, str] = {}
+
+        def visit(name: str, path: tuple[str, ...]) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Stage cycle: {' -> '.join(path + (name,))}")
+            state[name] = "visiting"
+            for dep in self.stages[name].inputs:
+                if dep in self.stages:
+                    visit(dep, path + (name,))
+            state[name] = "done"
+
+        for name in self.stages:
+            visit(name, ())
+
+    def plan(self, targets: Iterable[str], available: Iterable[str] = ()) -> list[str]:
+        """Stages needed for ``targets`` given ``available`` values, in dependency order.
+
+        Raises:
+            ValueError: a target or input is neither a stage nor available.
+        """
+        available = set(available)
+        order: list[str] = []
+        seen: set[str] = set()
+
+        def visit(name: str, needed_by: str | None) -> None:
+            if name in available or name in seen:
+                return
+            if name not in self.stages:
+                where = f" (input of '{needed_by}')" if needed_by else ""
+                raise ValueError(f"Unknown stage or missing input '{name}'{where}")
+            seen.add(name)
+            for dep in self.stages[name].inputs:
+                visit(dep, name)
+            order.append(name)
+
+        for target in targets:
+            visit(target, None)
+        return order
+
+    def memo_fingerprint(self, name: str, values: dict[str, Any]) -> str:
+        """Memo key of stage ``name`` for the inputs in ``values``."""
+        stage = self.stages[name]
+        return fingerprint(stage.name, stage.version, [values[key] for key in stage.memo_key])
+
+    async def run(
+        self,
+        seeds: dict[str, Any],
+        targets: Iterable[str],
+        timer: StageTimer | None = None,
+        memo: StageMemo | ScopedMemo | None = None,
+        refresh: bool = False,
+    ) -> dict[str, Any]:
+        """Run the stages ``targets`` depend on and return seeds plus all outputs.
+
+        With ``memo``, memoized stages reuse stored outputs; ``refresh``
+        recomputes them and overwrites the stored entries.
+
+        Raises:
+            StageError: a required stage failed or timed out.
+        """
+        results = dict(seeds)
+        tasks: dict[str, asyncio.Task] = {}
+        for name in self.plan(targets, results):
+            stage = self.stages[name]
+            deps = [tasks[dep] for dep in stage.inputs if dep in tasks]
+            tasks[name] = asyncio.create_task(
+                self._run_stage(stage, deps, results, timer, memo, refresh),
+                name=f"stage-{name}",
+            )
+        if not tasks:
+            return results
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            await _cancel(tasks.values())
+            raise
+        failed = next((t for t in done if not t.cancelled() and t.exception() is not None), None)
+        if failed is not None:
+            await _cancel(pending)
+            raise failed.exception()
+        return results
+
+    async def _run_stage(
+        self,
+        stage: Stage,
+        deps: list[asyncio.Task],
+        results: dict[str, Any],
+        timer: StageTimer | None,
+        memo: StageMemo | ScopedMemo | None,
+        refresh: bool,
+    ) -> None:
+        if deps:
+            # A failed dependency re-raises its StageError here
+            await asyncio.gather(*deps)
+        kwargs = {name: results[name] for name in stage.inputs}
+        if stage.when is not None and not stage.when(**kwargs):
+            results[stage.name] = None
+            return
+        key = None
+        if memo is not None and stage.memo_key is not None:
+            key = self.memo_fingerprint(stage.name, results)
+            hit, output = (False, None) if refresh else await run_blocking(memo.get, stage.name, key)
+            if hit:
+                results[stage.name] = output
+                return
+        try:
+            with timer.span(stage.name) if timer is not None else nullcontext():
+                results[stage.name] = await self._call(stage, kwargs)
+            if key is not None:
+                await run_blocking(memo.put, stage.name, key, results[stage.name])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if not stage.optional:
+                raise StageError(stage.name, exc) from exc
+            logger.warning("Optional stage '%s' failed: %s", stage.name, exc)
+            results[stage.name] = None
+
+    @staticmethod
+    async def _call(stage: Stage, kwargs: dict[str, Any]) -> Any:
+        if stage.cpu:
+            # The thread keeps running after a timeout; only the wait is abandoned
+            call = asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(stage.fn, **kwargs)
+            )
+        else:
+            call = stage.fn(**kwargs)
+            if not inspect.isawaitable(call):
+                return call
+        if stage.timeout is None:
+            return await call
+        try:
+            return await asyncio.wait_for(call, stage.timeout)
+        except asyncio.TimeoutError as exc:
+            if isinstance(exc, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded(stage.name) from exc
+
+
+async def run_blocking(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking call (a MongoDB round trip) on the default executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+async def _cancel(tasks: Iterable[asyncio.Task]) -> None:
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
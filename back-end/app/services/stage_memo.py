@@ -0,0 +1,131 @@
+"""Content-addressed memo of stage-graph outputs.
+
+A memoized ``Stage`` is keyed by ``fingerprint`` — a SHA-256 over the
+stage name, its ``version`` and the canonical JSON of the inputs named in
+its ``memo_key``.  Equal inputs give equal keys in every worker, so the
+outputs live in one shared MongoDB collection (``stage_memo``): re-running
+an analysis after a prompt change finds the embedding and retrieval
+results already there and only the LLM stage does real work.
+
+Memoized outputs must be BSON-serialisable (lists, dicts, numbers,
+strings).  A TTL index expires entries after ``STAGE_MEMO_TTL_SECONDS``.
+Search outputs depend on the literature corpus, which is not among the
+stage's inputs: its ``version`` carries ``CORPUS_VERSION`` and
+``seed_db.py`` calls ``clear("search")`` after re-seeding.  Failures are
+logged and treated as misses.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from pydantic import BaseModel
+from pymongo import MongoClient
+
+from app.config import settings
+from app.services.metrics import record_cache_lookup
+from app.services.vector_search import get_collection
+
+logger = logging.getLogger(__name__)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    # Clients, models, deadlines … have no stable content to hash
+    raise TypeError(f"Cannot fingerprint {type(value).__name__}")
+
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 of the canonical JSON (sorted keys) of ``parts``."""
+    material = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=_jsonable)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class StageMemo:
+    """Stage outputs keyed by input fingerprint, in a MongoDB collection."""
+
+    def __init__(
+        self,
+        mongo_client: MongoClient,
+        ttl_seconds: int = settings.STAGE_MEMO_TTL_SECONDS,
+        collection_name: str = "stage_memo",
+    ):
+        self.collection = get_collection(mongo_client, collection_name)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._indexed = False
+
+    def get(self, stage: str, key: str) -> tuple[bool, Any]:
+        """Return ``(True, output)`` for a stored entry, else ``(False, None)``."""
+        try:
+            doc = self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"output": 1},
+            )
+        except Exception as exc:
+            logger.warning("Stage memo lookup for '%s' failed: %s", stage, exc)
+            doc = None
+        record_cache_lookup(f"stage_{stage}", hit=doc is not None)
+        return (True, doc["output"]) if doc else (False, None)
+
+    def put(self, stage: str, key: str, output: Any) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            self._ensure_indexes()
+            self.collection.replace_one(
+                {"_id": key},
+                {"stage": stage, "output": output, "created_at": now, "expires_at": now + self.ttl},
+                upsert=True,
+            )
+        except Exception as exc:
+            logger.warning("Stage memo write for '%s' failed: %s", stage, exc)
+
+    def clear(self, stage: str) -> int:
+        """Delete every stored output of ``stage``; returns how many."""
+        return self.collection.delete_many({"stage": stage}).deleted_count
+
+    def _ensure_indexes(self) -> None:
+        if self._indexed:
+            return
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self._indexed = True
+
+
+class ScopedMemo:
+    """Entries owned by one caller, in front of the shared ``StageMemo``.
+
+    Intake drafts keep their entries on the appointment, so the submit
+    reuses the draft's embedding and retrieval even with the shared memo
+    disabled or expired.  Shared hits are copied into ``entries`` too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        entries: dict[str, Any] | None = None,
+        shared: StageMemo | None = None,
+    ):
+        self.name = name
+        self.entries = dict(entries or {})
+        self.shared = shared
+
+    def get(self, stage: str, key: str) -> tuple[bool, Any]:
+        hit = key in self.entries
+        record_cache_lookup(self.name, hit=hit)
+        if hit:
+            return True, self.entries[key]
+        if self.shared is None:
+            return False, None
+        hit, output = self.shared.get(stage, key)
+        if hit:
+            self.entries[key] = output
+        return hit, output
+
+    def put(self, stage: str, key: str, output: Any) -> None:
+        self.entries[key] = output
+        if self.shared is not None:
+            self.shared.put(stage, key, output)
@@ -0,0 +1,81 @@
+"""Per-request stage timing for the analysis pipeline.
+
+A ``StageTimer`` is created per request and handed to the pipeline.  Each
+stage is wrapped in ``timer.span(name)``; the collected durations are
+emitted as a ``Server-Timing`` response header, as one structured log line
+per request, and into the ``diagnostic_pipeline_stage_seconds`` histogram.
+With a ``Deadline`` attached, each finished span is also checked for
+budget overruns, which are added to the log line.  A stage interrupted by
+cancellation (the client went away) is counted in
+``diagnostic_pipeline_cancellations_total``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from app.services.deadline import Deadline
+from app.services.metrics import PIPELINE_CANCELLATIONS, PIPELINE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Collect wall-clock durations of named pipeline stages."""
+
+    def __init__(self, deadline: Deadline | None = None):
+        self.stages: dict[str, float] = {}
+        self.deadline = deadline
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as stage ``name`` (durations accumulate)."""
+        start = time.perf_counter()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            PIPELINE_CANCELLATIONS.inc(stage=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            PIPELINE_STAGE_SECONDS.observe(elapsed, stage=name)
+            if self.deadline is not None:
+                self.deadline.record(name, elapsed)
+
+    @property
+    def total(self) -> float:
+        """Seconds elapsed since the timer was created."""
+        return time.perf_counter() - self._started
+
+    def durations_ms(self) -> dict[str, float]:
+        """Stage durations in milliseconds, plus ``total``."""
+        durations = {name: round(s * 1000, 1) for name, s in self.stages.items()}
+        durations["total"] = round(self.total * 1000, 1)
+        return durations
+
+    def server_timing(self) -> str:
+        """Format the stages as a ``Server-Timing`` header value (ms)."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(entries)
+
+    def log(self, event: str, **fields) -> None:
+        """Emit one structured (JSON) log line with the stage breakdown."""
+        record = {
+            "event": event,
+            **fields,
+            "stages_ms": {name: round(s * 1000, 1) for name, s in self.stages.items()},
+            "total_ms": round(self.total * 1000, 1),
+        }
+        if self.deadline is not None:
+            record["deadline_ms"] = round(self.deadline.budget * 1000, 1)
+            record["overruns_ms"] = {
+                name: round(s * 1000, 1) for name, s in self.deadline.overruns.items()
+            }
+        logger.info(json.dumps(record))
@@ -1,12 +1,75 @@
 """MongoDB Atlas hybrid search service (vector + BM25 via $rankFusion)."""
 
-from pymongo import MongoClient
+import asyncio
+import functools
+import weakref
+
+from pymongo import MongoClient, UpdateOne, monitoring
+from pymongo.errors import ExecutionTimeout
 from app.config import settings
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.metrics import MONGO_COMMAND_SECONDS
+
+
+class _CommandMetrics(monitoring.CommandListener):
+    """Feed driver-reported command durations into the Mongo latency histogram."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name, outcome="ok"
+        )
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name, outcome="error"
+        )
 
 
 def get_mongo_client() -> MongoClient:
     """Create and return a MongoDB client."""
-    return MongoClient(settings.MONGODB_URI)
+    return MongoClient(settings.MONGODB_URI, event_listeners=[_CommandMetrics()])
+
+
+# Client-level bulk_write (several collections in one round trip) is a
+# MongoDB 8.0 server command; cached per client after one buildInfo
+_CLIENT_BULK_WRITE_MIN_VERSION = (8, 0)
+_client_bulk_write: "weakref.WeakKeyDictionary[MongoClient, bool]" = weakref.WeakKeyDictionary()
+
+
+def supports_client_bulk_write(client: MongoClient) -> bool:
+    """Whether the server accepts ``MongoClient.bulk_write`` (MongoDB 8.0+)."""
+    if client not in _client_bulk_write:
+        version = tuple(client.server_info()["versionArray"][:2])
+        _client_bulk_write[client] = version >= _CLIENT_BULK_WRITE_MIN_VERSION
+    return _client_bulk_write[client]
+
+
+def bulk_update(
+    client: MongoClient, updates: list[tuple[str, dict, dict]], ordered: bool = True
+) -> list[int]:
+    """Apply ``(namespace, filter, update)`` updates; returns each matched count.
+
+    One client-level ``bulk_write`` round trip on MongoDB 8.0+; on older
+    servers one ``update_one`` per update, in order.
+    """
+    if supports_client_bulk_write(client):
+        result = client.bulk_write(
+            [UpdateOne(query, update, namespace=namespace) for namespace, query, update in updates],
+            ordered=ordered,
+            verbose_results=True,
+        )
+        return [
+            result.update_results[i].matched_count if i in result.update_results else 0
+            for i in range(len(updates))
+        ]
+    matched = []
+    for namespace, query, update in updates:
+        db_name, collection = namespace.split(".", 1)
+        matched.append(client[db_name][collection].update_one(query, update).matched_count)
+    return matched
 
 
 def get_collection(client: MongoClient, collection_name: str = "medical_conditions"):
@@ -15,11 +78,40 @@ def get_collection(client: MongoClient, collection_name: str = "medical_conditio
     return db[collection_name]
 
 
+def hybrid_search_allowed(deadline: Deadline | None) -> bool:
+    """Whether enough time is left for hybrid re-ranking (``$rankFusion``)."""
+    if deadline is None:
+        return True
+    reserve = settings.DEADLINE_LLM_RESERVE_SECONDS
+    return deadline.timeout(reserve=reserve) >= settings.SEARCH_HYBRID_MIN_SECONDS
+
+
 async def search_conditions(
     client: MongoClient,
     query_vector: list,
     query_text: str = "",
     top_k: int = 5,
+    deadline: Deadline | None = None,
+) -> list:
+    """Run ``find_conditions`` on the default thread-pool executor.
+
+    PyMongo blocks for the whole aggregation; off the event loop, other
+    requests and pipeline branches keep running and a caller's
+    ``asyncio.wait_for`` can fire.  A timed-out search keeps its thread
+    until ``maxTimeMS`` (from ``deadline``) stops it on the server.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None,
+        functools.partial(find_conditions, client, query_vector, query_text, top_k, deadline),
+    )
+
+
+def find_conditions(
+    client: MongoClient,
+    query_vector: list,
+    query_text: str = "",
+    top_k: int = 5,
+    deadline: Deadline | None = None,
 ) -> list:
     """Run hybrid search combining $vectorSearch (semantic) and $search (BM25).
 
@@ -28,9 +120,23 @@ async def search_conditions(
 
     Falls back to pure vector search if query_text is empty or if
     $rankFusion is unavailable (older Atlas clusters).
+
+    With a ``deadline``, each aggregation gets a ``maxTimeMS`` from the time
+    left.  The hybrid query keeps ``DEADLINE_LLM_RESERVE_SECONDS`` back for
+    the LLM and is skipped (vector-only) when that leaves less than
+    ``SEARCH_HYBRID_MIN_SECONDS``.
     """
     collection = get_collection(client)
 
+    hybrid_options = {}
+    vector_options = {}
+    if deadline is not None:
+        deadline.check("search")
+        if not hybrid_search_allowed(deadline):
+            query_text = ""
+        reserve = settings.DEADLINE_LLM_RESERVE_SECONDS
+        hybrid_options["maxTimeMS"] = deadline.max_time_ms(reserve=reserve)
+
     if query_text:
         # Hybrid search: vector + BM25 via $rankFusion
         try:
@@ -81,7 +187,7 @@ async def search_conditions(
                     }
                 },
             ]
-            results = list(collection.aggregate(pipeline))
+            results = list(collection.aggregate(pipeline, **hybrid_options))
             if results:
                 return results
         except Exception:
@@ -110,5 +216,11 @@ async def search_conditions(
             }
         },
     ]
-    results = list(collection.aggregate(pipeline))
+    if deadline is not None:
+        deadline.check("search")
+        vector_options["maxTimeMS"] = deadline.max_time_ms()
+    try:
+        results = list(collection.aggregate(pipeline, **vector_options))
+    except ExecutionTimeout:
+        raise DeadlineExceeded("search")
     return results
@@ -10,6 +10,8 @@ from xrpl.models.transactions import Payment
 from xrpl.transaction import submit_and_wait
 from xrpl.utils import xrp_to_drops
 
+from app.services.metrics import QUEUE_DEPTH
+
 logger = logging.getLogger(__name__)
 
 TESTNET_URL = "https://s.altnet.rippletest.net:51234"
@@ -75,7 +77,9 @@ async def process_research_payout(target_address: str, amount: int = 10) -> dict
     """Send a research-participation payout to the patient's XRPL wallet.
 
     Designed to be invoked as a FastAPI BackgroundTask so that ledger
-    consensus does not block the main request thread.
+    consensus does not block the main request thread.  Callers increment
+    the ``payout`` queue-depth gauge when queueing; it is decremented here
+    once the payout settles or fails.
 
     Args:
         target_address: The patient's public XRPL wallet address.
@@ -104,3 +108,5 @@ async def process_research_payout(target_address: str, amount: int = 10) -> dict
             exc,
         )
         raise
+    finally:
+        QUEUE_DEPTH.dec(queue="payout")
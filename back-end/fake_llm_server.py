@@ -0,0 +1,252 @@
+"""Local OpenAI-compatible chat-completions stand-in for offline load testing.
+
+Answers ``POST /v1/chat/completions`` with JSON that satisfies whatever
+``response_format`` JSON schema (or single function tool) the request
+carries, so ``extract_clinical_brief`` - full, sectioned or streamed -
+gets schema-valid ``ClinicalBriefOutput`` data without network access or
+spend.  Latency is modelled as a log-normal time-to-first-token plus
+output tokens at a fixed generation rate, and errors can be injected to
+exercise retries, the circuit breaker and backpressure.
+
+Point the API at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+
+Usage:
+    cd back-end
+    python fake_llm_server.py --port 8089 --ttft-median 0.8 --tokens-per-second 60
+    python fake_llm_server.py --error-rate 0.05 --rate-limit-rate 0.05 --hang-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "patient reports cyclic pelvic pain with elevated resting heart rate reduced "
+    "heart rate variability and disrupted sleep consistent with inflammatory burden"
+).split()
+
+# Array lengths that the clinical-brief prompt asks for
+ARRAY_LENGTHS = {"guiding_questions": 5}
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def fill_schema(schema: dict, rng: random.Random, name: str = "", defs: dict | None = None):
+    """Generate a value matching a (strict-mode subset of) JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fill_schema(defs[schema["$ref"].split("/")[-1]], rng, name, defs)
+    if "anyOf" in schema:
+        return fill_schema(schema["anyOf"][0], rng, name, defs)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next(k for k in kind if k != "null")
+    if kind == "object":
+        return {
+            key: fill_schema(sub, rng, key, defs)
+            for key, sub in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        length = ARRAY_LENGTHS.get(name, rng.randint(2, 4))
+        return [fill_schema(schema.get("items", {}), rng, name, defs) for _ in range(length)]
+    if kind == "integer":
+        return rng.randint(0, 10)
+    if kind == "number":
+        return round(rng.random(), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if name == "primary_concern":
+        return _sentence(rng, 3).rstrip(".")
+    if name.endswith("questions"):
+        return _sentence(rng, 9).rstrip(".") + "?"
+    return _sentence(rng, rng.randint(12, 30))
+
+
+def _requested_schema(body: dict) -> tuple[dict, str | None]:
+    """Return ``(json_schema, tool_name)`` from response_format or a forced tool."""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return response_format["json_schema"]["schema"], None
+    tools = body.get("tools") or []
+    if tools:
+        function = tools[0]["function"]
+        return function.get("parameters", {}), function["name"]
+    return {"type": "object", "properties": {"summary": {"type": "string"}}}, None
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(math.ceil(len(text) / 4), 1)
+
+
+def create_app(options: argparse.Namespace) -> FastAPI:
+    """Build the fake server; ``options`` carries the parsed CLI flags."""
+    app = FastAPI(title="Fake OpenAI chat completions")
+    rng = random.Random(options.seed)
+    stats = {"requests": 0, "errors": 0, "in_flight": 0}
+
+    def ttft() -> float:
+        if options.ttft_median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(options.ttft_median), options.ttft_sigma)
+
+    def injected_error() -> JSONResponse | None:
+        roll = rng.random()
+        if roll < options.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Injected server error", "type": "server_error"}},
+                status_code=500,
+            )
+        if roll < options.error_rate + options.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+        return None
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": options.model, "object": "model"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            stats["errors"] += 1
+            return error
+        if rng.random() < options.hang_rate:
+            await asyncio.sleep(options.hang_seconds)
+
+        schema, tool_name = _requested_schema(body)
+        content = json.dumps(fill_schema(schema, rng))
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in body["messages"])
+        completion_tokens = _estimate_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", options.model)
+        first_token = ttft()
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream(completion_id, created, model, content, first_token, usage, body),
+                media_type="text/event-stream",
+            )
+
+        stats["in_flight"] += 1
+        try:
+            await asyncio.sleep(first_token + completion_tokens / options.tokens_per_second)
+        finally:
+            stats["in_flight"] -= 1
+        message = {"role": "assistant", "content": content, "refusal": None}
+        if tool_name is not None:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{uuid.uuid4().hex[:24]}",
+                        "type": "function",
+                        "function": {"name": tool_name, "arguments": content},
+                    }
+                ],
+            }
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_name else "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    async def _stream(completion_id, created, model, content, first_token, usage, body):
+        def chunk(delta: dict, finish_reason=None, usage_block=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage_block is not None:
+                payload["choices"] = []
+                payload["usage"] = usage_block
+            return f"data: {json.dumps(payload)}\n\n"
+
+        stats["in_flight"] += 1
+        try:
+            await asyncio.sleep(first_token)
+            yield chunk({"role": "assistant", "content": ""})
+            # ~4 characters per token, paced at the configured generation rate
+            step = 16
+            for i in range(0, len(content), step):
+                await asyncio.sleep((step / 4) / options.tokens_per_second)
+                yield chunk({"content": content[i : i + step]})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, usage_block=usage)
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--model", default="gpt-5.2-2025-12-11", help="Model id reported by /v1/models")
+    parser.add_argument("--ttft-median", type=float, default=0.8,
+                        help="Median time to first token in seconds (log-normal; 0 disables)")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5,
+                        help="Log-normal sigma of time to first token (tail heaviness)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0,
+                        help="Output generation rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0,
+                        help="Fraction of requests that stall for --hang-seconds before answering")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main():
+    import uvicorn
+
+    options = parse_args()
+    uvicorn.run(create_app(options), host=options.host, port=options.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
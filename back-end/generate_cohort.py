@@ -0,0 +1,209 @@
+"""Generate a large synthetic patient cohort for load and scale testing.
+
+Uses the per-condition ``acute_config`` / ``long_config`` templates from
+``seed_mock_patients.py``: each synthetic patient is a noisy copy of a
+randomly chosen template, with noise, trends and flagged spikes sampled for
+a whole chunk of patients at once with NumPy.  Documents have the same shape
+as the ones ``seed_mock_patients.py`` inserts (``patients`` + ``appointments``
+with ``patient_payload`` and ``analysis_result``) and are marked
+``synthetic: true`` so they can be removed again with ``--drop``.
+
+Usage:
+    cd back-end
+    python generate_cohort.py --count 100000 --jsonl cohort.jsonl
+    python generate_cohort.py --count 100000 --mongo --chunk-size 5000
+    python generate_cohort.py --drop --mongo --count 0   # remove synthetic docs
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from pymongo import MongoClient
+from seed_mock_patients import (
+    ACUTE_METRIC_KEYS,
+    LONG_METRIC_KEYS,
+    get_acute_dates,
+    get_long_dates,
+    patients_list,
+    sample_metric_series,
+)
+
+END_DATE = "2026-03-10"
+
+
+def _series_docs(values: np.ndarray, dates: list[str], unit: str, spikes: dict | None,
+                 acute: bool) -> list[list[dict]]:
+    """Turn an ``(n, len(dates))`` value array into per-patient point lists."""
+    date_key, flag_key = ("date", "flag") if acute else ("week_start", "trend")
+    flags = {i: flag for i, (_, flag) in (spikes or {}).items() if flag}
+    rows = values.astype(int).tolist() if unit == "count" else values.tolist()
+
+    series = []
+    for row in rows:
+        points = []
+        for i, (date, value) in enumerate(zip(dates, row)):
+            point = {date_key: date, "value": value, "unit": unit}
+            if i in flags:
+                point[flag_key] = flags[i]
+            points.append(point)
+        series.append(points)
+    return series
+
+
+def _template_group(pt: dict, n: int, acute_dates: list[str], long_dates: list[str],
+                    rng: np.random.Generator, now: str) -> list[tuple[dict, dict]]:
+    """Build ``n`` (patient, appointment) document pairs from one template."""
+    acute = {
+        name: _series_docs(
+            sample_metric_series(n, len(acute_dates), unit=unit, rng=rng, **pt["acute_config"][key])[0],
+            acute_dates, unit, pt["acute_config"][key].get("spikes"), acute=True,
+        )
+        for key, (name, unit) in ACUTE_METRIC_KEYS.items()
+    }
+    longitudinal = {
+        name: _series_docs(
+            sample_metric_series(n, len(long_dates), unit=unit, rng=rng, **pt["long_config"][key])[0],
+            long_dates, unit, pt["long_config"][key].get("spikes"), acute=False,
+        )
+        for key, (name, unit) in LONG_METRIC_KEYS.items()
+    }
+    menstrual = [
+        {"date": acute_dates[i], "value": phase, "unit": "phase"}
+        for i, phase in enumerate(pt.get("menstrual_phases", []))
+    ]
+    concern = pt.get("clinical_brief", {}).get("primary_concern", pt["narrative"][:50] + "...")
+
+    pairs = []
+    for i in range(n):
+        patient_id = f"pt_synth_{uuid.uuid4().hex[:12]}"
+        acute_metrics = {name: series[i] for name, series in acute.items()}
+        acute_metrics["menstrualCyclePhase"] = menstrual
+
+        patient_record = {
+            "id": patient_id,
+            "name": pt["name"],
+            "email": f"{patient_id}@example.com",
+            "xrp_wallet_address": f"rSynth{uuid.uuid4().hex[:16]}",
+            "xrp_wallet_seed": "sMockSeed...",
+            "created_at": now,
+            "status": "completed",
+            "concern": concern,
+            "synthetic": True,
+        }
+        appointment_record = {
+            "id": str(uuid.uuid4()),
+            "patient_id": patient_id,
+            "date": END_DATE,
+            "time": pt["time"],
+            "status": "completed",
+            "form_token": str(uuid.uuid4()),
+            "created_at": now,
+            "synthetic": True,
+            "patient_payload": {
+                "patient_id": patient_id,
+                "sync_timestamp": now,
+                "hardware_source": "Apple Watch Series 9",
+                "patient_narrative": pt["narrative"],
+                "data": {
+                    "acute_7_day": {"granularity": "daily_summary", "metrics": acute_metrics},
+                    "longitudinal_6_month": {
+                        "granularity": "weekly_average",
+                        "metrics": {name: series[i] for name, series in longitudinal.items()},
+                    },
+                },
+                "risk_profile": pt["risk_profile"],
+            },
+            "analysis_result": {
+                "patient_id": patient_id,
+                "clinical_brief": pt["clinical_brief"],
+                "biometric_deltas": pt["deltas"],
+                "condition_matches": pt["conditions"],
+                "risk_profile": pt["risk_profile"],
+            },
+        }
+        pairs.append((patient_record, appointment_record))
+    return pairs
+
+
+def generate_chunks(count: int, chunk_size: int, rng: np.random.Generator):
+    """Yield lists of (patient, appointment) pairs, ``chunk_size`` at a time."""
+    acute_dates = get_acute_dates(END_DATE, 7)
+    long_dates = get_long_dates(END_DATE, 26)
+    now = datetime.now(timezone.utc).isoformat()
+
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        per_template = np.bincount(rng.integers(len(patients_list), size=size),
+                                   minlength=len(patients_list))
+        chunk = []
+        for pt, n in zip(patients_list, per_template):
+            if n:
+                chunk.extend(_template_group(pt, int(n), acute_dates, long_dates, rng, now))
+        rng.shuffle(chunk)
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000, help="Number of patients (default 1000)")
+    parser.add_argument("--chunk-size", type=int, default=2000,
+                        help="Patients generated and inserted per batch (default 2000)")
+    parser.add_argument("--jsonl", help="Write one {patient, appointment} object per line to this file")
+    parser.add_argument("--mongo", action="store_true", help="Insert documents into MongoDB")
+    parser.add_argument("--drop", action="store_true",
+                        help="Delete previously generated synthetic documents first")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    db = None
+    if args.mongo:
+        print(f"Connecting to MongoDB, DB: {settings.MONGODB_DB_NAME}")
+        client = MongoClient(settings.MONGODB_URI)
+        db = client[settings.MONGODB_DB_NAME]
+        if args.drop:
+            p = db.patients.delete_many({"synthetic": True})
+            a = db.appointments.delete_many({"synthetic": True})
+            print(f"Dropped {p.deleted_count} synthetic patients, {a.deleted_count} appointments")
+
+    if not (args.jsonl or db is not None):
+        parser.error("nothing to do — pass --jsonl and/or --mongo")
+    if args.drop and args.count == 0:
+        return
+
+    rng = np.random.default_rng(args.seed)
+    out = open(args.jsonl, "w") if args.jsonl else None
+    started = time.perf_counter()
+    written = 0
+    try:
+        for chunk in generate_chunks(args.count, args.chunk_size, rng):
+            if out:
+                out.writelines(
+                    json.dumps({"patient": p, "appointment": a}) + "\n" for p, a in chunk
+                )
+            if db is not None:
+                # insert_many adds _id in place, so JSONL is written first
+                db.patients.insert_many([p for p, _ in chunk], ordered=False)
+                db.appointments.insert_many([a for _, a in chunk], ordered=False)
+            written += len(chunk)
+            rate = written / (time.perf_counter() - started)
+            print(f"  {written}/{args.count} patients ({rate:,.0f}/s)")
+    finally:
+        if out:
+            out.close()
+
+    print(f"Generated {written} synthetic patients in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Re-run retrieval (and optionally the LLM) for every completed intake.
+
+After ``medical_conditions`` is re-seeded or the embedding model changes,
+the ``analysis_result.condition_matches`` stored on completed appointments
+are stale.  This streams those appointments by ``_id`` cursor, rebuilds
+each ``PatientPayload`` from its ``patient_payload`` and runs it through
+the bulk pipeline (``app.services.bulk_analysis``): one embedding call per
+batch, concurrent vector searches and, with ``--llm``, at most
+``--llm-concurrency`` brief generations at a time.
+
+Appointments are read in chunks; each chunk is written back with one
+client-level ``bulk_write`` (per-document updates before MongoDB 8.0,
+see ``bulk_update``) and the last ``_id`` is then saved to the
+checkpoint file, so an interrupted run resumes where it stopped (pass
+``--restart`` to start over).  Without ``--llm`` only the condition matches
+are replaced and the stored brief is kept.  The stage memo is refreshed,
+not read, so live requests also see the new retrieval results.
+
+``--dry-run`` writes nothing (checkpoint included) and prints, for every
+appointment whose results would change, the old and new matches.
+
+Usage:
+    cd back-end
+    python reanalyze.py --dry-run --limit 50
+    python reanalyze.py --batch-size 64
+    python reanalyze.py --llm --llm-concurrency 4 --checkpoint llm_run.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# Must be set before any ML imports
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import MongoClient
+
+from app.config import settings
+from app.models.patient import PatientPayload
+from app.services.analysis_pipeline import pipeline_seeds
+from app.services.bulk_analysis import analyze_bulk
+from app.services.embeddings import load_embedding_model
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_extractor import LLMClient
+from app.services.stage_memo import StageMemo
+from app.services.timing import StageTimer
+from app.services.vector_search import bulk_update
+
+COMPLETED = {"status": "completed", "patient_payload": {"$exists": True}}
+
+
+def load_checkpoint(path: str) -> dict:
+    """Progress of an earlier run, or a fresh one if there is none."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_id": None, "processed": 0, "changed": 0, "failed": 0}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def read_chunks(db, after: str | None, chunk_size: int, limit: int | None):
+    """Yield lists of completed appointments in ``_id`` order, after ``after``."""
+    query = dict(COMPLETED)
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = (
+        db.appointments.find(
+            query,
+            {"patient_payload": 1, "analysis_result": 1, "patient_id": 1, "form_token": 1},
+        )
+        .sort("_id", 1)
+        .batch_size(chunk_size)
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _match_keys(matches) -> list[tuple]:
+    return [(m.get("condition"), m.get("pmcid")) for m in matches or []]
+
+
+def describe_change(doc: dict, analysis: dict, with_llm: bool) -> list[str]:
+    """Lines describing how ``analysis`` differs from the stored result (empty if not)."""
+    stored = doc.get("analysis_result") or {}
+    old, new = _match_keys(stored.get("condition_matches")), _match_keys(analysis["condition_matches"])
+    lines = []
+    if old != new:
+        lines.append("    - " + ", ".join(f"{c} ({p})" for c, p in old))
+        lines.append("    + " + ", ".join(f"{c} ({p})" for c, p in new))
+    if with_llm:
+        before = (stored.get("clinical_brief") or {}).get("primary_concern")
+        after = analysis["clinical_brief"]["primary_concern"]
+        if before != after:
+            lines.append(f"    concern: {before!r} -> {after!r}")
+    return lines
+
+
+def write_operations(db_name: str, doc: dict, analysis: dict, with_llm: bool) -> list[tuple]:
+    """``(namespace, filter, update)`` updates storing one re-analysis."""
+    fields = {
+        "analysis_result.condition_matches": analysis["condition_matches"],
+        "analysis_result.reanalyzed_at": datetime.now(timezone.utc),
+    }
+    if with_llm:
+        fields["analysis_result.clinical_brief"] = analysis["clinical_brief"]
+    operations = [
+        (f"{db_name}.appointments", {"_id": doc["_id"], "status": "completed"}, {"$set": fields})
+    ]
+    if with_llm and doc.get("patient_id"):
+        operations.append(
+            (
+                f"{db_name}.patients",
+                {"id": doc["patient_id"]},
+                {"$set": {"concern": analysis["clinical_brief"]["primary_concern"]}},
+            )
+        )
+    return operations
+
+
+async def reanalyze_chunk(chunk, client, model, llm_client, memo, args, timer) -> tuple[list, int]:
+    """Re-analyze one chunk; returns ``[(doc, analysis dict)]`` and the failure count."""
+    items, failed = [], 0
+    for i, doc in enumerate(chunk):
+        try:
+            items.append((i, PatientPayload.model_validate(doc["patient_payload"])))
+        except ValidationError as e:
+            failed += 1
+            print(f"  skip {doc['_id']}: stored payload is invalid ({e.error_count()} errors)")
+
+    def make_seeds(payload):
+        return pipeline_seeds(
+            payload, client, model, llm_client=llm_client, skip_llm=not args.llm
+        )
+
+    done = []
+    async for outcome in analyze_bulk(
+        items,
+        make_seeds,
+        timer,
+        memo=memo,
+        refresh=True,
+        batch_size=args.batch_size,
+        llm_concurrency=args.llm_concurrency,
+    ):
+        doc = chunk[outcome.index]
+        if outcome.error is not None:
+            failed += 1
+            print(f"  fail {doc['_id']}: stage '{outcome.error.stage}': {outcome.error.cause}")
+            continue
+        done.append((doc, outcome.result.model_dump()))
+    return done, failed
+
+
+async def run(args) -> None:
+    checkpoint = (
+        load_checkpoint(args.checkpoint)
+        if not args.restart
+        else {"last_id": None, "processed": 0, "changed": 0, "failed": 0}
+    )
+    print(f"Connecting to MongoDB, DB: {settings.MONGODB_DB_NAME}")
+    client = MongoClient(settings.MONGODB_URI)
+    db = client[settings.MONGODB_DB_NAME]
+    remaining = dict(COMPLETED)
+    if checkpoint["last_id"]:
+        remaining["_id"] = {"$gt": ObjectId(checkpoint["last_id"])}
+        print(f"Resuming after {checkpoint['last_id']} ({checkpoint['processed']} done)")
+    total = db.appointments.count_documents(remaining)
+    if args.limit:
+        total = min(total, args.limit)
+
+    print("Loading PubMedBERT embedding model...")
+    model = load_embedding_model()
+    llm_client = None
+    if args.llm:
+        cache = LLMResponseCache(client) if settings.LLM_CACHE_ENABLED else None
+        llm_client = LLMClient(cache=cache)
+    memo = StageMemo(client) if settings.STAGE_MEMO_ENABLED and not args.dry_run else None
+
+    timer = StageTimer()
+    started = time.perf_counter()
+    seen = 0
+    try:
+        for chunk in read_chunks(db, checkpoint["last_id"], args.chunk_size, args.limit):
+            done, failed = await reanalyze_chunk(chunk, client, model, llm_client, memo, args, timer)
+            changed = 0
+            operations = []
+            for doc, analysis in done:
+                diff = describe_change(doc, analysis, args.llm)
+                changed += bool(diff)
+                if args.dry_run and diff:
+                    print(f"  {doc['_id']} ({doc.get('form_token')}):")
+                    print("\n".join(diff))
+                operations.extend(write_operations(settings.MONGODB_DB_NAME, doc, analysis, args.llm))
+            if operations and not args.dry_run:
+                bulk_update(client, operations, ordered=False)
+
+            seen += len(chunk)
+            checkpoint["last_id"] = str(chunk[-1]["_id"])
+            checkpoint["processed"] += len(chunk)
+            checkpoint["changed"] += changed
+            checkpoint["failed"] += failed
+            if not args.dry_run:
+                save_checkpoint(args.checkpoint, checkpoint)
+            rate = seen / (time.perf_counter() - started)
+            print(
+                f"  {seen}/{total} appointments ({rate:,.1f}/s), "
+                f"{checkpoint['changed']} changed, {checkpoint['failed']} failed"
+            )
+    finally:
+        if llm_client is not None:
+            await llm_client.aclose()
+        client.close()
+
+    stages = ", ".join(f"{name} {ms / 1000:.1f}s" for name, ms in timer.durations_ms().items())
+    verb = "would change" if args.dry_run else "changed"
+    print(
+        f"Re-analyzed {seen} appointments in {time.perf_counter() - started:.1f}s; "
+        f"results {verb} for {checkpoint['changed']}"
+    )
+    print(f"Stage time: {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--llm", action="store_true",
+                        help="Also regenerate the clinical brief (default: retrieval only)")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE,
+                        help=f"Payloads embedded and searched together (default {settings.BULK_BATCH_SIZE})")
+    parser.add_argument("--llm-concurrency", type=int, default=settings.BULK_LLM_CONCURRENCY,
+                        help=f"Concurrent LLM calls with --llm (default {settings.BULK_LLM_CONCURRENCY})")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Appointments written and checkpointed together (default 256)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many appointments")
+    parser.add_argument("--checkpoint", default="reanalyze_checkpoint.json",
+                        help="Progress file used to resume (default reanalyze_checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print what would change; write nothing")
+    args = parser.parse_args()
+    if args.chunk_size < 1 or args.batch_size < 1 or args.llm_concurrency < 1:
+        parser.error("--chunk-size, --batch-size and --llm-concurrency must be positive")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.config import settings
 from app.services.embeddings import load_embedding_model, encode_text
+from app.services.stage_memo import StageMemo
 from pymongo import MongoClient
 
 # Medical conditions relevant to the diagnostic platform's focus areas
@@ -117,6 +118,10 @@ def main():
     # Verify
     count = collection.count_documents({})
     print(f"Collection now has {count} documents.")
+
+    # Memoized search results were computed against the old corpus
+    cleared = StageMemo(client).clear("search")
+    print(f"Cleared {cleared} memoized search results.")
     print("\nDone! Remember to create a Vector Search index named 'vector_index' on the 'embedding' field in MongoDB Atlas.")
 
     client.close()
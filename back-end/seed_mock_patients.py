@@ -1,6 +1,7 @@
 import os
 import random
 import uuid
+import numpy as np
 from datetime import datetime, timedelta, timezone
 from pymongo import MongoClient
 from dotenv import load_dotenv
@@ -10,9 +11,26 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGODB_DB_NAME", "diagnostic")
 
-print(f"Connecting to MongoDB at {MONGO_URI}, DB: {DB_NAME}")
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# acute_config / long_config keys → (HealthKit metric name, unit)
+ACUTE_METRIC_KEYS = {
+    "hrv": ("heartRateVariabilitySDNN", "ms"),
+    "rhr": ("restingHeartRate", "bpm"),
+    "temp": ("appleSleepingWristTemperature", "degC_deviation"),
+    "rr": ("respiratoryRate", "breaths/min"),
+    "walk": ("walkingAsymmetryPercentage", "%"),
+    "steps": ("stepCount", "count"),
+    "sleep": ("sleepAnalysis_awakeSegments", "count"),
+    "spo2": ("bloodOxygenSaturation", "%"),
+    "step_len": ("walkingStepLength", "meters"),
+    "dsp": ("walkingDoubleSupportPercentage", "%"),
+}
+LONG_METRIC_KEYS = {
+    "rhr": ("restingHeartRate", "bpm"),
+    "walk": ("walkingAsymmetryPercentage", "%"),
+    "spo2": ("bloodOxygenSaturation", "%"),
+    "step_len": ("walkingStepLength", "meters"),
+    "dsp": ("walkingDoubleSupportPercentage", "%"),
+}
 
 def get_acute_dates(end_date_str, days=7):
     end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
@@ -49,6 +67,25 @@ def generate_metric(dates, base, noise, unit, spikes=None, trend=0.0):
         metrics.append(metric)
     return metrics
 
+def sample_metric_series(n, length, base, noise, spikes=None, trend=0.0, unit="", rng=None):
+    """Vectorised counterpart of ``generate_metric`` for ``n`` patients at once.
+
+    Returns ``(values, flagged)`` — an ``(n, length)`` float array and a
+    ``length`` boolean mask of the points the config flags as anomalous.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    steps = np.arange(1, length + 1)
+    values = base + trend * steps + rng.uniform(-noise, noise, size=(n, length))
+    flagged = np.zeros(length, dtype=bool)
+    for i, (spike_val, spike_flag) in (spikes or {}).items():
+        if i >= length:
+            continue
+        if spike_val is not None:
+            values[:, i] = spike_val
+        flagged[i] = spike_flag is not None
+    values = np.trunc(values) if unit == "count" else np.round(values, 2)
+    return values, flagged
+
 def create_patient_and_appointment(pt_data):
     patient_id = f"pt_mock_{str(uuid.uuid4())[:8]}"
     form_token = str(uuid.uuid4())
@@ -62,25 +99,14 @@ def create_patient_and_appointment(pt_data):
     
     a_conf = pt_data["acute_config"]
     acute_metrics = {
-        "heartRateVariabilitySDNN": generate_metric(acute_dates, **a_conf["hrv"], unit="ms"),
-        "restingHeartRate": generate_metric(acute_dates, **a_conf["rhr"], unit="bpm"),
-        "appleSleepingWristTemperature": generate_metric(acute_dates, **a_conf["temp"], unit="degC_deviation"),
-        "respiratoryRate": generate_metric(acute_dates, **a_conf["rr"], unit="breaths/min"),
-        "walkingAsymmetryPercentage": generate_metric(acute_dates, **a_conf["walk"], unit="%"),
-        "stepCount": generate_metric(acute_dates, **a_conf["steps"], unit="count"),
-        "sleepAnalysis_awakeSegments": generate_metric(acute_dates, **a_conf["sleep"], unit="count"),
-        "bloodOxygenSaturation": generate_metric(acute_dates, **a_conf["spo2"], unit="%"),
-        "walkingStepLength": generate_metric(acute_dates, **a_conf["step_len"], unit="meters"),
-        "walkingDoubleSupportPercentage": generate_metric(acute_dates, **a_conf["dsp"], unit="%"),
+        name: generate_metric(acute_dates, **a_conf[key], unit=unit)
+        for key, (name, unit) in ACUTE_METRIC_KEYS.items()
     }
 
     l_conf = pt_data["long_config"]
     long_metrics = {
-        "restingHeartRate": generate_metric(long_dates, **l_conf["rhr"], unit="bpm"),
-        "walkingAsymmetryPercentage": generate_metric(long_dates, **l_conf["walk"], unit="%"),
-        "bloodOxygenSaturation": generate_metric(long_dates, **l_conf["spo2"], unit="%"),
-        "walkingStepLength": generate_metric(long_dates, **l_conf["step_len"], unit="meters"),
-        "walkingDoubleSupportPercentage": generate_metric(long_dates, **l_conf["dsp"], unit="%"),
+        name: generate_metric(long_dates, **l_conf[key], unit=unit)
+        for key, (name, unit) in LONG_METRIC_KEYS.items()
     }
 
     # Generate menstrual cycle phase series (string-valued; excluded from numeric delta computation)
@@ -1752,6 +1778,10 @@ patients_list = [amara, maria, jordan, david, elijah, priya,
                  tanya, grace, blessing, latoya, devon, kwame]
 
 def seed_db():
+    print(f"Connecting to MongoDB at {MONGO_URI}, DB: {DB_NAME}")
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+
     print("Clearing old appointments and patients...")
     db.appointments.delete_many({})
     db.patients.delete_many({})
@@ -0,0 +1,9 @@
+"""Shared fixtures: keep the test suite off the network."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _no_paper_warmup(monkeypatch):
+    # The analysis pipeline would otherwise fetch matched PDFs from Europe PMC
+    monkeypatch.setattr("app.config.settings.PAPER_WARMUP_ENABLED", False)
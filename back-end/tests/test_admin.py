@@ -0,0 +1,61 @@
+"""Tests for the admin profiling routes and the X-Profile request hook."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+def _client():
+    from app.main import app
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class TestAdminProfiling:
+    """Tests for /api/v1/admin/profile and X-Profile."""
+
+    def test_routes_hidden_without_admin_token(self):
+        with patch("app.config.settings.ADMIN_TOKEN", ""):
+            resp = _client().post("/api/v1/admin/profile?seconds=0.1")
+        assert resp.status_code == 404
+
+    def test_rejects_wrong_token(self):
+        with patch("app.config.settings.ADMIN_TOKEN", ADMIN_TOKEN):
+            resp = _client().post(
+                "/api/v1/admin/profile?seconds=0.1", headers={"X-Admin-Token": "nope"}
+            )
+        assert resp.status_code == 403
+
+    def test_profile_returns_collapsed_stacks(self):
+        with patch("app.config.settings.ADMIN_TOKEN", ADMIN_TOKEN):
+            resp = _client().post(
+                "/api/v1/admin/profile?seconds=0.2&interval_ms=2",
+                headers={"X-Admin-Token": ADMIN_TOKEN},
+            )
+        assert resp.status_code == 200
+        first = resp.text.splitlines()[0]
+        stack, count = first.rsplit(" ", 1)
+        assert stack.startswith("thread:")
+        assert int(count) > 0
+
+    def test_x_profile_header_captures_single_request(self):
+        with patch("app.config.settings.ADMIN_TOKEN", ADMIN_TOKEN):
+            client = _client()
+            resp = client.get("/health", headers={"X-Profile": ADMIN_TOKEN})
+            profile_id = resp.headers["X-Profile-Id"]
+            fetched = client.get(
+                f"/api/v1/admin/profiles/{profile_id}",
+                headers={"X-Admin-Token": ADMIN_TOKEN},
+            )
+        assert resp.status_code == 200
+        assert fetched.status_code == 200
+
+    def test_no_profile_without_matching_header(self):
+        with patch("app.config.settings.ADMIN_TOKEN", ADMIN_TOKEN):
+            resp = _client().get("/health", headers={"X-Profile": "wrong"})
+        assert "X-Profile-Id" not in resp.headers
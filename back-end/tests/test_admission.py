@@ -0,0 +1,145 @@
+"""Tests for admission control and the per-pool load-shedding middleware."""
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.middleware import AdmissionMiddleware
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(max_in_flight=1, max_queue=1, queue_timeout=0.05):
+    return AdmissionController(
+        "test", max_in_flight=max_in_flight, max_queue=max_queue, queue_timeout=queue_timeout
+    )
+
+
+class TestAdmissionController:
+    def test_admits_up_to_limit(self):
+        controller = _controller(max_in_flight=2)
+
+        async def scenario():
+            await controller.acquire()
+            await controller.acquire()
+            return controller.in_flight
+
+        assert asyncio.run(scenario()) == 2
+
+    def test_queue_full_is_rejected_with_429(self):
+        controller = _controller(max_in_flight=1, max_queue=0)
+
+        async def scenario():
+            await controller.acquire()
+            await controller.acquire()
+
+        with pytest.raises(AdmissionRejected) as err:
+            asyncio.run(scenario())
+        assert err.value.status_code == 429
+        assert err.value.retry_after >= 1
+
+    def test_queue_timeout_is_rejected_with_503(self):
+        controller = _controller(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+
+        async def scenario():
+            await controller.acquire()
+            await controller.acquire()
+
+        with pytest.raises(AdmissionRejected) as err:
+            asyncio.run(scenario())
+        assert err.value.status_code == 503
+        assert controller.queued == 0
+
+    def test_released_slot_goes_to_waiter(self):
+        controller = _controller(max_in_flight=1, max_queue=1, queue_timeout=1)
+
+        async def scenario():
+            await controller.acquire()
+            waiter = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0.01)
+            assert controller.queued == 1
+            controller.release()
+            await waiter
+            return controller.in_flight, controller.queued
+
+        assert asyncio.run(scenario()) == (1, 0)
+
+    def test_retry_after_grows_with_queue_and_service_time(self):
+        controller = _controller(max_in_flight=2, max_queue=10)
+        controller.observe(30.0)
+        assert controller.retry_after() > 1
+
+
+def _app():
+    inner = FastAPI()
+    release = {"event": None}
+
+    @inner.post("/api/v1/analyze-patient")
+    async def analyze():
+        await release["event"].wait()
+        return {"ok": True}
+
+    @inner.post("/api/v1/analyze-patient/bulk")
+    async def bulk():
+        await release["event"].wait()
+        return {"ok": True}
+
+    @inner.get("/api/v1/patients")
+    async def patients():
+        return []
+
+    app = AdmissionMiddleware(inner)
+    app.analysis = AdmissionController("analysis", max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    app.bulk = AdmissionController("bulk", max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    app.read = AdmissionController("read", max_in_flight=4, max_queue=4, queue_timeout=0.05)
+    return app, release
+
+
+class TestAdmissionMiddleware:
+    def test_sheds_analysis_but_keeps_reads_available(self):
+        app, release = _app()
+
+        async def scenario():
+            release["event"] = asyncio.Event()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                first = asyncio.ensure_future(client.post("/api/v1/analyze-patient"))
+                await asyncio.sleep(0.02)
+                shed = await client.post("/api/v1/analyze-patient")
+                read = await client.get("/api/v1/patients")
+                release["event"].set()
+                return await first, shed, read
+
+        first, shed, read = asyncio.run(scenario())
+        assert first.status_code == 200
+        assert shed.status_code == 429
+        assert int(shed.headers["Retry-After"]) >= 1
+        assert read.status_code == 200
+        assert app.analysis.in_flight == 0
+
+    def test_bulk_has_its_own_pool(self):
+        app, release = _app()
+
+        async def scenario():
+            release["event"] = asyncio.Event()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                first = asyncio.ensure_future(client.post("/api/v1/analyze-patient/bulk"))
+                await asyncio.sleep(0.02)
+                shed = await client.post("/api/v1/analyze-patient/bulk")
+                single = asyncio.ensure_future(client.post("/api/v1/analyze-patient"))
+                await asyncio.sleep(0.02)
+                in_flight = app.analysis.in_flight
+                release["event"].set()
+                return await first, shed, await single, in_flight
+
+        first, shed, single, in_flight = asyncio.run(scenario())
+        assert first.status_code == 200
+        assert shed.status_code == 429
+        # A running bulk request does not occupy the single-analysis pool
+        assert single.status_code == 200
+        assert in_flight == 1
+        assert app.bulk.in_flight == 0
@@ -0,0 +1,316 @@
+"""Tests for POST /api/v1/analyze-patient and its streaming variant.
+
+Stubs the embedding model, vector search and LLM so the route's
+orchestration (timing headers, metrics, error mapping) can be exercised
+without external services.
+"""
+
+from __future__ import annotations
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.deadline import Deadline
+from app.services.llm_extractor import ClinicalBriefOutput
+
+METRIC = {"date": "2026-02-15", "value": 1.0, "unit": "bpm"}
+LONG = {"week_start": "2025-08-24", "value": 1.0, "unit": "bpm"}
+
+PAYLOAD = {
+    "patient_id": "pt_test",
+    "sync_timestamp": "2026-02-21T12:00:00Z",
+    "hardware_source": "Test Watch",
+    "patient_narrative": "Test narrative.",
+    "data": {
+        "acute_7_day": {
+            "granularity": "daily_summary",
+            "metrics": {
+                "heartRateVariabilitySDNN": [METRIC] * 7,
+                "restingHeartRate": [METRIC] * 7,
+                "appleSleepingWristTemperature": [METRIC] * 7,
+                "respiratoryRate": [METRIC] * 7,
+                "walkingAsymmetryPercentage": [METRIC] * 7,
+                "stepCount": [METRIC] * 7,
+                "sleepAnalysis_awakeSegments": [METRIC] * 7,
+            },
+        },
+        "longitudinal_6_month": {
+            "granularity": "weekly_average",
+            "metrics": {
+                "restingHeartRate": [LONG] * 26,
+                "walkingAsymmetryPercentage": [LONG] * 26,
+            },
+        },
+    },
+    "risk_profile": {"factors": []},
+}
+
+STUB_OUTPUT = ClinicalBriefOutput(
+    summary="stub",
+    clinical_intake="intake",
+    primary_concern="Pelvic Pain",
+    key_symptoms=["pain"],
+    severity_assessment="moderate",
+    recommended_actions=["rest"],
+    cited_sources=["src"],
+    guiding_questions=["q?"],
+)
+
+STUB_MATCHES = [
+    {
+        "condition": "Endometriosis",
+        "score": 0.91,
+        "pmcid": "PMC000",
+        "title": "Test Paper",
+        "snippet": "snippet",
+    }
+]
+
+
+def _make_client():
+    """Create a TestClient with mocked MongoDB + embedding model."""
+    from app.main import app
+
+    mock_db = MagicMock()
+    mock_mongo = MagicMock()
+    mock_mongo.__getitem__ = MagicMock(return_value=mock_db)
+
+    app.state.mongo_client = mock_mongo
+    app.state.db_name = "diagnostic_test"
+    app.state.embedding_model = MagicMock()
+    app.state.semantic_cache = None
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+@patch("app.services.analysis_pipeline.encode_text", return_value=[0.0] * 4)
+@patch("app.services.analysis_pipeline.search_conditions", new_callable=AsyncMock, return_value=STUB_MATCHES)
+@patch("app.services.analysis_pipeline.extract_clinical_brief", new_callable=AsyncMock, return_value=STUB_OUTPUT)
+class TestAnalyzeRoute:
+    """Tests for POST /api/v1/analyze-patient."""
+
+    def test_success_returns_server_timing(self, mock_llm, mock_search, mock_encode):
+        client = _make_client()
+        resp = client.post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 200
+        assert resp.json()["clinical_brief"]["primary_concern"] == "Pelvic Pain"
+
+        timing = resp.headers["Server-Timing"]
+        for stage in ("deltas", "summary", "encode", "search", "context", "llm", "assemble", "total"):
+            assert f"{stage};dur=" in timing
+
+    def test_stage_histograms_exposed_on_metrics(self, mock_llm, mock_search, mock_encode):
+        client = _make_client()
+        client.post("/api/v1/analyze-patient", json=PAYLOAD)
+        body = client.get("/metrics").text
+        assert 'diagnostic_pipeline_stage_seconds_count{stage="llm"}' in body
+
+    def test_llm_failure_maps_to_502(self, mock_llm, mock_search, mock_encode):
+        mock_llm.side_effect = RuntimeError("upstream down")
+        client = _make_client()
+        resp = client.post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 502
+        assert "llm;dur=" in resp.headers["Server-Timing"]
+
+    def test_search_failure_maps_to_502(self, mock_llm, mock_search, mock_encode):
+        mock_search.side_effect = RuntimeError("atlas down")
+        resp = _make_client().post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 502
+        assert "Vector search failed" in resp.json()["detail"]
+        assert mock_llm.await_count == 0
+
+    def test_primary_concern_stored_on_patient(self, mock_llm, mock_search, mock_encode):
+        client = _make_client()
+        client.post("/api/v1/analyze-patient", json=PAYLOAD)
+        db = client.app.state.mongo_client["diagnostic_test"]
+        query, update = db.patients.update_one.call_args.args
+        assert query == {"id": PAYLOAD["patient_id"]}
+        assert update == {"$set": {"concern": "Pelvic Pain"}}
+
+    def test_deadline_exceeded_maps_to_504(self, mock_llm, mock_search, mock_encode):
+        from app.services.deadline import DeadlineExceeded
+
+        mock_llm.side_effect = DeadlineExceeded("llm")
+        resp = _make_client().post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 504
+        assert "llm" in resp.json()["detail"]
+
+    def test_near_duplicate_served_from_semantic_cache(self, mock_llm, mock_search, mock_encode):
+        from app.services.semantic_cache import SemanticBriefCache
+
+        client = _make_client()
+        client.app.state.semantic_cache = SemanticBriefCache(threshold=0.95, max_entries=4)
+
+        mock_encode.return_value = [1.0, 0.0, 0.0, 0.0]
+        first = client.post("/api/v1/analyze-patient", json=PAYLOAD).json()
+        mock_encode.return_value = [0.99, 0.05, 0.0, 0.0]
+        second = client.post("/api/v1/analyze-patient", json=PAYLOAD).json()
+
+        assert mock_llm.await_count == 1
+        assert first["clinical_brief"]["source"] == "llm"
+        assert second["clinical_brief"]["source"] == "semantic_cache"
+        assert second["clinical_brief"]["cache_similarity"] >= 0.95
+        # Borrowed from another intake: a draft to regenerate, not a record
+        assert second["clinical_brief"]["provisional"] is True
+
+    def test_semantic_cache_bypassed_by_no_cache(self, mock_llm, mock_search, mock_encode):
+        from app.services.semantic_cache import SemanticBriefCache
+
+        client = _make_client()
+        client.app.state.semantic_cache = SemanticBriefCache(threshold=0.95, max_entries=4)
+        mock_encode.return_value = [1.0, 0.0, 0.0, 0.0]
+        client.post("/api/v1/analyze-patient", json=PAYLOAD)
+        client.post("/api/v1/analyze-patient", json=PAYLOAD, headers={"Cache-Control": "no-cache"})
+        assert mock_llm.await_count == 2
+
+
+class TestSemanticBriefCache:
+    """Index behaviour of SemanticBriefCache."""
+
+    def test_scope_partitions_entries(self):
+        from app.services.semantic_cache import SemanticBriefCache
+
+        cache = SemanticBriefCache(threshold=0.9, max_entries=4)
+        cache.add([1.0, 0.0], STUB_OUTPUT, scope="PCOS:high")
+        assert cache.lookup([1.0, 0.0], scope="") is None
+        assert cache.lookup([1.0, 0.0], scope="PCOS:high")[0] == STUB_OUTPUT
+
+    def test_oldest_entry_evicted_when_full(self):
+        from app.services.semantic_cache import SemanticBriefCache
+
+        cache = SemanticBriefCache(threshold=0.99, max_entries=2)
+        cache.add([1.0, 0.0, 0.0], STUB_OUTPUT)
+        cache.add([0.0, 1.0, 0.0], STUB_OUTPUT)
+        cache.add([0.0, 0.0, 1.0], STUB_OUTPUT)
+        assert cache.lookup([1.0, 0.0, 0.0]) is None
+        assert cache.lookup([0.0, 0.0, 1.0]) is not None
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def _stub_stream(**kwargs):
+    yield {"summary": "st"}
+    yield {"summary": "stub", "clinical_intake": "in"}
+    yield STUB_OUTPUT.model_dump()
+
+
+@patch("app.services.analysis_pipeline.encode_text", return_value=[0.0] * 4)
+@patch("app.services.analysis_pipeline.search_conditions", new_callable=AsyncMock, return_value=STUB_MATCHES)
+class TestAnalyzeStreamRoute:
+    """Tests for POST /api/v1/analyze-patient/stream."""
+
+    @patch("app.routes.analyze.stream_clinical_brief", side_effect=_stub_stream)
+    def test_retrieval_results_sent_before_brief_fields(self, mock_stream, mock_search, mock_encode):
+        resp = _make_client().post("/api/v1/analyze-patient/stream", json=PAYLOAD)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+
+        events = _parse_sse(resp.text)
+        names = [name for name, _ in events]
+        assert names[0] == "analysis"
+        assert events[0][1]["condition_matches"][0]["condition"] == "Endometriosis"
+        assert names[-2:] == ["brief", "done"]
+        assert ("brief_field", {"field": "summary", "value": "st"}) in events
+        assert events[-2][1]["primary_concern"] == "Pelvic Pain"
+        assert isinstance(mock_stream.call_args.kwargs["deadline"], Deadline)
+
+    @patch("app.routes.analyze.stream_clinical_brief")
+    def test_llm_failure_emits_error_event(self, mock_stream, mock_search, mock_encode):
+        async def failing(**kwargs):
+            raise RuntimeError("upstream down")
+            yield
+
+        mock_stream.side_effect = failing
+        resp = _make_client().post("/api/v1/analyze-patient/stream", json=PAYLOAD)
+        events = _parse_sse(resp.text)
+        assert [name for name, _ in events] == ["analysis", "error"]
+
+    def test_search_failure_maps_to_502(self, mock_search, mock_encode):
+        mock_search.side_effect = RuntimeError("mongo down")
+        resp = _make_client().post("/api/v1/analyze-patient/stream", json=PAYLOAD)
+        assert resp.status_code == 502
+
+
+@patch("app.services.analysis_pipeline.encode_text", return_value=[0.0] * 4)
+@patch("app.services.analysis_pipeline.search_conditions", new_callable=AsyncMock, return_value=STUB_MATCHES)
+@patch("app.services.analysis_pipeline.extract_clinical_brief", new_callable=AsyncMock, return_value=STUB_OUTPUT)
+class TestPaperWarmup:
+    """The top matches' PDFs are fetched in the background."""
+
+    @patch("app.services.analysis_pipeline.warm_pdfs", return_value=1)
+    def test_top_match_pdfs_warmed(self, mock_warm, mock_llm, mock_search, mock_encode, monkeypatch):
+        monkeypatch.setattr("app.config.settings.PAPER_WARMUP_ENABLED", True)
+        resp = _make_client().post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 200
+        mock_warm.assert_called_once_with(["PMC000"])
+
+    def test_warmup_does_not_wait_for_the_fetch(self, mock_llm, mock_search, mock_encode, monkeypatch):
+        import asyncio
+
+        from app.services import papers
+
+        fetched = []
+
+        async def slow_fetch(pmcid, record=True):
+            await asyncio.sleep(5)
+            fetched.append(pmcid)
+
+        monkeypatch.setattr("app.config.settings.PAPER_WARMUP_ENABLED", True)
+        monkeypatch.setattr(papers, "fetch_pdf", slow_fetch)
+        monkeypatch.setattr(papers, "_warming", {})
+        resp = _make_client().post("/api/v1/analyze-patient", json=PAYLOAD)
+        assert resp.status_code == 200
+        assert fetched == []
+
+    def test_fetch_joins_warmup_in_flight(self, mock_llm, mock_search, mock_encode, monkeypatch):
+        import asyncio
+
+        from app.services import papers
+
+        downloads = []
+
+        async def slow_download(pmcid):
+            downloads.append(pmcid)
+            await asyncio.sleep(0.05)
+            return b"%PDF-1.4"
+
+        monkeypatch.setattr(papers, "_download", slow_download)
+        monkeypatch.setattr(papers, "_warming", {})
+        monkeypatch.setattr(papers, "_pdf_cache", {})
+
+        async def scenario():
+            papers.warm_pdfs(["PMC_WARMING"])
+            await asyncio.sleep(0)
+            return await papers.fetch_pdf("PMC_WARMING")
+
+        assert asyncio.run(scenario()) == b"%PDF-1.4"
+        assert downloads == ["PMC_WARMING"]
+
+
+class TestConcernStage:
+    def test_provisional_brief_not_written_to_patient(self):
+        import asyncio
+
+        from app.models.patient import ClinicalBrief, PatientPayload
+        from app.services.analysis_pipeline import ANALYSIS_GRAPH
+
+        mongo = MagicMock()
+        brief = ClinicalBrief(**STUB_OUTPUT.model_dump(), provisional=True, source="rules")
+        seeds = {
+            "mongo_client": mongo,
+            "db_name": "diagnostic_test",
+            "payload": PatientPayload.model_validate(PAYLOAD),
+            "brief": brief,
+        }
+        results = asyncio.run(ANALYSIS_GRAPH.run(seeds, ("concern",)))
+        assert results["concern"] is None
+        mongo.__getitem__.return_value.patients.update_one.assert_not_called()
@@ -0,0 +1,153 @@
+"""Tests for POST /api/v1/analyze-patient/bulk and the batched bulk pipeline.
+
+The embedding model, vector search and LLM are stubbed as in
+``test_analyze``; the batch embedding call is patched where
+``bulk_analysis`` uses it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.models.patient import PatientPayload
+from app.services.timing import StageTimer
+from tests.test_analyze import PAYLOAD, STUB_MATCHES, STUB_OUTPUT, _make_client
+
+
+def _body(*payloads) -> str:
+    return "\n".join(json.dumps(p) for p in payloads) + "\n"
+
+
+def _payload(patient_id: str, narrative: str = "Test narrative.") -> dict:
+    return {**PAYLOAD, "patient_id": patient_id, "patient_narrative": narrative}
+
+
+def _vectors(model, texts):
+    return [[float(len(text)), 0.0, 0.0, 0.0] for text in texts]
+
+
+@patch("app.services.bulk_analysis.encode_texts", side_effect=_vectors)
+@patch("app.services.analysis_pipeline.search_conditions", new_callable=AsyncMock, return_value=STUB_MATCHES)
+@patch("app.services.analysis_pipeline.extract_clinical_brief", new_callable=AsyncMock, return_value=STUB_OUTPUT)
+class TestAnalyzeBulkRoute:
+    """Tests for POST /api/v1/analyze-patient/bulk."""
+
+    def _post(self, body: str):
+        resp = _make_client().post(
+            "/api/v1/analyze-patient/bulk",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        return resp, [json.loads(line) for line in resp.text.splitlines()]
+
+    def test_streams_one_result_per_payload(self, mock_llm, mock_search, mock_encode):
+        resp, records = self._post(_body(*(_payload(f"pt_{i}", f"narrative {i}") for i in range(3))))
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+        results, summary = records[:-1], records[-1]["summary"]
+        assert sorted(r["index"] for r in results) == [0, 1, 2]
+        assert all(r["result"]["clinical_brief"]["primary_concern"] == "Pelvic Pain" for r in results)
+        assert summary["items"] == 3
+        assert summary["errors"] == 0
+        # One batched embedding call for the whole request
+        assert mock_encode.call_count == 1
+        assert len(mock_encode.call_args.args[1]) == 3
+
+    def test_invalid_line_reported_without_failing_the_rest(self, mock_llm, mock_search, mock_encode):
+        body = _body(_payload("pt_ok")) + '{"patient_id": "broken"}\n'
+        _, records = self._post(body)
+        by_index = {r["index"]: r for r in records[:-1]}
+        assert "result" in by_index[0]
+        assert by_index[1]["error"]["status"] == 422
+        assert records[-1]["summary"]["errors"] == 1
+
+    def test_stage_failure_is_per_item(self, mock_llm, mock_search, mock_encode):
+        async def search(mongo_client, vector, **kwargs):
+            if kwargs["query_text"] == "bad":
+                raise RuntimeError("atlas down")
+            return STUB_MATCHES
+
+        mock_search.side_effect = search
+        _, records = self._post(_body(_payload("pt_ok"), _payload("pt_bad", "bad")))
+        by_id = {r["patient_id"]: r for r in records[:-1]}
+        assert "result" in by_id["pt_ok"]
+        assert by_id["pt_bad"]["error"] == {
+            "status": 502, "stage": "search", "detail": "Vector search failed: atlas down",
+        }
+        assert mock_llm.await_count == 1
+
+    def test_empty_body_rejected(self, mock_llm, mock_search, mock_encode):
+        resp, _ = self._post("\n")
+        assert resp.status_code == 422
+
+    def test_too_many_payloads_rejected(self, mock_llm, mock_search, mock_encode):
+        with patch("app.routes.analyze.settings.BULK_MAX_ITEMS", 1):
+            resp, _ = self._post(_body(_payload("pt_1"), _payload("pt_2")))
+        assert resp.status_code == 413
+        mock_encode.assert_not_called()
+
+
+@patch("app.services.bulk_analysis.encode_texts", side_effect=_vectors)
+@patch("app.services.analysis_pipeline.search_conditions", new_callable=AsyncMock, return_value=STUB_MATCHES)
+@patch("app.services.analysis_pipeline.extract_clinical_brief", new_callable=AsyncMock)
+class TestAnalyzeBulk:
+    """Batching and concurrency of analyze_bulk."""
+
+    def _run(self, payloads, **options):
+        from app.services.analysis_pipeline import pipeline_seeds
+        from app.services.bulk_analysis import analyze_bulk
+
+        items = [(i, PatientPayload.model_validate(p)) for i, p in enumerate(payloads)]
+
+        async def collect():
+            return [
+                outcome
+                async for outcome in analyze_bulk(
+                    items,
+                    lambda payload: pipeline_seeds(payload, MagicMock(), MagicMock()),
+                    StageTimer(),
+                    **options,
+                )
+            ]
+
+        return asyncio.run(collect())
+
+    def test_one_embedding_call_per_batch(self, mock_llm, mock_search, mock_encode):
+        mock_llm.return_value = STUB_OUTPUT
+        payloads = [_payload(f"pt_{i}", f"narrative {i}") for i in range(5)]
+        outcomes = self._run(payloads, batch_size=2)
+        assert len(outcomes) == 5
+        assert [len(c.args[1]) for c in mock_encode.call_args_list] == [2, 2, 1]
+
+    def test_duplicate_texts_encoded_once(self, mock_llm, mock_search, mock_encode):
+        mock_llm.return_value = STUB_OUTPUT
+        self._run([_payload("pt_1"), _payload("pt_2")])
+        assert len(mock_encode.call_args.args[1]) == 1
+
+    def test_llm_calls_capped(self, mock_llm, mock_search, mock_encode):
+        running, peak = 0, 0
+
+        async def extract(**kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return STUB_OUTPUT
+
+        mock_llm.side_effect = extract
+        payloads = [_payload(f"pt_{i}", f"narrative {i}") for i in range(6)]
+        outcomes = self._run(payloads, llm_concurrency=2)
+        assert all(o.error is None for o in outcomes)
+        assert peak == 2
+
+    def test_encode_failure_fails_the_batch_only(self, mock_llm, mock_search, mock_encode):
+        mock_llm.return_value = STUB_OUTPUT
+        mock_encode.side_effect = [RuntimeError("model crashed"), [[1.0, 0.0, 0.0, 0.0]]]
+        outcomes = self._run([_payload("pt_1", "a"), _payload("pt_2", "b")], batch_size=1)
+        errors = {o.payload.patient_id: o.error for o in outcomes}
+        assert errors["pt_1"].stage == "encode"
+        assert errors["pt_2"] is None
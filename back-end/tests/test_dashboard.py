@@ -25,6 +25,8 @@ STUB_ANALYSIS_DICT = AnalysisResponse(
     patient_id="pt_test",
     clinical_brief=ClinicalBrief(
         summary="stub",
+        clinical_intake="stub intake",
+        primary_concern="Stub Concern",
         key_symptoms=["pain"],
         severity_assessment="moderate",
         recommended_actions=["rest"],
@@ -0,0 +1,83 @@
+"""Tests for request deadline propagation through the pipeline stages."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.llm_extractor import LLMClient
+from app.services.timing import StageTimer
+from app.services.vector_search import search_conditions
+
+
+def _mongo(results=None):
+    collection = MagicMock()
+    collection.aggregate.return_value = results or [{"condition": "Endometriosis"}]
+    client = MagicMock()
+    client.__getitem__.return_value.__getitem__.return_value = collection
+    return client, collection
+
+
+class TestDeadline:
+    """Deadline bookkeeping and overrun reporting."""
+
+    def test_timeout_respects_reserve_and_cap(self):
+        deadline = Deadline(10)
+        assert deadline.timeout(reserve=4) == pytest.approx(6, abs=0.1)
+        assert deadline.timeout(cap=2) == 2
+        assert Deadline(0).max_time_ms() == 1
+
+    def test_stage_over_budget_is_recorded(self):
+        deadline = Deadline(10, stage_budgets={"encode": 0.0})
+        timer = StageTimer(deadline)
+        with timer.span("encode"):
+            time.sleep(0.01)
+        with timer.span("deltas"):
+            pass
+        assert set(deadline.overruns) == {"encode"}
+
+    def test_expired_deadline_blocks_next_stage(self):
+        with pytest.raises(DeadlineExceeded) as exc:
+            Deadline(0).check("llm")
+        assert exc.value.stage == "llm"
+
+
+class TestSearchDeadline:
+    """search_conditions sizes maxTimeMS from the deadline."""
+
+    def test_hybrid_query_gets_max_time_ms(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.DEADLINE_LLM_RESERVE_SECONDS", 5)
+        client, collection = _mongo()
+        asyncio.run(search_conditions(client, [0.1], "pelvic pain", deadline=Deadline(20)))
+        pipeline, = collection.aggregate.call_args.args
+        assert "$rankFusion" in pipeline[0]
+        assert 14000 <= collection.aggregate.call_args.kwargs["maxTimeMS"] <= 15000
+
+    def test_rerank_skipped_when_time_is_short(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.DEADLINE_LLM_RESERVE_SECONDS", 15)
+        client, collection = _mongo()
+        asyncio.run(search_conditions(client, [0.1], "pelvic pain", deadline=Deadline(16)))
+        assert collection.aggregate.call_count == 1
+        pipeline, = collection.aggregate.call_args.args
+        assert "$vectorSearch" in pipeline[0]
+
+
+class TestLLMDeadline:
+    """The LLM call never outlives the request deadline."""
+
+    def test_slow_llm_raises_deadline_exceeded(self):
+        class _SlowLLM:
+            async def ainvoke(self, messages):
+                await asyncio.sleep(5)
+
+        client = LLMClient(model="test-model", timeout=30, max_retries=3)
+        client.structured_llm = _SlowLLM()
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(client.ainvoke([{"role": "user", "content": "x"}], deadline=Deadline(0.05)))
+        assert time.perf_counter() - start < 1
+        assert client.breaker.failures == 0
@@ -0,0 +1,91 @@
+"""Tests for cancelling pipeline work when the client disconnects."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services.disconnect import (
+    ClientDisconnected,
+    cancel_on_disconnect,
+    run_until_disconnect,
+)
+from app.services.metrics import CLIENT_DISCONNECTS, PIPELINE_CANCELLATIONS
+from app.services.timing import StageTimer
+
+
+class _Request:
+    """Minimal stand-in exposing ASGI ``receive``; disconnects after ``after`` s."""
+
+    def __init__(self, after: float | None):
+        self.after = after
+
+    async def receive(self):
+        if self.after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.after)
+        return {"type": "http.disconnect"}
+
+
+class TestRunUntilDisconnect:
+    def test_returns_result_while_connected(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            return 42
+
+        assert asyncio.run(run_until_disconnect(_Request(None), work(), route="t_ok")) == 42
+
+    def test_cancels_work_on_disconnect(self):
+        timer = StageTimer()
+        state = {"finished": False}
+        before = PIPELINE_CANCELLATIONS.value(stage="llm")
+
+        async def work():
+            with timer.span("llm"):
+                await asyncio.sleep(1)
+            state["finished"] = True
+
+        with pytest.raises(ClientDisconnected):
+            asyncio.run(run_until_disconnect(_Request(0.01), work(), route="t_gone"))
+        assert state["finished"] is False
+        assert CLIENT_DISCONNECTS.value(route="t_gone") == 1
+        assert PIPELINE_CANCELLATIONS.value(stage="llm") == before + 1
+
+    def test_work_errors_propagate(self):
+        async def work():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            asyncio.run(run_until_disconnect(_Request(None), work(), route="t_err"))
+
+
+class TestCancelOnDisconnect:
+    def test_stream_stops_and_is_closed(self):
+        state = {"closed": False}
+
+        async def stream():
+            try:
+                for i in range(100):
+                    yield f"chunk {i}"
+                    await asyncio.sleep(0.01)
+            finally:
+                state["closed"] = True
+
+        async def scenario():
+            return [c async for c in cancel_on_disconnect(_Request(0.035), stream(), route="t_sse")]
+
+        chunks = asyncio.run(scenario())
+        assert 1 <= len(chunks) < 100
+        assert state["closed"] is True
+        assert CLIENT_DISCONNECTS.value(route="t_sse") == 1
+
+    def test_complete_stream_is_relayed(self):
+        async def stream():
+            for i in range(3):
+                yield str(i)
+
+        async def scenario():
+            return [c async for c in cancel_on_disconnect(_Request(None), stream(), route="t_full")]
+
+        assert asyncio.run(scenario()) == ["0", "1", "2"]
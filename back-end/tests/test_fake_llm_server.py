@@ -0,0 +1,64 @@
+"""End-to-end LLMClient tests against the bundled fake OpenAI server.
+
+The real LangChain/OpenAI client stack is exercised; only the HTTP
+transport is swapped for an in-process ASGI transport.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.llm_extractor import (
+    ClinicalBriefOutput,
+    LLMClient,
+    extract_clinical_brief,
+    stream_clinical_brief,
+)
+from app.services.resilience import LLMUnavailableError
+from fake_llm_server import create_app, parse_args
+
+
+def _client(monkeypatch, *flags, **kwargs) -> LLMClient:
+    monkeypatch.setattr("app.config.settings.OPENAI_API_KEY", "fake")
+    monkeypatch.setattr("app.config.settings.OPENAI_BASE_URL", "http://fake-llm/v1")
+    monkeypatch.setattr("app.services.llm_extractor.backoff_delay", lambda *a: 0)
+    fake = create_app(parse_args(["--ttft-median", "0", "--tokens-per-second", "1e6", *flags]))
+    client = LLMClient(model="gpt-5.2-2025-12-11", **kwargs)
+    client.http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+    client._build()
+    return client
+
+
+class TestFakeServer:
+    """The fake server satisfies the structured-output contract."""
+
+    def test_structured_brief_is_schema_valid(self, monkeypatch):
+        client = _client(monkeypatch, "--seed", "1")
+        brief = asyncio.run(extract_clinical_brief("Pelvic pain.", "summary", client=client))
+        assert isinstance(brief, ClinicalBriefOutput)
+        assert len(brief.guiding_questions) == 5
+
+    def test_sectioned_generation(self, monkeypatch):
+        client = _client(monkeypatch)
+        brief = asyncio.run(
+            extract_clinical_brief("Pelvic pain.", "summary", client=client, sectioned=True)
+        )
+        assert brief.summary and brief.recommended_actions and brief.guiding_questions
+
+    def test_streamed_brief_is_schema_valid(self, monkeypatch):
+        client = _client(monkeypatch)
+
+        async def collect():
+            return [p async for p in stream_clinical_brief("Pain.", "summary", client=client)]
+
+        partials = asyncio.run(collect())
+        assert len(partials) > 1
+        ClinicalBriefOutput.model_validate(partials[-1])
+
+    def test_injected_errors_exhaust_retries(self, monkeypatch):
+        client = _client(monkeypatch, "--error-rate", "1", max_retries=1)
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(extract_clinical_brief("Pain.", "summary", client=client))
@@ -0,0 +1,162 @@
+"""Tests for the degraded-mode provisional brief and its background upgrade."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+from app.models.patient import (
+    AnalysisResponse,
+    BiometricDelta,
+    ConditionMatch,
+    PatientPayload,
+    RiskProfile,
+)
+from app.services.brief_upgrade import upgrade_provisional_brief
+from app.services.fallback_brief import build_provisional_brief
+from app.services.llm_extractor import ClinicalBriefOutput
+from app.services.resilience import LLMUnavailableError
+
+DELTAS = [
+    BiometricDelta(
+        metric="restingHeartRate",
+        acute_avg=72.0,
+        longitudinal_avg=64.0,
+        delta=8.0,
+        unit="bpm",
+        clinically_significant=True,
+        changepoint_detected=True,
+        changepoint_date="2026-02-17",
+        changepoint_direction="up",
+    ),
+    BiometricDelta(
+        metric="stepCount",
+        acute_avg=8000.0,
+        longitudinal_avg=8200.0,
+        delta=-200.0,
+        unit="count",
+        clinically_significant=False,
+    ),
+]
+MATCHES = [
+    ConditionMatch(
+        condition="Endometriosis",
+        similarity_score=0.91,
+        pmcid="PMC000",
+        title="Test Paper",
+        snippet="snippet",
+    )
+]
+RISK = RiskProfile.model_validate(
+    {
+        "factors": [
+            {
+                "category": "Genetic",
+                "factor": "Family history",
+                "description": "Mother diagnosed",
+                "severity": "High",
+                "weight": 3,
+            }
+        ]
+    }
+)
+
+
+class TestProvisionalBrief:
+    """build_provisional_brief output."""
+
+    def test_brief_is_flagged_and_grounded_in_inputs(self):
+        brief = build_provisional_brief("Severe pelvic pain. Worse at night.", DELTAS, MATCHES, RISK)
+        assert brief.provisional is True
+        assert brief.source == "rules"
+        assert brief.primary_concern == "Endometriosis"
+        assert len(brief.key_symptoms) == 1
+        assert "Resting heart rate increased by 8.0 bpm" in brief.key_symptoms[0]
+        assert brief.severity_assessment.startswith("High")  # change-point + high risk
+        assert brief.cited_sources == ["Endometriosis: Test Paper"]
+        assert len(brief.guiding_questions) == 5
+        assert any("Family history" in a for a in brief.recommended_actions)
+
+    def test_works_without_matches_or_risk(self):
+        brief = build_provisional_brief("Pain.", [], [], None)
+        assert brief.primary_concern == "Symptoms pending clinical review"
+        assert brief.severity_assessment.startswith("Low")
+        assert len(brief.guiding_questions) == 5
+
+
+OUTPUT = ClinicalBriefOutput(
+    summary="llm",
+    clinical_intake="intake",
+    primary_concern="Endometriosis",
+    key_symptoms=[],
+    severity_assessment="moderate",
+    recommended_actions=[],
+    cited_sources=[],
+    guiding_questions=[],
+)
+
+
+def _analysis():
+    return AnalysisResponse(
+        patient_id="pt_test",
+        clinical_brief=build_provisional_brief("Pain.", DELTAS, MATCHES, RISK),
+        biometric_deltas=DELTAS,
+        condition_matches=MATCHES,
+        risk_profile=RISK,
+    )
+
+
+class TestBriefUpgrade:
+    """upgrade_provisional_brief background task."""
+
+    @patch("app.services.brief_upgrade.asyncio.sleep", new_callable=AsyncMock)
+    @patch("app.services.brief_upgrade.extract_clinical_brief", new_callable=AsyncMock)
+    def test_retries_then_overwrites_provisional_brief(self, mock_llm, mock_sleep):
+        mock_llm.side_effect = [LLMUnavailableError("down"), OUTPUT]
+        mongo = MagicMock()
+        payload = MagicMock(
+            spec=PatientPayload, patient_id="pt_test", patient_narrative="Pain.", risk_profile=RISK
+        )
+
+        brief = asyncio.run(
+            upgrade_provisional_brief(mongo, "db", "tok", payload, _analysis())
+        )
+
+        assert brief.provisional is False
+        assert mock_llm.await_count == 2
+        query, update = mongo["db"].appointments.update_one.call_args.args
+        assert query == {"form_token": "tok", "analysis_result.clinical_brief.provisional": True}
+        assert update["$set"]["analysis_result.clinical_brief"]["summary"] == "llm"
+        concern = mongo["db"].patients.update_one.call_args.args[1]
+        assert concern == {"$set": {"concern": OUTPUT.primary_concern}}
+
+
+class TestPipelineFallback:
+    """analyze_patient_pipeline degrades instead of failing."""
+
+    @patch("app.services.analysis_pipeline.encode_text", return_value=[0.1] * 4)
+    @patch(
+        "app.services.analysis_pipeline.search_conditions",
+        new_callable=AsyncMock,
+        return_value=[{"condition": "Endometriosis", "score": 0.9, "title": "T"}],
+    )
+    @patch(
+        "app.services.analysis_pipeline.extract_clinical_brief",
+        new_callable=AsyncMock,
+        side_effect=LLMUnavailableError("circuit open"),
+    )
+    def test_llm_outage_yields_provisional_brief(self, mock_llm, mock_search, mock_encode):
+        from app.services.analysis_pipeline import analyze_patient_pipeline
+        from tests.test_analyze import PAYLOAD
+
+        result = asyncio.run(
+            analyze_patient_pipeline(
+                PatientPayload.model_validate(PAYLOAD),
+                MagicMock(),
+                MagicMock(),
+                provisional_fallback=True,
+            )
+        )
+        assert result.clinical_brief.provisional is True
+        assert result.clinical_brief.primary_concern == "Endometriosis"
@@ -1,4 +1,5 @@
-"""Tests for the POST /api/v1/intake/{token}/submit orchestrator route.
+"""Tests for the POST /api/v1/intake/{token}/submit orchestrator route
+and the intake job worker that runs the analysis.
 
 Uses unittest.mock to stub out MongoDB, the ML pipeline, and the XRP
 payout so the route logic can be exercised without external dependencies.
@@ -7,6 +8,7 @@ payout so the route logic can be exercised without external dependencies.
 from __future__ import annotations
 
 import asyncio
+from types import SimpleNamespace
 from unittest.mock import MagicMock, AsyncMock, patch
 
 import pytest
@@ -19,6 +21,7 @@ from app.models.patient import (
     ConditionMatch,
     RiskProfile,
 )
+from app.services.resilience import LLMUnavailableError
 
 # ---------------------------------------------------------------------------
 # Minimal test payload (only required fields, values don't need clinical sense)
@@ -60,6 +63,8 @@ STUB_ANALYSIS = AnalysisResponse(
     patient_id="pt_test",
     clinical_brief=ClinicalBrief(
         summary="stub",
+        clinical_intake="stub intake",
+        primary_concern="Stub Concern",
         key_symptoms=["pain"],
         severity_assessment="moderate",
         recommended_actions=["rest"],
@@ -108,8 +113,12 @@ def _make_client(appointment_doc=None):
     mock_collection = MagicMock()
     mock_collection.find_one.return_value = appointment_doc
     mock_collection.update_one.return_value = MagicMock()
+    # The atomic claim only matches appointments not already taken
+    claimable = appointment_doc and appointment_doc.get("status") not in ("processing", "completed")
+    mock_collection.find_one_and_update.return_value = appointment_doc if claimable else None
 
     # Prepare mock db that returns the collection via attribute access
+    # (db["intake_jobs"] is the auto-created __getitem__ mock)
     mock_db = MagicMock()
     mock_db.appointments = mock_collection
 
@@ -121,10 +130,48 @@ def _make_client(appointment_doc=None):
     app.state.mongo_client = mock_mongo
     app.state.db_name = "diagnostic_test"
     app.state.embedding_model = MagicMock()
+    app.state.intake_queue = None
+    app.state.intake_pool = None
+    mock_db["intake_jobs"].count_documents.return_value = 0
 
     return TestClient(app, raise_server_exceptions=False), mock_collection
 
 
+def _jobs_collection():
+    from app.main import app
+
+    return app.state.mongo_client[app.state.db_name]["intake_jobs"]
+
+
+def _worker_state(appointment_doc):
+    """app.state stand-in for process_intake_job, with a mocked queue and pool."""
+    appointments = MagicMock()
+    appointments.find_one_and_update.return_value = appointment_doc
+    db = MagicMock()
+    db.appointments = appointments
+    mongo = MagicMock()
+    mongo.__getitem__ = MagicMock(return_value=db)
+    mongo.bulk_write.return_value.update_results = {0: MagicMock(matched_count=1)}
+    mongo.server_info.return_value = {"versionArray": [8, 0, 1, 0]}
+    pool = MagicMock()
+    # Close spawned coroutines instead of running the payout / upgrade
+    pool.spawn.side_effect = lambda coro: coro.close()
+    state = SimpleNamespace(
+        mongo_client=mongo,
+        db_name="diagnostic_test",
+        embedding_model=MagicMock(),
+        llm_client=None,
+        semantic_cache=None,
+        intake_queue=MagicMock(),
+        intake_pool=pool,
+    )
+    return state, appointments, db
+
+
+def _job():
+    return {"_id": "job123", "token": TOKEN, "payload": PAYLOAD, "attempts": 1}
+
+
 # ---------------------------------------------------------------------------
 # Tests
 # ---------------------------------------------------------------------------
@@ -148,41 +195,310 @@ class TestIntakeRoute:
         assert resp.status_code == 400
         assert "already" in resp.json()["detail"].lower()
 
+    @patch("app.routes.intake.analyze_patient_pipeline", new_callable=AsyncMock)
+    def test_202_enqueues_job(self, mock_pipeline):
+        """Valid token → job persisted, 202 with job id, no inline pipeline run."""
+        client, mock_coll = _make_client(
+            appointment_doc={"form_token": TOKEN, "status": "scheduled", "patient_id": "pt_1"}
+        )
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 202
+        body = resp.json()
+        assert body["status"] == "queued"
+        assert resp.headers["Location"] == f"/api/v1/intake/jobs/{body['job_id']}"
+        mock_pipeline.assert_not_awaited()
+
+        job = _jobs_collection().insert_one.call_args[0][0]
+        assert job["_id"] == body["job_id"]
+        assert job["token"] == TOKEN
+        assert job["status"] == "queued"
+        assert job["patient_id"] == "pt_1"
+
+        query, update = mock_coll.find_one_and_update.call_args[0]
+        assert query["form_token"] == TOKEN
+        assert update["$set"]["status"] == "processing"
+        assert update["$set"]["intake_job_id"] == body["job_id"]
+
+    def test_resubmit_while_processing_returns_existing_job(self):
+        """A duplicate submit during analysis gets the in-flight job."""
+        client, mock_coll = _make_client(
+            appointment_doc={"form_token": TOKEN, "status": "processing", "intake_job_id": "job123"}
+        )
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 202
+        assert resp.json()["job_id"] == "job123"
+        _jobs_collection().insert_one.assert_not_called()
+        mock_coll.update_one.assert_not_called()
+
+    def test_claim_released_between_reads_is_retried(self):
+        """The job gave up between the failed claim and the re-read → claim again."""
+        appointment = {"form_token": TOKEN, "status": "scheduled"}
+        client, mock_coll = _make_client(appointment_doc=appointment)
+        mock_coll.find_one_and_update.side_effect = [None, appointment]
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 202
+        assert mock_coll.find_one_and_update.call_count == 2
+        _jobs_collection().insert_one.assert_called_once()
+
+    def test_409_when_claim_keeps_failing_without_a_job(self):
+        client, mock_coll = _make_client(appointment_doc={"form_token": TOKEN, "status": "processing"})
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 409
+        _jobs_collection().insert_one.assert_not_called()
+
+    def test_503_when_backlog_is_full(self):
+        """A deep job backlog sheds new submissions with Retry-After."""
+        client, mock_coll = _make_client(
+            appointment_doc={"form_token": TOKEN, "status": "scheduled"}
+        )
+        _jobs_collection().count_documents.return_value = 10_000
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 503
+        assert int(resp.headers["Retry-After"]) > 0
+        mock_coll.find_one_and_update.assert_not_called()
+
+    def test_failed_enqueue_releases_claim(self):
+        """If the job cannot be stored, the appointment is handed back."""
+        client, mock_coll = _make_client(
+            appointment_doc={"form_token": TOKEN, "status": "scheduled"}
+        )
+        _jobs_collection().insert_one.side_effect = RuntimeError("mongo down")
+        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
+        assert resp.status_code == 500
+        query, update = mock_coll.update_one.call_args[0]
+        assert "intake_job_id" in query
+        assert update["$set"] == {"status": "scheduled"}
+
+
+class TestIntakeJobStatus:
+    """Tests for GET /api/v1/intake/jobs/{job_id}."""
+
+    def test_404_for_unknown_job(self):
+        client, _ = _make_client()
+        _jobs_collection().find_one.return_value = None
+        resp = client.get("/api/v1/intake/jobs/nope")
+        assert resp.status_code == 404
+
+    def test_reports_status_and_stage(self):
+        client, _ = _make_client()
+        _jobs_collection().find_one.return_value = {
+            "_id": "job123", "status": "running", "stage": "retrieval", "attempts": 1,
+        }
+        resp = client.get("/api/v1/intake/jobs/job123")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["job_id"] == "job123"
+        assert body["status"] == "running"
+        assert body["stage"] == "retrieval"
+        # The payload is never returned
+        assert _jobs_collection().find_one.call_args[0][1] == {"payload": 0}
+
+
+class TestProcessIntakeJob:
+    """Tests for the worker side: process_intake_job."""
+
+    @patch("app.routes.intake.process_research_payout", new_callable=AsyncMock)
+    @patch("app.routes.intake.analyze_patient_pipeline", new_callable=AsyncMock)
+    def test_persists_partial_then_final_result(self, mock_pipeline, mock_payout):
+        """Deltas and matches are stored before the brief, then completed + payout."""
+        from app.routes.intake import process_intake_job
+
+        async def run_pipeline(**kwargs):
+            kwargs["on_retrieval"](STUB_ANALYSIS.biometric_deltas, STUB_ANALYSIS.condition_matches)
+            return STUB_ANALYSIS
+
+        mock_pipeline.side_effect = run_pipeline
+        state, appointments, db = _worker_state(
+            {"form_token": TOKEN, "status": "processing", "patient_id": "pt_1"}
+        )
+        asyncio.run(process_intake_job(state, _job()))
+
+        query, update = appointments.update_one.call_args[0]
+        assert query["intake_job_id"] == "job123"
+        partial = update["$set"]
+        assert partial["analysis_result"]["clinical_brief"] is None
+        assert partial["analysis_result"]["condition_matches"][0]["pmcid"] == "PMC000"
+        assert "status" not in partial
+        stages = [c[0][1] for c in state.intake_queue.set_stage.call_args_list]
+        assert stages == ["retrieval", "brief"]
+
+        # Appointment + patient written in one client-level bulk write
+        ops = state.mongo_client.bulk_write.call_args[0][0]
+        assert [op._namespace for op in ops] == [
+            "diagnostic_test.appointments", "diagnostic_test.patients",
+        ]
+        final = ops[0]._doc["$set"]
+        assert final["status"] == "completed"
+        assert final["analysis_result"]["clinical_brief"]["summary"] == "stub"
+        assert ops[1]._doc == {"$set": {"status": "Completed"}}
+        db.patients.update_one.assert_not_called()
+        assert mock_payout.call_args.kwargs["target_address"] == TOKEN
+        state.intake_pool.spawn.assert_called_once()
+
+    @patch("app.routes.intake.process_research_payout", new_callable=AsyncMock)
     @patch(
         "app.routes.intake.analyze_patient_pipeline",
         new_callable=AsyncMock,
         return_value=STUB_ANALYSIS,
     )
+    def test_pre_8_0_server_gets_two_fenced_updates(self, mock_pipeline, mock_payout):
+        """Client-level bulk_write needs MongoDB 8.0; older servers get update_one calls."""
+        from app.routes.intake import process_intake_job
+
+        state, appointments, db = _worker_state(
+            {"form_token": TOKEN, "status": "processing", "patient_id": "pt_1"}
+        )
+        state.mongo_client.server_info.return_value = {"versionArray": [7, 0, 12, 0]}
+        db.__getitem__.side_effect = lambda name: getattr(db, name)
+        appointments.update_one.return_value.matched_count = 1
+        asyncio.run(process_intake_job(state, _job()))
+
+        state.mongo_client.bulk_write.assert_not_called()
+        query, update = appointments.update_one.call_args[0]
+        assert query["intake_job_id"] == "job123"
+        assert update["$set"]["status"] == "completed"
+        db.patients.update_one.assert_called_once_with({"id": "pt_1"}, {"$set": {"status": "Completed"}})
+        state.intake_pool.spawn.assert_called_once()
+
+    @patch("app.routes.intake.analyze_patient_pipeline", new_callable=AsyncMock)
+    def test_skips_job_that_no_longer_owns_appointment(self, mock_pipeline):
+        """Completed or superseded by a newer submission → no pipeline run."""
+        from app.routes.intake import process_intake_job
+
+        state, appointments, _ = _worker_state(None)
+        asyncio.run(process_intake_job(state, _job()))
+        query = appointments.find_one_and_update.call_args[0][0]
+        assert query == {"form_token": TOKEN, "status": "processing", "intake_job_id": "job123"}
+        mock_pipeline.assert_not_awaited()
+        state.intake_pool.spawn.assert_not_called()
+
+    @patch("app.routes.intake.process_research_payout", new_callable=AsyncMock)
     @patch(
-        "app.routes.intake.process_research_payout",
+        "app.routes.intake.analyze_patient_pipeline",
         new_callable=AsyncMock,
+        return_value=STUB_ANALYSIS,
     )
-    def test_success_path(self, mock_payout, mock_pipeline):
-        """Happy path — valid token, scheduled appointment → 200 + success JSON."""
-        client, mock_coll = _make_client(
-            appointment_doc={"form_token": TOKEN, "status": "scheduled"}
-        )
-        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
-        assert resp.status_code == 200
-        body = resp.json()
-        assert body["status"] == "success"
-        assert "payout" in body["message"].lower()
+    def test_no_payout_when_superseded_during_run(self, mock_pipeline, mock_payout):
+        from app.routes.intake import process_intake_job
 
-        # Verify DB was updated to 'completed'
-        mock_coll.update_one.assert_called_once()
-        update_args = mock_coll.update_one.call_args
-        assert update_args[0][1]["$set"]["status"] == "completed"
+        state, _, _ = _worker_state({"form_token": TOKEN, "status": "processing"})
+        state.mongo_client.bulk_write.return_value.update_results = {0: MagicMock(matched_count=0)}
+        asyncio.run(process_intake_job(state, _job()))
+        mock_payout.assert_not_called()
+        state.intake_pool.spawn.assert_not_called()
 
     @patch(
         "app.routes.intake.analyze_patient_pipeline",
         new_callable=AsyncMock,
-        side_effect=TimeoutError("LLM timed out"),
+        side_effect=LLMUnavailableError("circuit open", retry_after=12.5),
     )
-    def test_500_on_pipeline_failure(self, mock_pipeline):
-        """ML pipeline failure → 500 with clean error message."""
-        client, _ = _make_client(
-            appointment_doc={"form_token": TOKEN, "status": "scheduled"}
+    def test_pipeline_failure_propagates_without_completing(self, mock_pipeline):
+        """Failures reach the worker pool (which retries) and nothing is completed."""
+        from app.routes.intake import process_intake_job
+
+        state, appointments, _ = _worker_state({"form_token": TOKEN, "status": "processing"})
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(process_intake_job(state, _job()))
+        state.mongo_client.bulk_write.assert_not_called()
+        state.intake_pool.spawn.assert_not_called()
+
+    @patch(
+        "app.routes.intake.analyze_patient_pipeline",
+        new_callable=AsyncMock,
+        return_value=STUB_ANALYSIS.model_copy(
+            update={
+                "clinical_brief": STUB_ANALYSIS.clinical_brief.model_copy(
+                    update={"provisional": True, "source": "rules"}
+                )
+            }
+        ),
+    )
+    @patch("app.routes.intake.process_research_payout", new_callable=AsyncMock)
+    @patch("app.routes.intake.upgrade_provisional_brief", new_callable=AsyncMock)
+    def test_provisional_brief_queues_upgrade(self, mock_upgrade, mock_payout, mock_pipeline):
+        """LLM down → intake still completes and a brief upgrade is queued."""
+        from app.routes.intake import process_intake_job
+
+        state, appointments, _ = _worker_state({"form_token": TOKEN, "status": "processing"})
+        asyncio.run(process_intake_job(state, _job()))
+        assert mock_pipeline.call_args.kwargs["provisional_fallback"] is True
+        stored = state.mongo_client.bulk_write.call_args[0][0][0]._doc["$set"]["analysis_result"]
+        assert stored["clinical_brief"]["provisional"] is True
+        assert mock_upgrade.call_args.kwargs["token"] == TOKEN
+        assert state.intake_pool.spawn.call_count == 2
+
+    def test_release_failed_intake_reopens_appointment(self):
+        from app.routes.intake import release_failed_intake
+
+        state, appointments, _ = _worker_state(None)
+        release_failed_intake(state, _job())
+        query, update = appointments.update_one.call_args[0]
+        assert query == {"form_token": TOKEN, "status": "processing", "intake_job_id": "job123"}
+        assert update["$set"] == {"status": "scheduled"}
+
+
+@patch("app.services.analysis_pipeline.encode_text", return_value=[0.1] * 4)
+@patch(
+    "app.services.analysis_pipeline.search_conditions",
+    new_callable=AsyncMock,
+    return_value=[
+        {"condition": "test", "score": 0.9, "pmcid": "PMC000", "title": "T", "snippet": "s"}
+    ],
+)
+class TestIntakeDraft:
+    """Tests for PUT /api/v1/intake/{token}/draft and its reuse by the worker."""
+
+    DRAFT = {"patient_narrative": "Test narrative.", "risk_profile": {"factors": []}}
+
+    def test_404_for_unknown_token(self, mock_search, mock_encode):
+        client, _ = _make_client(None)
+        resp = client.put(f"/api/v1/intake/{TOKEN}/draft", json=self.DRAFT)
+        assert resp.status_code == 404
+        mock_encode.assert_not_called()
+
+    def test_409_once_submitted(self, mock_search, mock_encode):
+        client, _ = _make_client({"form_token": TOKEN, "status": "processing"})
+        resp = client.put(f"/api/v1/intake/{TOKEN}/draft", json=self.DRAFT)
+        assert resp.status_code == 409
+
+    def test_stores_stage_outputs_on_open_appointment(self, mock_search, mock_encode):
+        client, collection = _make_client({"form_token": TOKEN, "status": "scheduled"})
+        resp = client.put(f"/api/v1/intake/{TOKEN}/draft", json=self.DRAFT)
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "ready"
+
+        query, update = collection.update_one.call_args[0]
+        assert query["status"] == {"$nin": ["processing", "completed"]}
+        stages = update["$set"]["intake_draft"]["stages"]
+        # One entry each for encode and search
+        assert len(stages) == 2
+        assert [0.1] * 4 in stages.values()
+
+    @patch("app.routes.intake.process_research_payout", new_callable=AsyncMock)
+    @patch("app.services.analysis_pipeline.extract_clinical_brief", new_callable=AsyncMock)
+    def test_worker_reuses_draft_stages(self, mock_llm, mock_payout, mock_search, mock_encode):
+        from app.routes.intake import _draft_payload, process_intake_job
+        from app.models.patient import IntakeDraft
+        from app.services.llm_extractor import ClinicalBriefOutput
+
+        mock_llm.return_value = ClinicalBriefOutput(
+            **STUB_ANALYSIS.clinical_brief.model_dump(include=set(ClinicalBriefOutput.model_fields))
         )
-        resp = client.post(f"/api/v1/intake/{TOKEN}/submit", json=PAYLOAD)
-        assert resp.status_code == 500
-        assert "pipeline" in resp.json()["detail"].lower()
+        client, collection = _make_client({"form_token": TOKEN, "status": "scheduled"})
+        client.put(f"/api/v1/intake/{TOKEN}/draft", json=self.DRAFT)
+        draft = collection.update_one.call_args[0][1]["$set"]["intake_draft"]
+        assert mock_encode.call_count == 1
+
+        # Submitted with no wearable data: the same payload the draft assumed
+        payload = _draft_payload(TOKEN, IntakeDraft(**self.DRAFT))
+        state, _, _ = _worker_state(
+            {"form_token": TOKEN, "status": "processing", "intake_draft": draft}
+        )
+        job = {"_id": "job123", "token": TOKEN, "payload": payload.model_dump(), "attempts": 1}
+        asyncio.run(process_intake_job(state, job))
+
+        assert mock_encode.call_count == 1
+        assert mock_search.await_count == 1
+        mock_llm.assert_awaited_once()
+        final = state.mongo_client.bulk_write.call_args[0][0][0]._doc
+        assert "intake_draft" in final["$unset"]
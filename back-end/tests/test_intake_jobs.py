@@ -0,0 +1,149 @@
+"""Tests for the durable intake job queue and its worker pool."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from app.services.intake_jobs import IntakeJobQueue, IntakeWorkerPool
+
+
+def _queue(max_attempts=3):
+    db = MagicMock()
+    return IntakeJobQueue(db, lease_seconds=60, max_attempts=max_attempts), db["intake_jobs"]
+
+
+class TestIntakeJobQueue:
+    def test_claim_is_one_atomic_update(self):
+        queue, coll = _queue()
+        coll.find_one_and_update.return_value = {
+            "_id": "j1", "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        }
+        job = queue.claim()
+        assert job["_id"] == "j1"
+        query, update = coll.find_one_and_update.call_args[0]
+        statuses = [clause["status"] for clause in query["$or"]]
+        # Queued jobs, plus running jobs whose lease expired
+        assert statuses == ["queued", "running"]
+        assert update["$set"]["status"] == "running"
+        assert update["$inc"] == {"attempts": 1}
+
+    def test_claim_returns_none_when_idle(self):
+        queue, coll = _queue()
+        coll.find_one_and_update.return_value = None
+        assert queue.claim() is None
+
+    def test_reap_expired_fails_jobs_out_of_attempts(self):
+        queue, coll = _queue(max_attempts=3)
+        coll.find_one_and_update.side_effect = [{"_id": "j1", "token": "t"}, None]
+        assert [job["_id"] for job in queue.reap_expired()] == ["j1"]
+        query, update = coll.find_one_and_update.call_args_list[0][0]
+        assert query["status"] == "running"
+        assert query["attempts"] == {"$gte": 3}
+        assert update["$set"]["status"] == "failed"
+
+    def test_fail_requeues_until_max_attempts(self):
+        queue, coll = _queue(max_attempts=2)
+        assert queue.fail({"_id": "j1", "attempts": 1}, "boom") is True
+        update = coll.update_one.call_args[0][1]["$set"]
+        assert update["status"] == "queued"
+        assert "available_at" in update
+
+        assert queue.fail({"_id": "j1", "attempts": 2}, "boom") is False
+        assert coll.update_one.call_args[0][1]["$set"]["status"] == "failed"
+
+
+class TestIntakeWorkerPool:
+    def test_run_job_marks_completed(self):
+        queue = MagicMock()
+
+        async def handler(job):
+            return None
+
+        asyncio.run(IntakeWorkerPool(queue, handler).run_job({"_id": "j1", "token": "t"}))
+        queue.complete.assert_called_once_with("j1")
+        queue.fail.assert_not_called()
+
+    def test_run_job_gives_up_and_calls_on_failed(self):
+        queue = MagicMock()
+        queue.fail.return_value = False
+        on_failed = MagicMock()
+
+        async def handler(job):
+            raise RuntimeError("search down")
+
+        job = {"_id": "j1", "token": "t", "attempts": 3}
+        asyncio.run(IntakeWorkerPool(queue, handler, on_failed=on_failed).run_job(job))
+        assert "search down" in queue.fail.call_args[0][1]
+        on_failed.assert_called_once_with(job)
+
+    def test_worker_releases_reaped_jobs(self):
+        queue = MagicMock()
+        expired = {"_id": "j1", "token": "t", "attempts": 3}
+        queue.reap_expired.side_effect = [[expired]] + [[]] * 100
+        queue.claim.return_value = None
+        on_failed = MagicMock()
+
+        async def handler(job):
+            return None
+
+        async def scenario():
+            pool = IntakeWorkerPool(
+                queue, handler, on_failed=on_failed, concurrency=1, poll_interval=0.01
+            )
+            pool.start()
+            await asyncio.sleep(0.05)
+            await pool.stop()
+
+        asyncio.run(scenario())
+        on_failed.assert_called_once_with(expired)
+
+    def test_queue_calls_run_off_the_loop_and_reap_once_per_poll(self):
+        queue = MagicMock()
+        queue.reap_expired.return_value = []
+        threads = set()
+
+        def claim():
+            threads.add(threading.current_thread())
+            return None
+
+        queue.claim.side_effect = claim
+
+        async def handler(job):
+            return None
+
+        async def scenario():
+            pool = IntakeWorkerPool(queue, handler, concurrency=4, poll_interval=0.05)
+            pool.start()
+            await asyncio.sleep(0.12)
+            await pool.stop()
+
+        asyncio.run(scenario())
+        assert threading.main_thread() not in threads
+        # Four workers polled about three times each; one reap per interval
+        assert queue.claim.call_count >= 8
+        assert queue.reap_expired.call_count <= 3
+
+    def test_workers_drain_queue_with_bounded_concurrency(self):
+        jobs = [{"_id": f"j{i}", "token": "t"} for i in range(6)]
+        queue = MagicMock()
+        queue.claim.side_effect = lambda: jobs.pop() if jobs else None
+        running = {"now": 0, "max": 0}
+
+        async def handler(job):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+
+        async def scenario():
+            pool = IntakeWorkerPool(queue, handler, concurrency=2, poll_interval=0.01)
+            pool.start()
+            await asyncio.sleep(0.1)
+            await pool.stop()
+
+        asyncio.run(scenario())
+        assert queue.complete.call_count == 6
+        assert running["max"] == 2
@@ -0,0 +1,200 @@
+"""Tests for LLMClient: exact-match response cache, streaming and sectioned calls.
+
+The structured-output runnable is replaced by a counting stub and the
+MongoDB collection by a MagicMock, so no API key or database is needed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.llm_cache import LLMResponseCache, cache_key
+from app.services.llm_extractor import (
+    BRIEF_SECTIONS,
+    ClinicalBriefOutput,
+    LLMClient,
+    extract_clinical_brief,
+)
+from app.services.resilience import CircuitBreaker
+
+OUTPUT = ClinicalBriefOutput(
+    summary="stub",
+    clinical_intake="intake",
+    primary_concern="Pelvic Pain",
+    key_symptoms=["pain"],
+    severity_assessment="moderate",
+    recommended_actions=["rest"],
+    cited_sources=["src"],
+    guiding_questions=["q?"],
+)
+
+
+class _CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return {"raw": None, "parsed": OUTPUT, "parsing_error": None}
+
+
+class _DictCache(LLMResponseCache):
+    """LLMResponseCache with the Mongo collection swapped for a dict."""
+
+    def __init__(self):
+        super().__init__(MagicMock(), ttl_seconds=60, max_entries=10)
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def put(self, key, output):
+        self.store[key] = output
+
+
+def _client(cache):
+    client = LLMClient(model="test-model", cache=cache)
+    client.structured_llm = _CountingLLM()
+    return client
+
+
+class TestCacheKey:
+    """cache_key canonicalisation."""
+
+    def test_whitespace_and_line_endings_do_not_change_key(self):
+        a = cache_key("m", 0.1, {}, [{"role": "user", "content": "pain  \r\nsevere"}])
+        b = cache_key("m", 0.1, {}, [{"role": "user", "content": "pain\nsevere\n"}])
+        assert a == b
+
+    def test_model_and_temperature_change_key(self):
+        msgs = [{"role": "user", "content": "pain"}]
+        assert cache_key("m1", 0.1, {}, msgs) != cache_key("m2", 0.1, {}, msgs)
+        assert cache_key("m1", 0.1, {}, msgs) != cache_key("m1", 0.2, {}, msgs)
+
+
+class TestLLMClientCache:
+    """LLMClient read-through / bypass behaviour."""
+
+    def test_identical_prompt_served_from_cache(self):
+        client = _client(_DictCache())
+        first = asyncio.run(extract_clinical_brief("narrative", "summary", client=client))
+        second = asyncio.run(extract_clinical_brief("narrative", "summary", client=client))
+        assert first == second == OUTPUT
+        assert client.structured_llm.calls == 1
+
+    def test_bypass_forces_fresh_call(self):
+        client = _client(_DictCache())
+        asyncio.run(extract_clinical_brief("narrative", "summary", client=client))
+        asyncio.run(
+            extract_clinical_brief("narrative", "summary", client=client, bypass_cache=True)
+        )
+        assert client.structured_llm.calls == 2
+
+    def test_stream_yields_partials_then_caches_final(self):
+        from langchain_core.messages import AIMessageChunk
+
+        text = OUTPUT.model_dump_json()
+
+        class _StreamingLLM:
+            async def astream(self, messages):
+                for i in range(0, len(text), 7):
+                    yield AIMessageChunk(content=text[i : i + 7])
+
+        cache = _DictCache()
+        client = _client(cache)
+        client.stream_llm = _StreamingLLM()
+
+        async def collect():
+            return [p async for p in client.astream([{"role": "user", "content": "x"}])]
+
+        partials = asyncio.run(collect())
+        assert len(partials) > 2
+        assert partials[-1] == OUTPUT.model_dump()
+        assert len(cache.store) == 1
+        # A repeat is served whole from the cache
+        assert asyncio.run(collect()) == [OUTPUT.model_dump()]
+
+    def test_mongo_errors_are_treated_as_misses(self):
+        cache = LLMResponseCache(MagicMock(), ttl_seconds=60, max_entries=10)
+        cache.collection.find_one.side_effect = RuntimeError("mongo down")
+        cache.collection.replace_one.side_effect = RuntimeError("mongo down")
+        client = _client(cache)
+        result = asyncio.run(extract_clinical_brief("narrative", "summary", client=client))
+        assert result == OUTPUT
+
+
+class _SlowSection:
+    """Section runnable answering after ``delay``, or raising ``error``."""
+
+    def __init__(self, schema, delay=0.1, error=None):
+        self.schema = schema
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+    async def ainvoke(self, messages):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        fields = set(self.schema.model_fields)
+        parsed = self.schema.model_validate(OUTPUT.model_dump(include=fields))
+        return {"raw": None, "parsed": parsed, "parsing_error": None}
+
+
+def _sectioned_client():
+    client = _client(None)
+    client.llm = object()
+    client._section_llms = {schema: _SlowSection(schema) for schema in BRIEF_SECTIONS}
+    return client
+
+
+class TestSectionedGeneration:
+    """extract_clinical_brief(sectioned=True) runs the sections concurrently."""
+
+    def test_sections_run_in_parallel_and_merge(self):
+        client = _sectioned_client()
+
+        start = time.perf_counter()
+        result = asyncio.run(
+            extract_clinical_brief("narrative", "summary", client=client, sectioned=True)
+        )
+        assert result == OUTPUT
+        assert time.perf_counter() - start < 0.25
+        assert client.structured_llm.calls == 0
+
+    def test_failed_section_cancels_the_others(self):
+        client = _sectioned_client()
+        client._section_llms[BRIEF_SECTIONS[0]].error = ValueError("400: bad request")
+        for schema in BRIEF_SECTIONS[1:]:
+            client._section_llms[schema].delay = 5
+
+        async def main():
+            with pytest.raises(ValueError):
+                await extract_clinical_brief(
+                    "narrative", "summary", client=client, sectioned=True
+                )
+            # Checked before asyncio.run cancels whatever is left over
+            return [client._section_llms[schema].cancelled for schema in BRIEF_SECTIONS[1:]]
+
+        start = time.perf_counter()
+        assert all(asyncio.run(main()))
+        assert time.perf_counter() - start < 1
+
+    def test_half_open_breaker_probes_with_the_whole_brief(self):
+        client = _sectioned_client()
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+
+        result = asyncio.run(
+            extract_clinical_brief("narrative", "summary", client=client, sectioned=True)
+        )
+        assert result == OUTPUT
+        assert client.breaker.state == "closed"
@@ -0,0 +1,61 @@
+"""Tests for the GET /metrics Prometheus endpoint."""
+
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+from app.services.metrics import Counter, Histogram
+
+
+def _client():
+    from app.main import app
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class TestMetricsEndpoint:
+    """Tests for GET /metrics."""
+
+    def test_request_latency_labelled_by_route_template(self):
+        client = _client()
+        client.get("/health")
+        body = client.get("/metrics").text
+        assert 'diagnostic_http_request_seconds_count{route="/health",method="GET",status="200"}' in body
+
+    def test_queue_depth_gauges_exported(self):
+        body = _client().get("/metrics").text
+        assert 'diagnostic_background_queue_depth{queue="payout"}' in body
+        assert 'diagnostic_email_inflight 0' in body
+
+    def test_paper_cache_hit_ratio(self):
+        from app.services import papers
+
+        papers._pdf_cache["PMC_METRICS_TEST"] = b"%PDF-1.4"
+        client = _client()
+        resp = client.get("/api/v1/paper/PMC_METRICS_TEST")
+        assert resp.status_code == 200
+
+        body = client.get("/metrics").text
+        assert 'diagnostic_cache_requests_total{cache="paper_pdf",result="hit"}' in body
+        assert 'diagnostic_cache_hit_ratio{cache="paper_pdf"}' in body
+        assert 'diagnostic_cache_entries{cache="paper_pdf"}' in body
+
+
+class TestMetricTypes:
+    """Text exposition of the metric primitives."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        h = Histogram("test_hist_seconds", "test", buckets=(0.1, 1.0))
+        h.observe(0.05)
+        h.observe(0.5)
+        h.observe(5.0)
+        lines = h.render()
+        assert 'test_hist_seconds_bucket{le="0.1"} 1' in lines
+        assert 'test_hist_seconds_bucket{le="1"} 2' in lines
+        assert 'test_hist_seconds_bucket{le="+Inf"} 3' in lines
+        assert "test_hist_seconds_count 3" in lines
+
+    def test_label_values_are_escaped(self):
+        c = Counter("test_escape_total", "test", ("path",))
+        c.inc(path='a"b')
+        assert 'test_escape_total{path="a\\"b"} 1' in c.render()
@@ -0,0 +1,62 @@
+"""Tests for token-budgeted prompt assembly."""
+
+from __future__ import annotations
+
+from app.services.analysis_steps import _format_retrieval_context
+from app.services.llm_extractor import SYSTEM_PROMPT, _brief_messages, build_user_message
+from app.services.prompt_builder import count_tokens, dedupe_matches, truncate_tokens
+
+
+class TestTruncation:
+    """truncate_tokens budget enforcement."""
+
+    def test_short_text_unchanged(self):
+        assert truncate_tokens("pelvic pain", 50) == "pelvic pain"
+
+    def test_long_text_fits_budget(self):
+        text = "Cramping pelvic pain radiating to the lower back. " * 200
+        trimmed = truncate_tokens(text, 100)
+        assert count_tokens(trimmed) <= 100
+        assert trimmed.endswith("[…]")
+
+
+class TestSnippetDedupe:
+    """Overlapping retrieval snippets."""
+
+    def test_repeated_paper_and_sentences_dropped(self):
+        matches = [
+            {"condition": "Endometriosis", "pmcid": "PMC1", "snippet": "Pain is cyclic. Lesions vary."},
+            {"condition": "Endometriosis", "pmcid": "PMC1", "snippet": "Duplicate paper."},
+            {"condition": "Adenomyosis", "pmcid": "PMC2", "snippet": "pain is cyclic! Uterus enlarged."},
+        ]
+        result = dedupe_matches(matches, max_snippet_tokens=100)
+        assert [m["pmcid"] for m in result] == ["PMC1", "PMC2"]
+        assert result[1]["snippet"] == "Uterus enlarged."
+
+    def test_retrieval_context_uses_deduped_snippets(self):
+        context = _format_retrieval_context(
+            [
+                {"condition": "A", "pmcid": "PMC1", "snippet": "Same sentence."},
+                {"condition": "B", "pmcid": "PMC2", "snippet": "Same sentence."},
+            ]
+        )
+        assert context.count("Same sentence.") == 1
+
+
+class TestUserMessage:
+    """Section budgets, ordering and token reporting."""
+
+    def test_sections_ordered_stable_first(self):
+        message, tokens = build_user_message("narrative", "biometrics", "risk", "literature")
+        order = [message.index(s) for s in ("risk", "literature", "biometrics", "narrative")]
+        assert order == sorted(order)
+        assert set(tokens) == {"risk", "retrieval", "biometrics", "narrative"}
+
+    def test_long_narrative_is_capped(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.PROMPT_BUDGET_NARRATIVE_TOKENS", 50)
+        _, tokens = build_user_message("I have pain every day. " * 500, "biometrics")
+        assert tokens["narrative"] <= 50
+
+    def test_system_prompt_is_the_prefix(self):
+        messages = _brief_messages("n", "b", "", "")
+        assert messages[0] == {"role": "system", "content": SYSTEM_PROMPT}
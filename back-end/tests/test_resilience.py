@@ -0,0 +1,243 @@
+"""Tests for LLM timeouts, retries, hedging and the circuit breaker."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.llm_extractor import ClinicalBriefOutput, LLMClient
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMUnavailableError,
+    hedged,
+)
+
+OUTPUT = ClinicalBriefOutput(
+    summary="stub",
+    clinical_intake="intake",
+    primary_concern="Pelvic Pain",
+    key_symptoms=[],
+    severity_assessment="moderate",
+    recommended_actions=[],
+    cited_sources=[],
+    guiding_questions=[],
+)
+MESSAGES = [{"role": "user", "content": "x"}]
+
+
+class _ScriptedLLM:
+    """Structured-output stub that plays back a list of delays / errors."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        if isinstance(step, BaseException):
+            raise step
+        await asyncio.sleep(step)
+        return {"raw": None, "parsed": OUTPUT, "parsing_error": None}
+
+
+def _client(llm, **kwargs):
+    client = LLMClient(model="test-model", **kwargs)
+    client.structured_llm = llm
+    return client
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr("app.services.llm_extractor.backoff_delay", lambda *a: 0)
+
+
+class TestRetries:
+    """Per-call deadline and retry policy."""
+
+    def test_transient_error_is_retried(self):
+        llm = _ScriptedLLM(httpx.ConnectError("reset"), 0)
+        result = asyncio.run(_client(llm, max_retries=2).ainvoke(MESSAGES))
+        assert result == OUTPUT
+        assert llm.calls == 2
+
+    def test_timeout_exhausts_retries_as_unavailable(self):
+        llm = _ScriptedLLM(1.0)
+        client = _client(llm, timeout=0.01, max_retries=1)
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(client.ainvoke(MESSAGES))
+        assert llm.calls == 2
+
+    def test_non_retryable_error_is_not_retried(self):
+        llm = _ScriptedLLM(ValueError("bad request"))
+        with pytest.raises(ValueError):
+            asyncio.run(_client(llm, max_retries=3).ainvoke(MESSAGES))
+        assert llm.calls == 1
+
+
+class TestHedging:
+    """hedged() races a duplicate call after the delay."""
+
+    def test_hedge_returns_first_finisher(self):
+        delays = iter([1.0, 0.0])
+
+        async def call():
+            await asyncio.sleep(next(delays))
+            return "done"
+
+        start = time.perf_counter()
+        assert asyncio.run(hedged(call, delay=0.01)) == "done"
+        assert time.perf_counter() - start < 0.5
+
+    def test_no_hedge_when_first_call_is_fast(self):
+        calls = []
+
+        async def call():
+            calls.append(1)
+            return "done"
+
+        asyncio.run(hedged(call, delay=0.5))
+        assert len(calls) == 1
+
+    def test_cancelling_before_hedge_cancels_call(self):
+        state = {"cancelled": False}
+
+        async def call():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        async def scenario():
+            task = asyncio.ensure_future(hedged(call, delay=0.5))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(scenario())
+        assert state["cancelled"] is True
+
+
+class TestCircuitBreaker:
+    """Breaker opens after repeated failures and probes after the cool-down."""
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_client_fails_fast_while_open(self):
+        llm = _ScriptedLLM(httpx.ConnectError("reset"))
+        client = _client(llm, max_retries=0)
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(client.ainvoke(MESSAGES))
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(client.ainvoke(MESSAGES))
+        assert llm.calls == 1
+
+    def test_bad_requests_leave_breaker_closed(self):
+        llm = _ScriptedLLM(ValueError("400: prompt too long"))
+        client = _client(llm, max_retries=0)
+        client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                asyncio.run(client.ainvoke(MESSAGES))
+        assert llm.calls == 3
+        assert client.breaker.state == "closed"
+        assert client.breaker.failures == 0
+
+    def test_cancelled_probe_lets_next_call_probe(self):
+        llm = _ScriptedLLM(5.0, 0)
+        client = _client(llm, max_retries=0)
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+
+        async def main():
+            probe = asyncio.create_task(client.ainvoke(MESSAGES))
+            await asyncio.sleep(0.05)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+            return await client.ainvoke(MESSAGES)
+
+        assert asyncio.run(main()) == OUTPUT
+        assert client.breaker.state == "closed"
+
+    def test_closed_stream_probe_is_released(self):
+        class _Chunk:
+            content = '{"summary": "st'
+
+            def __add__(self, other):
+                return self
+
+        class _StreamLLM:
+            async def astream(self, messages):
+                yield _Chunk()
+                await asyncio.sleep(5)
+
+        client = _client(None)
+        client.stream_llm = _StreamLLM()
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+
+        async def main():
+            stream = client.astream(MESSAGES)
+            assert await anext(stream) == {"summary": "st"}
+            await stream.aclose()
+
+        asyncio.run(main())
+        assert client.breaker.before_call() is True
+
+
+class TestStreamDeadline:
+    """``astream`` bounds its waits by the request deadline."""
+
+    def test_stalled_stream_raises_deadline_exceeded(self):
+        class _StalledLLM:
+            async def astream(self, messages):
+                await asyncio.sleep(5)
+                yield
+
+        client = _client(None, timeout=5)
+        client.stream_llm = _StalledLLM()
+
+        async def main():
+            return [p async for p in client.astream(MESSAGES, deadline=Deadline(0.05))]
+
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(main())
+        assert time.perf_counter() - started < 1
+        # Running out of our own budget is not the provider's failure
+        assert client.breaker.failures == 0
+
+    def test_queued_stream_gives_up_at_deadline(self):
+        client = _client(None, max_concurrency=1)
+        client.stream_llm = object()
+
+        async def main():
+            await client.semaphore.acquire()
+            return [p async for p in client.astream(MESSAGES, deadline=Deadline(0.05))]
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(main())
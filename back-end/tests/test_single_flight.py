@@ -0,0 +1,129 @@
+"""Tests for single-flight coalescing of identical concurrent requests."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.models.patient import PatientPayload
+from app.services.metrics import SINGLE_FLIGHT_CALLS
+from app.services.single_flight import SingleFlight, payload_key
+from tests.test_analyze import PAYLOAD
+
+
+def _counting(result="ok", delay=0.02, error=None):
+    calls = {"n": 0}
+
+    async def fn():
+        calls["n"] += 1
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return fn, calls
+
+
+class TestSingleFlight:
+    def test_concurrent_identical_calls_share_one_run(self):
+        flight = SingleFlight("test_share")
+        fn, calls = _counting()
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        assert calls["n"] == 1
+        assert [r for r, _ in results] == ["ok"] * 5
+        assert [shared for _, shared in results].count(False) == 1
+        assert SINGLE_FLIGHT_CALLS.value(name="test_share", result="coalesced") == 4
+        assert len(flight) == 0
+
+    def test_different_keys_run_separately(self):
+        flight = SingleFlight("test_keys")
+        fn, calls = _counting()
+
+        async def scenario():
+            await asyncio.gather(flight.do("a", fn), flight.do("b", fn))
+
+        asyncio.run(scenario())
+        assert calls["n"] == 2
+
+    def test_exception_reaches_every_caller(self):
+        flight = SingleFlight("test_error")
+        fn, calls = _counting(error=RuntimeError("search down"))
+
+        async def scenario():
+            return await asyncio.gather(
+                flight.do("k", fn), flight.do("k", fn), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert calls["n"] == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_sequential_calls_are_not_cached(self):
+        flight = SingleFlight("test_sequential")
+        fn, calls = _counting(delay=0)
+
+        async def scenario():
+            await flight.do("k", fn)
+            await flight.do("k", fn)
+
+        asyncio.run(scenario())
+        assert calls["n"] == 2
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight("test_cancel")
+        fn, calls = _counting(delay=0.05)
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.do("k", fn))
+            second = asyncio.ensure_future(flight.do("k", fn))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(scenario()) == ("ok", True)
+        assert calls["n"] == 1
+
+
+class TestPayloadKey:
+    def test_key_ignores_dict_order(self):
+        a = PatientPayload(**PAYLOAD)
+        b = PatientPayload(**dict(reversed(list(PAYLOAD.items()))))
+        assert payload_key(a) == payload_key(b)
+
+    def test_key_depends_on_content_and_extra(self):
+        a = PatientPayload(**PAYLOAD)
+        b = PatientPayload(**{**PAYLOAD, "patient_narrative": "Different."})
+        assert payload_key(a) != payload_key(b)
+        assert payload_key(a, True) != payload_key(a, False)
+
+
+class TestSingleFlightCancellation:
+    def test_run_cancelled_when_every_caller_leaves(self):
+        flight = SingleFlight("test_all_leave")
+        state = {"cancelled": False}
+
+        async def fn():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        async def scenario():
+            callers = [asyncio.ensure_future(flight.do("k", fn)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(scenario())
+        assert state["cancelled"] is True
+        assert len(flight) == 0
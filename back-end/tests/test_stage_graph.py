@@ -0,0 +1,178 @@
+"""Tests for the declarative stage-graph executor."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services.deadline import DeadlineExceeded
+from app.services.stage_graph import Stage, StageError, StageGraph
+from app.services.timing import StageTimer
+
+
+class TestStageGraph:
+    def test_stage_outputs_feed_named_inputs(self):
+        graph = StageGraph(
+            [
+                Stage("double", lambda x: x * 2, ("x",)),
+                Stage("total", lambda x, double: x + double, ("x", "double")),
+            ]
+        )
+        results = asyncio.run(graph.run({"x": 3}, ("total",)))
+        assert results["double"] == 6
+        assert results["total"] == 9
+
+    def test_independent_branches_run_concurrently(self):
+        async def branch(x):
+            await asyncio.sleep(0.2)
+            return x
+
+        graph = StageGraph(
+            [
+                Stage("a", branch, ("x",)),
+                Stage("b", branch, ("x",)),
+                Stage("c", branch, ("x",)),
+                Stage("join", lambda a, b, c: a + b + c, ("a", "b", "c")),
+            ]
+        )
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            results = await graph.run({"x": 1}, ("join",))
+            return results["join"], loop.time() - start
+
+        total, elapsed = asyncio.run(main())
+        assert total == 3
+        assert elapsed < 0.5
+
+    def test_cpu_stage_runs_off_the_event_loop(self):
+        graph = StageGraph([Stage("where", lambda: threading.get_ident(), cpu=True)])
+        results = asyncio.run(graph.run({}, ("where",)))
+        assert results["where"] != threading.get_ident()
+
+    def test_stage_timeout_raises_deadline_exceeded(self):
+        async def slow():
+            await asyncio.sleep(5)
+
+        graph = StageGraph([Stage("search", slow, timeout=0.05)])
+        with pytest.raises(StageError) as info:
+            asyncio.run(graph.run({}, ("search",)))
+        assert info.value.stage == "search"
+        assert isinstance(info.value.cause, DeadlineExceeded)
+        assert info.value.cause.stage == "search"
+
+    def test_failure_cancels_running_siblings(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        def boom():
+            raise RuntimeError("down")
+
+        graph = StageGraph([Stage("slow", slow), Stage("boom", boom)])
+        with pytest.raises(StageError) as info:
+            asyncio.run(graph.run({}, ("slow", "boom")))
+        assert info.value.stage == "boom"
+        assert isinstance(info.value.cause, RuntimeError)
+        assert cancelled == [True]
+
+    def test_failed_dependency_reports_the_failing_stage(self):
+        def boom():
+            raise RuntimeError("down")
+
+        graph = StageGraph([Stage("boom", boom), Stage("after", lambda boom: boom, ("boom",))])
+        with pytest.raises(StageError) as info:
+            asyncio.run(graph.run({}, ("after",)))
+        assert info.value.stage == "boom"
+
+    def test_optional_stage_failure_yields_none(self):
+        def boom():
+            raise RuntimeError("down")
+
+        graph = StageGraph([Stage("concern", boom, optional=True)])
+        assert asyncio.run(graph.run({}, ("concern",)))["concern"] is None
+
+    def test_when_skips_stage_without_span(self):
+        calls = []
+        graph = StageGraph(
+            [Stage("llm", lambda skip: calls.append(1), ("skip",), when=lambda skip: not skip)]
+        )
+        timer = StageTimer()
+        results = asyncio.run(graph.run({"skip": True}, ("llm",), timer))
+        assert results["llm"] is None
+        assert calls == []
+        assert "llm" not in timer.stages
+
+    def test_seeded_values_are_not_recomputed(self):
+        calls = []
+        graph = StageGraph(
+            [
+                Stage("encode", lambda: calls.append(1) or [1.0]),
+                Stage("search", lambda encode: len(encode), ("encode",)),
+            ]
+        )
+        results = asyncio.run(graph.run({"encode": [1.0, 2.0]}, ("search",)))
+        assert results["search"] == 2
+        assert calls == []
+
+    def test_spans_recorded_per_stage(self):
+        graph = StageGraph([Stage("deltas", lambda: 1), Stage("summary", lambda deltas: 2, ("deltas",))])
+        timer = StageTimer()
+        asyncio.run(graph.run({}, ("summary",), timer))
+        assert set(timer.stages) == {"deltas", "summary"}
+
+    def test_cycle_rejected(self):
+        with pytest.raises(ValueError, match="cycle"):
+            StageGraph([Stage("a", lambda b: b, ("b",)), Stage("b", lambda a: a, ("a",))])
+
+    def test_missing_input_rejected(self):
+        graph = StageGraph([Stage("a", lambda x: x, ("x",))])
+        with pytest.raises(ValueError, match="missing input 'x'"):
+            asyncio.run(graph.run({}, ("a",)))
+
+
+class TestBlockingSearch:
+    """The synchronous PyMongo search must not stall the event loop."""
+
+    def test_blocking_search_times_out_while_other_branches_run(self):
+        import time
+        from unittest.mock import MagicMock
+
+        from app.services.vector_search import search_conditions
+
+        client = MagicMock()
+        client.__getitem__.return_value.__getitem__.return_value.aggregate.side_effect = (
+            lambda *a, **kw: time.sleep(1) or []
+        )
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+            return len(ticks)
+
+        graph = StageGraph(
+            [
+                Stage("search", lambda: search_conditions(client, [0.1] * 4), timeout=0.2),
+                Stage("partial", ticker),
+            ]
+        )
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            with pytest.raises(StageError) as info:
+                await graph.run({}, ("search", "partial"))
+            return info.value, loop.time() - start
+
+        error, elapsed = asyncio.run(main())
+        assert isinstance(error.cause, DeadlineExceeded)
+        assert elapsed < 0.8
+        assert len(ticks) == 5
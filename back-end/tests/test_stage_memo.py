@@ -0,0 +1,214 @@
+"""Tests for content-addressed memoization of pipeline stage outputs.
+
+The shared MongoDB store is replaced by a dict-backed stand-in (or a
+MagicMock collection), so no database is needed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.patient import PatientPayload
+from app.services.analysis_steps import _compute_biometric_deltas
+from app.services.llm_extractor import ClinicalBriefOutput
+from app.services.stage_graph import Stage, StageGraph
+from app.services.stage_memo import ScopedMemo, StageMemo, fingerprint
+from tests.test_analyze import PAYLOAD, STUB_MATCHES
+
+OUTPUT = ClinicalBriefOutput(
+    summary="stub",
+    clinical_intake="intake",
+    primary_concern="Pelvic Pain",
+    key_symptoms=["pain"],
+    severity_assessment="moderate",
+    recommended_actions=["rest"],
+    cited_sources=["src"],
+    guiding_questions=["q?"],
+)
+
+
+class _DictMemo:
+    def __init__(self):
+        self.entries: dict[str, object] = {}
+
+    def get(self, stage, key):
+        return (key in self.entries, self.entries.get(key))
+
+    def put(self, stage, key, output):
+        self.entries[key] = output
+
+
+class TestFingerprint:
+    def test_key_order_does_not_matter(self):
+        assert fingerprint({"a": 1, "b": [1.5, "x"]}) == fingerprint({"b": [1.5, "x"], "a": 1})
+
+    def test_models_hash_by_content(self):
+        payload = PatientPayload.model_validate(PAYLOAD)
+        assert fingerprint(payload) == fingerprint(PatientPayload.model_validate(PAYLOAD))
+
+    def test_objects_without_content_rejected(self):
+        with pytest.raises(TypeError):
+            fingerprint(object())
+
+    def test_delta_order_is_fixed(self):
+        payload = PatientPayload.model_validate(PAYLOAD)
+        metrics = [d.metric for d in _compute_biometric_deltas(payload)]
+        assert metrics == [d.metric for d in _compute_biometric_deltas(payload)]
+        assert metrics.index("restingHeartRate") < metrics.index("heartRateVariabilitySDNN")
+
+
+class TestGraphMemo:
+    def _graph(self, calls):
+        def double(x, label):
+            calls.append(x)
+            return x * 2
+
+        return StageGraph(
+            [
+                Stage("double", double, ("x", "label"), memo_key=("x",), version="v1"),
+                Stage("plus", lambda double: double + 1, ("double",)),
+            ]
+        )
+
+    def test_equal_inputs_reuse_the_stored_output(self):
+        calls, memo = [], _DictMemo()
+        graph = self._graph(calls)
+        asyncio.run(graph.run({"x": 2, "label": "a"}, ("plus",), memo=memo))
+        # Inputs outside memo_key do not change the fingerprint
+        results = asyncio.run(graph.run({"x": 2, "label": "b"}, ("plus",), memo=memo))
+        assert calls == [2]
+        assert results["plus"] == 5
+
+    def test_changed_input_misses(self):
+        calls, memo = [], _DictMemo()
+        graph = self._graph(calls)
+        asyncio.run(graph.run({"x": 2, "label": "a"}, ("plus",), memo=memo))
+        asyncio.run(graph.run({"x": 3, "label": "a"}, ("plus",), memo=memo))
+        assert calls == [2, 3]
+
+    def test_refresh_recomputes_and_overwrites(self):
+        calls, memo = [], _DictMemo()
+        graph = self._graph(calls)
+        asyncio.run(graph.run({"x": 2, "label": "a"}, ("plus",), memo=memo))
+        asyncio.run(graph.run({"x": 2, "label": "a"}, ("plus",), memo=memo, refresh=True))
+        assert calls == [2, 2]
+        assert len(memo.entries) == 1
+
+    def test_memo_key_must_name_inputs(self):
+        with pytest.raises(ValueError, match="memo_key"):
+            StageGraph([Stage("a", lambda x: x, ("x",), memo_key=("y",))])
+
+
+class TestStageMemoStore:
+    def test_hit_returns_stored_output(self):
+        client = MagicMock()
+        memo = StageMemo(client)
+        memo.collection.find_one.return_value = {"output": [0.1, 0.2]}
+        assert memo.get("encode", "k") == (True, [0.1, 0.2])
+
+    def test_lookup_failure_is_a_miss(self):
+        client = MagicMock()
+        memo = StageMemo(client)
+        memo.collection.find_one.side_effect = RuntimeError("mongo down")
+        assert memo.get("encode", "k") == (False, None)
+
+    def test_put_upserts_with_expiry(self):
+        client = MagicMock()
+        memo = StageMemo(client, ttl_seconds=60)
+        memo.put("search", "k", STUB_MATCHES)
+        query, doc = memo.collection.replace_one.call_args.args
+        assert query == {"_id": "k"}
+        assert doc["stage"] == "search"
+        assert doc["output"] == STUB_MATCHES
+        assert doc["expires_at"] > doc["created_at"]
+
+
+class TestPipelineMemo:
+    @patch("app.services.analysis_pipeline.encode_text", return_value=[0.1] * 4)
+    @patch(
+        "app.services.analysis_pipeline.search_conditions",
+        new_callable=AsyncMock,
+        return_value=STUB_MATCHES,
+    )
+    @patch(
+        "app.services.analysis_pipeline.extract_clinical_brief",
+        new_callable=AsyncMock,
+        return_value=OUTPUT,
+    )
+    def test_reanalysis_skips_to_llm(self, mock_llm, mock_search, mock_encode):
+        from app.services.analysis_pipeline import analyze_patient_pipeline
+
+        memo = _DictMemo()
+        payload = PatientPayload.model_validate(PAYLOAD)
+        for _ in range(2):
+            result = asyncio.run(
+                analyze_patient_pipeline(payload, MagicMock(), MagicMock(), stage_memo=memo)
+            )
+        assert mock_encode.call_count == 1
+        assert mock_search.await_count == 1
+        assert mock_llm.await_count == 2
+        assert result.condition_matches[0].condition == "Endometriosis"
+
+
+class TestScopedMemo:
+    def test_own_entries_checked_before_shared(self):
+        shared = _DictMemo()
+        memo = ScopedMemo("draft", {"k": [1.0]}, shared=shared)
+        assert memo.get("encode", "k") == (True, [1.0])
+
+    def test_shared_hits_copied_into_entries(self):
+        shared = _DictMemo()
+        shared.put("encode", "k", [2.0])
+        memo = ScopedMemo("draft", shared=shared)
+        assert memo.get("encode", "k") == (True, [2.0])
+        assert memo.entries == {"k": [2.0]}
+
+    def test_put_writes_through(self):
+        shared = _DictMemo()
+        memo = ScopedMemo("draft", shared=shared)
+        memo.put("search", "k", STUB_MATCHES)
+        assert memo.entries["k"] == shared.entries["k"] == STUB_MATCHES
+
+
+class TestMemoOffLoop:
+    def test_memo_round_trips_run_off_the_event_loop(self):
+        import threading
+
+        loop_thread = []
+        threads = []
+
+        class _ThreadMemo(_DictMemo):
+            def get(self, stage, key):
+                threads.append(threading.get_ident())
+                return super().get(stage, key)
+
+            def put(self, stage, key, output):
+                threads.append(threading.get_ident())
+                super().put(stage, key, output)
+
+        graph = StageGraph([Stage("double", lambda x: x * 2, ("x",), memo_key=("x",))])
+
+        async def main():
+            loop_thread.append(threading.get_ident())
+            return await graph.run({"x": 2}, ("double",), memo=_ThreadMemo())
+
+        assert asyncio.run(main())["double"] == 4
+        assert len(threads) == 2
+        assert loop_thread[0] not in threads
+
+
+class TestCorpusVersion:
+    def test_search_key_covers_corpus_version(self):
+        from app.config import settings
+        from app.services.analysis_pipeline import ANALYSIS_GRAPH
+
+        assert f"corpus{settings.CORPUS_VERSION}" in ANALYSIS_GRAPH.stages["search"].version
+
+    def test_clear_deletes_one_stage(self):
+        memo = StageMemo(MagicMock())
+        memo.collection.delete_many.return_value.deleted_count = 3
+        assert memo.clear("search") == 3
+        memo.collection.delete_many.assert_called_once_with({"stage": "search"})
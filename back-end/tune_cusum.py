@@ -0,0 +1,220 @@
+"""Sweep CUSUM (k, h) and clinical-significance thresholds over a labelled cohort.
+
+The cohort is sampled from the per-condition ``acute_config`` / ``long_config``
+templates in ``seed_mock_patients.py``; every point a template flags (spikes
+with a flag such as ``"crashed"`` or ``"elevated"``) is treated as the ground
+truth onset of an anomaly for that metric.
+
+Every (k, h) combination is evaluated for every series in one broadcasted
+NumPy computation (see ``app.services.cusum.cusum_grid``), and every
+threshold candidate for every metric likewise, so sweeps over thousands of
+settings finish in seconds.
+
+Usage:
+    cd back-end
+    python tune_cusum.py --replicates 200 --k 0.1:1.5:15 --h 0.5:4:36
+    python tune_cusum.py --csv cusum_sweep.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.analysis_steps import THRESHOLDS, SHARED_METRICS
+from app.services.cusum import cusum_grid
+from seed_mock_patients import (
+    ACUTE_METRIC_KEYS,
+    LONG_METRIC_KEYS,
+    patients_list,
+    sample_metric_series,
+)
+
+ACUTE_DAYS = 7
+LONG_WEEKS = 26
+DEFAULT_K = 0.5
+DEFAULT_H = 1.5
+
+
+def _parse_range(spec: str) -> np.ndarray:
+    """Parse ``start:stop:num`` (inclusive linspace) or a comma-separated list."""
+    if ":" in spec:
+        start, stop, num = spec.split(":")
+        return np.linspace(float(start), float(stop), int(num))
+    return np.array([float(v) for v in spec.split(",")])
+
+
+def build_cohort(replicates: int, rng: np.random.Generator) -> dict:
+    """Sample ``replicates`` noisy copies of every template patient.
+
+    Returns ``{metric: {"acute": (P, 7), "baseline": (P,), "onset": (P,)}}``
+    where ``onset`` is the index of the first flagged point, or -1 for
+    series the template does not flag.
+    """
+    cohort: dict[str, dict[str, list]] = {}
+    for pt in patients_list:
+        for key, (metric, unit) in ACUTE_METRIC_KEYS.items():
+            values, flagged = sample_metric_series(
+                replicates, ACUTE_DAYS, unit=unit, rng=rng, **pt["acute_config"][key]
+            )
+            onset = int(np.argmax(flagged)) if flagged.any() else -1
+
+            if metric in SHARED_METRICS:
+                long_key = next(k for k, (m, _) in LONG_METRIC_KEYS.items() if m == metric)
+                long_values, _ = sample_metric_series(
+                    replicates, LONG_WEEKS, unit=unit, rng=rng, **pt["long_config"][long_key]
+                )
+                baseline = long_values.mean(axis=1)
+            else:
+                baseline = values[:, :3].mean(axis=1)
+
+            entry = cohort.setdefault(metric, {"acute": [], "baseline": [], "onset": []})
+            entry["acute"].append(values)
+            entry["baseline"].append(baseline)
+            entry["onset"].append(np.full(replicates, onset))
+
+    return {
+        metric: {name: np.concatenate(parts) for name, parts in entry.items()}
+        for metric, entry in cohort.items()
+    }
+
+
+def sweep_cusum(cohort: dict, k: np.ndarray, h: np.ndarray, chunk: int) -> dict:
+    """Evaluate every (k, h) pair against every series in the cohort.
+
+    Returns arrays of shape ``(K, H)``: detection rate, mean detection delay
+    (days, among detected series) and false-alarm rate (alarms on unflagged
+    series or before the flagged onset, over all series).
+    """
+    values = np.concatenate([c["acute"] for c in cohort.values()])
+    onset = np.concatenate([c["onset"] for c in cohort.values()])
+
+    detected = np.zeros((k.size, h.size))
+    delay_sum = np.zeros((k.size, h.size))
+    false_alarms = np.zeros((k.size, h.size))
+
+    for start in range(0, len(values), chunk):
+        idx, _ = cusum_grid(values[start:start + chunk], k, h)
+        on = onset[start:start + chunk, None, None]
+        positive = on >= 0
+        alarmed = idx >= 0
+
+        hit = positive & alarmed & (idx >= on)
+        detected += hit.sum(axis=0)
+        delay_sum += np.where(hit, idx - on, 0).sum(axis=0)
+        false_alarms += (alarmed & ~hit).sum(axis=0)
+
+    positives = max(int((onset >= 0).sum()), 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_delay = np.where(detected > 0, delay_sum / detected, np.nan)
+    return {
+        "detection_rate": detected / positives,
+        "mean_delay": mean_delay,
+        "false_alarm_rate": false_alarms / len(values),
+    }
+
+
+def sweep_thresholds(cohort: dict, scales: np.ndarray) -> dict:
+    """Evaluate scaled ``THRESHOLDS`` per metric.
+
+    Returns ``{metric: {"threshold": (S,), "sensitivity": (S,), "fpr": (S,)}}``.
+    """
+    results = {}
+    for metric, c in cohort.items():
+        acute = c["acute"]
+        if metric in SHARED_METRICS:
+            delta = np.abs(acute.mean(axis=1) - c["baseline"])
+        else:
+            delta = np.abs(acute[:, 3:].mean(axis=1) - acute[:, :3].mean(axis=1))
+
+        thresholds = THRESHOLDS[metric]["value"] * scales
+        significant = delta[:, None] > thresholds[None, :]
+        positive = (c["onset"] >= 0)[:, None]
+
+        results[metric] = {
+            "threshold": thresholds,
+            "sensitivity": (significant & positive).sum(axis=0) / max(int(positive.sum()), 1),
+            "fpr": (significant & ~positive).sum(axis=0) / max(int((~positive).sum()), 1),
+        }
+    return results
+
+
+def _nearest(grid: np.ndarray, value: float) -> int:
+    return int(np.abs(grid - value).argmin())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicates", type=int, default=200,
+                        help="Noisy copies sampled per template patient (default 200)")
+    parser.add_argument("--k", default="0.1:1.5:15", help="k grid, start:stop:num or list")
+    parser.add_argument("--h", default="0.5:4.0:36", help="h grid, start:stop:num or list")
+    parser.add_argument("--threshold-scale", default="0.25:3.0:12",
+                        help="Multipliers applied to each metric's THRESHOLDS value")
+    parser.add_argument("--max-false-alarm", type=float, default=0.05,
+                        help="False-alarm budget used to pick the recommended (k, h)")
+    parser.add_argument("--top", type=int, default=10, help="Rows of the (k, h) table to print")
+    parser.add_argument("--chunk", type=int, default=2000, help="Series evaluated per NumPy batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="Write the full (k, h) grid to this CSV file")
+    args = parser.parse_args()
+
+    k = _parse_range(args.k)
+    h = _parse_range(args.h)
+    scales = _parse_range(args.threshold_scale)
+    rng = np.random.default_rng(args.seed)
+
+    started = time.perf_counter()
+    cohort = build_cohort(args.replicates, rng)
+    n_series = sum(len(c["onset"]) for c in cohort.values())
+    print(f"Cohort: {len(patients_list) * args.replicates} patients, {n_series} metric series")
+
+    cusum = sweep_cusum(cohort, k, h, args.chunk)
+    thresholds = sweep_thresholds(cohort, scales)
+    elapsed = time.perf_counter() - started
+    print(f"Evaluated {k.size * h.size} (k, h) settings and "
+          f"{scales.size * len(cohort)} thresholds in {elapsed:.2f}s\n")
+
+    # --- (k, h) table: best detection rate within the false-alarm budget ---
+    rows = [
+        (k[i], h[j], cusum["detection_rate"][i, j], cusum["mean_delay"][i, j],
+         cusum["false_alarm_rate"][i, j])
+        for i in range(k.size) for j in range(h.size)
+    ]
+    within_budget = [r for r in rows if r[4] <= args.max_false_alarm]
+    ranked = sorted(within_budget or rows, key=lambda r: (-r[2], r[3], r[4]))
+
+    print(f"{'k':>6} {'h':>6} {'detect':>8} {'delay':>7} {'false_alarm':>12}")
+    for r in ranked[:args.top]:
+        print(f"{r[0]:6.2f} {r[1]:6.2f} {r[2]:8.3f} {r[3]:7.2f} {r[4]:12.3f}")
+    i, j = _nearest(k, DEFAULT_K), _nearest(h, DEFAULT_H)
+    print(f"\nCurrent defaults (k={DEFAULT_K}, h={DEFAULT_H}) ≈ grid point "
+          f"(k={k[i]:.2f}, h={h[j]:.2f}): detect {cusum['detection_rate'][i, j]:.3f}, "
+          f"delay {cusum['mean_delay'][i, j]:.2f}, "
+          f"false alarm {cusum['false_alarm_rate'][i, j]:.3f}\n")
+
+    # --- Per-metric thresholds: best Youden's J (sensitivity - FPR) ---
+    print(f"{'metric':<32} {'current':>9} {'best':>9} {'sens':>6} {'fpr':>6}")
+    current_idx = _nearest(scales, 1.0)
+    for metric in sorted(thresholds):
+        t = thresholds[metric]
+        best = int(np.argmax(t["sensitivity"] - t["fpr"]))
+        print(f"{metric:<32} {t['threshold'][current_idx]:9.3g} {t['threshold'][best]:9.3g} "
+              f"{t['sensitivity'][best]:6.3f} {t['fpr'][best]:6.3f}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["k", "h", "detection_rate", "mean_delay", "false_alarm_rate"])
+            writer.writerows(rows)
+        print(f"\nWrote {len(rows)} rows to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -103,8 +103,15 @@ export function ClinicalAbstract({
         <span
           className="rounded-[8px] px-2.5 py-0.5 text-[10px] font-semibold tracking-[0.4px] uppercase"
           style={{ background: "rgba(93,46,168,0.10)", color: "var(--purple-primary)" }}
+          title={
+            !clinicalBrief.provisional
+              ? undefined
+              : clinicalBrief.source === "semantic_cache"
+                ? "Draft from a similar intake; the AI synthesis for this patient will replace it when ready."
+                : "Rule-based draft; the AI synthesis will replace it when ready."
+          }
         >
-          AI Synthesis
+          {clinicalBrief.provisional ? "Provisional" : "AI Synthesis"}
         </span>
       </div>
 
@@ -4,8 +4,11 @@ import { useEffect, useState, useRef } from "react";
 import { useParams } from "next/navigation";
 import { motion, AnimatePresence, useSpring, useMotionValue, useTransform } from "framer-motion";
 import AppleHealthSync from "@/components/AppleHealthSync";
+import type { RiskProfile } from "@/lib/types";
 
 const API_BASE = ("https://vaunting-nonfactually-marin.ngrok-free.dev").replace(/\/+$/, "");
+// Resubmissions while the API answers 429/503 (load shedding)
+const SUBMIT_MAX_ATTEMPTS = 4;
 
 type Question = {
   id: number;
@@ -226,12 +229,30 @@ export default function IntakePage() {
   // syncing-wearables view is now driven by AppleHealthSync component
   // (onSyncComplete / onSkip callbacks)
 
+  // Sent with both the draft and the submission: the draft's results are
+  // only reused when the risk profile they were computed for matches
+  const riskProfile: RiskProfile = { factors: [] };
+
+  // Let the server embed the narrative and search the literature while the
+  // patient syncs their watch and answers questions; the final submit
+  // reuses the results.  Best effort: submit works without it.
+  const saveDraft = () => {
+    if (!narrative.trim()) return;
+    fetch(`${API_BASE}/api/v1/intake/${encodeURIComponent(token)}/draft`, {
+      method: "PUT",
+      headers: { "Content-Type": "application/json", "ngrok-skip-browser-warning": "true" },
+      body: JSON.stringify({ patient_narrative: narrative, risk_profile: riskProfile }),
+    }).catch(() => {});
+  };
 
   const handleAnswer = (answer: string) => {
     setAnswers((prev) => ({ ...prev, [currentQuestionIndex]: answer }));
     if (currentQuestionIndex < questions.length - 1) {
       setCurrentQuestionIndex((prev) => prev + 1);
     } else {
+      // Questions answered again after going back: refresh the draft with
+      // the final risk profile (a no-op before the narrative is written)
+      saveDraft();
       setView("symptoms-intro");
     }
   };
@@ -396,21 +417,30 @@ export default function IntakePage() {
         acute_7_day: { granularity: "daily_summary", metrics: { heartRateVariabilitySDNN: [], restingHeartRate: [], appleSleepingWristTemperature: [], respiratoryRate: [], walkingAsymmetryPercentage: [], stepCount: [], sleepAnalysis_awakeSegments: [] } },
         longitudinal_6_month: { granularity: "weekly_average", metrics: { restingHeartRate: [], walkingAsymmetryPercentage: [] } },
       },
-      risk_profile: { factors: [] },
+      risk_profile: riskProfile,
     };
 
     try {
-      const res = await fetch(`${API_BASE}/api/v1/intake/${token}/submit`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json", "ngrok-skip-browser-warning": "true" },
-        body: JSON.stringify(payload),
-      });
+      let res: Response;
+      for (let attempt = 1; ; attempt++) {
+        res = await fetch(`${API_BASE}/api/v1/intake/${token}/submit`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "ngrok-skip-browser-warning": "true" },
+          body: JSON.stringify(payload),
+        });
+        // Server is shedding load: wait as asked and resubmit (the patient
+        // is already on the "thanks" screen, so nothing else would retry)
+        if ((res.status !== 429 && res.status !== 503) || attempt >= SUBMIT_MAX_ATTEMPTS) break;
+        const retryAfter = Number(res.headers.get("Retry-After")) || 5;
+        await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+      }
 
+      // 202 Accepted: analysis runs on the server's intake job queue and can
+      // be followed at /api/v1/intake/jobs/{job_id}
       if (!res.ok) {
         const body = await res.text();
         throw new Error(body || `Server error: ${res.status}`);
       }
-
     } catch (err) {
       // Submission runs in background — patient already sees "thanks" screen.
       // Log but don't disrupt the patient experience.
@@ -576,7 +606,13 @@ export default function IntakePage() {
                   />
                 </div>
                 <div className="w-full max-w-[760px] flex justify-end">
-                  <LiquidButton onClick={() => setView("syncing-wearables")} className="w-[140px] h-[48px] text-[20px]">
+                  <LiquidButton
+                    onClick={() => {
+                      saveDraft();
+                      setView("syncing-wearables");
+                    }}
+                    className="w-[140px] h-[48px] text-[20px]"
+                  >
                     Submit
                   </LiquidButton>
                 </div>
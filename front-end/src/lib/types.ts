@@ -56,6 +56,9 @@ export interface ClinicalBrief {
   recommended_actions: string[];
   cited_sources: string[];
   guiding_questions: string[];
+  source?: "llm" | "semantic_cache" | "rules";
+  cache_similarity?: number | null;
+  provisional?: boolean;
 }
 
 export interface BiometricDelta {